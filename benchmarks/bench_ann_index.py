@@ -0,0 +1,99 @@
+import argparse
+import json
+import os
+import time
+import faiss
+import numpy as np
+from utils.ann_index import index_spec, build_index, index_kind, index_vectors
+from utils.vectorstore_utils import current_version
+from utils.mmap_store import META_FILE, VECTORS_FILE, is_mmap_store
+
+def load_vectors(path: str):
+    version = current_version(path)
+    load_path = os.path.join(path, version) if version else path
+    if is_mmap_store(load_path):
+        with open(os.path.join(load_path, META_FILE)) as f:
+            meta = json.load(f)
+        vectors = np.fromfile(os.path.join(load_path, VECTORS_FILE), dtype=np.float32)
+        return vectors.reshape(meta["count"], meta["dim"]), meta["metric"]
+    index = faiss.read_index(os.path.join(load_path, "index.faiss"))
+    return index_vectors(index), index.metric_type
+
+def synthetic_vectors(count: int, dim: int, clusters: int, seed: int):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(clusters, size=count)] + 0.3 * rng.normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True), faiss.METRIC_L2
+
+def sample_queries(vectors, count: int, seed: int):
+    rng = np.random.default_rng(seed + 1)
+    picks = vectors[rng.integers(len(vectors), size=count)]
+    queries = picks + 0.05 * rng.normal(size=picks.shape).astype(np.float32)
+    return np.ascontiguousarray(queries, dtype=np.float32)
+
+def settings(nlists, nprobes, ms, ef_searches):
+    yield index_spec("flat")
+    for nlist in nlists:
+        for nprobe in nprobes:
+            if nprobe <= nlist:
+                yield index_spec("ivf", nlist=nlist, nprobe=nprobe)
+    for m in ms:
+        for ef_search in ef_searches:
+            yield index_spec("hnsw", m=m, ef_search=ef_search)
+
+def setting_params(spec, kind: str):
+    if kind == "ivf":
+        return {"nlist": spec.nlist, "nprobe": spec.nprobe}
+    if kind == "hnsw":
+        return {"m": spec.m, "ef_construction": spec.ef_construction, "ef_search": spec.ef_search}
+    return {}
+
+def run_setting(spec, vectors, metric, queries, truth, k: int):
+    started = time.perf_counter()
+    index = build_index(vectors, vectors.shape[1], metric, spec)
+    build_s = time.perf_counter() - started
+    latencies, found = [], []
+    for query in queries:
+        started = time.perf_counter()
+        _, ids = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - started)
+        found.append(ids[0])
+    recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+    kind = index_kind(index)
+    return {
+        "index_type": kind,
+        "params": setting_params(spec, kind),
+        "build_s": round(build_s, 3),
+        f"recall@{k}": round(float(recall), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 3),
+    }
+
+def run(args):
+    if args.synthetic:
+        vectors, metric = synthetic_vectors(args.synthetic, args.dim, args.clusters, args.seed)
+    else:
+        vectors, metric = load_vectors(args.path)
+    queries = sample_queries(vectors, args.queries, args.seed)
+    exact = build_index(vectors, vectors.shape[1], metric, index_spec("flat"))
+    _, truth = exact.search(queries, args.k)
+    results = [
+        run_setting(spec, vectors, metric, queries, truth, args.k)
+        for spec in settings(args.nlist, args.nprobe, args.m, args.ef_search)
+    ]
+    return {"vectors": len(vectors), "dim": vectors.shape[1], "queries": len(queries), "k": args.k, "results": results}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall@k against the exact index, search latency and build time per ANN setting.")
+    parser.add_argument("--path", default=".vectorstore", help="index directory to benchmark")
+    parser.add_argument("--synthetic", type=int, default=0, help="benchmark N clustered random vectors instead")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--nlist", type=int, nargs="+", default=[64, 256, 1024])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--m", type=int, nargs="+", default=[16, 32])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--seed", type=int, default=0)
+    print(json.dumps(run(parser.parse_args()), indent=2))
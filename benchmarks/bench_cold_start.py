@@ -0,0 +1,49 @@
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+def import_times(module: str, top: int):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), depth, int(cumulative_us)))
+    end = next((i for i, (name, depth, _) in enumerate(rows) if name == module and depth == 0), None)
+    if end is None:
+        return {"module": module, "error": result.stderr.strip().splitlines()[-1]}
+    start = max((i for i in range(end) if rows[i][1] == 0), default=-1) + 1
+    children = [(name, cumulative) for name, depth, cumulative in rows[start:end] if depth == 1]
+    heaviest = sorted(children, key=lambda row: row[1], reverse=True)[:top]
+    return {
+        "module": module,
+        "total_ms": rows[end][2] / 1000,
+        "heaviest_ms": {name: cumulative / 1000 for name, cumulative in heaviest},
+        "error": result.stderr.strip().splitlines()[-1] if result.returncode else None,
+    }
+
+def build_time():
+    started = time.perf_counter()
+    from services.registry import Registry
+    registry = Registry(started)
+    registry.build()
+    registry.timings["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return registry.timings
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold-start cost: app import time and registry build time.")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--build", action="store_true", help="also build the registry (needs OPENAI_API_KEY)")
+    args = parser.parse_args()
+    report = {"imports": import_times(args.module, args.top)}
+    if args.build:
+        report["build"] = build_time()
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,105 @@
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from sqlalchemy import event, delete
+from db.database import SessionLocal, AsyncSessionLocal, Base, engine, async_engine
+from db.models import ChatMessage, ChatSession
+from services.message_writer import MessageWriter
+
+class StatementCounter:
+    def __init__(self, *binds):
+        self.statements = 0
+        self.commits = 0
+        for bind in binds:
+            event.listen(bind, "before_cursor_execute", self.on_execute)
+            event.listen(bind, "commit", self.on_commit)
+
+    def on_execute(self, *args):
+        self.statements += 1
+
+    def on_commit(self, *args):
+        self.commits += 1
+
+    def reset(self):
+        self.statements = 0
+        self.commits = 0
+
+def legacy_turn(db, session_id):
+    first_msg = db.query(ChatMessage).filter(ChatMessage.session_id == session_id).first()
+    msg = ChatMessage(session_id=session_id, role="user", content="How many leave days do I get?",
+                      title=None if first_msg else "Leave days")
+    db.add(msg)
+    db.commit()
+    db.refresh(msg)
+    msg = ChatMessage(session_id=session_id, role="assistant", content="You get 24 leave days per year.")
+    db.add(msg)
+    db.commit()
+    db.refresh(msg)
+
+def legacy_delete(db, session_id):
+    messages = db.query(ChatMessage).filter(ChatMessage.session_id == session_id).all()
+    for msg in messages:
+        db.delete(msg)
+    db.commit()
+
+def batched_delete(db, session_id):
+    db.execute(delete(ChatMessage).where(ChatMessage.session_id == session_id))
+    db.execute(delete(ChatSession).where(ChatSession.id == session_id))
+    db.commit()
+
+async def measure(counter, turns, fn):
+    counter.reset()
+    started = time.perf_counter()
+    await fn()
+    elapsed = time.perf_counter() - started
+    return {
+        "statements_per_turn": counter.statements / turns,
+        "commits_per_turn": counter.commits / turns,
+        "ms_per_turn": elapsed / turns * 1000,
+    }
+
+async def run(turns: int, batch: int):
+    Base.metadata.create_all(bind=engine)
+    counter = StatementCounter(engine, async_engine.sync_engine)
+    writer = MessageWriter(write_behind=False)
+    legacy_id, writer_id, batch_id = (f"bench-{uuid.uuid4().hex}" for _ in range(3))
+    results = {"turns": turns, "write_behind_batch": batch}
+    with SessionLocal() as db:
+        async with AsyncSessionLocal() as adb:
+            async def legacy():
+                for _ in range(turns):
+                    legacy_turn(db, legacy_id)
+
+            async def per_turn():
+                for _ in range(turns):
+                    await writer.awrite(adb, [writer.turn(writer_id, "How many leave days do I get?", "24 days.")], None)
+
+            async def write_behind():
+                for start in range(0, turns, batch):
+                    size = min(batch, turns - start)
+                    turn = writer.turn(batch_id, "How many leave days do I get?", "24 days.")
+                    await writer.awrite(adb, [turn] * size, None)
+
+            async def delete_legacy():
+                legacy_delete(db, legacy_id)
+
+            async def delete_set_based():
+                batched_delete(db, writer_id)
+
+            results["legacy"] = await measure(counter, turns, legacy)
+            results["message_writer"] = await measure(counter, turns, per_turn)
+            results["write_behind"] = await measure(counter, turns, write_behind)
+            results["delete_legacy"] = await measure(counter, 1, delete_legacy)
+            results["delete_set_based"] = await measure(counter, 1, delete_set_based)
+            batched_delete(db, batch_id)
+    await async_engine.dispose()
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Round trips and commits per chat turn, before and after batching.")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=50)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.turns, args.batch)), indent=2))
@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+import json
+import time
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores import FAISS
+from utils.index_manager import IndexSnapshot
+from utils.query_batcher import QueryBatcher
+
+class SimulatedEmbeddings(Embeddings):
+    def __init__(self, dim: int, call_ms: float, item_ms: float):
+        self.dim = dim
+        self.call_ms = call_ms
+        self.item_ms = item_ms
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        time.sleep((self.call_ms + self.item_ms * len(texts)) / 1000)
+        return [self.vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def vector(self, text: str):
+        rng = np.random.default_rng(abs(hash(text)) % (2 ** 32))
+        vector = rng.normal(size=self.dim).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+def build_snapshot(embeddings, chunks: int):
+    texts = [f"chunk {i}" for i in range(chunks)]
+    vectors = [embeddings.vector(text) for text in texts]
+    vectorstore = FAISS.from_embeddings(list(zip(texts, vectors)), embeddings)
+    return IndexSnapshot("bench", vectorstore)
+
+async def direct(snapshot, embeddings, query: str, k: int):
+    vector = await asyncio.to_thread(embeddings.embed_query, query)
+    return vector, await asyncio.to_thread(snapshot.vectorstore.similarity_search_by_vector, vector, k)
+
+async def run_load(retrieve, requests: int, concurrency: int):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            started = time.perf_counter()
+            await retrieve(f"question {i}")
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        "throughput_qps": round(requests / elapsed, 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 2),
+    }
+
+async def run(args):
+    embeddings = SimulatedEmbeddings(args.dim, args.call_ms, args.item_ms)
+    snapshot = build_snapshot(embeddings, args.chunks)
+    report = {}
+    embeddings.calls = 0
+    report["direct"] = await run_load(lambda q: direct(snapshot, embeddings, q, args.k), args.requests, args.concurrency)
+    report["direct"]["embedding_calls"] = embeddings.calls
+    for window_ms in args.window_ms:
+        batcher = QueryBatcher(embeddings, window_ms=window_ms, max_batch=args.max_batch)
+        embeddings.calls = 0
+        result = await run_load(lambda q: batcher.retrieve(snapshot, q, args.k), args.requests, args.concurrency)
+        result["embedding_calls"] = embeddings.calls
+        result["avg_batch"] = round(batcher.stats()["avg_batch"], 2)
+        report[f"batched_{window_ms}ms"] = result
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query embedding + search throughput, per-request vs micro-batched.")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--call-ms", type=float, default=40, help="simulated per-request embedding latency")
+    parser.add_argument("--item-ms", type=float, default=0.2, help="simulated extra latency per embedded text")
+    parser.add_argument("--window-ms", type=float, nargs="+", default=[1, 3, 10])
+    parser.add_argument("--max-batch", type=int, default=32)
+    print(json.dumps(asyncio.run(run(parser.parse_args())), indent=2))
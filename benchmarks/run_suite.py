@@ -0,0 +1,347 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+import numpy as np
+
+VOCABULARY = (
+    "leave policy employee manager payroll notice period remote work office hours benefits insurance "
+    "holiday approval request salary review training travel expense reimbursement contract probation "
+    "performance appraisal overtime shift security badge laptop equipment onboarding resignation"
+).split()
+
+def configure(args):
+    workdir = args.workdir or tempfile.mkdtemp(prefix="rag-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    os.environ["MODEL_PROVIDER"] = "fake"
+    os.environ["VECTORSTORE_PATH"] = os.path.join(workdir, "vectorstore")
+    os.environ["EMBEDDING_CACHE_DIR"] = os.path.join(workdir, "embedding_cache")
+    os.environ["FAKE_EMBEDDING_LATENCY_MS"] = str(args.embedding_latency_ms)
+    os.environ["FAKE_LLM_LATENCY_MS"] = str(args.llm_latency_ms)
+    os.environ["FAKE_LLM_TOKEN_MS"] = str(args.llm_token_ms)
+    os.environ.setdefault("WS_MAX_IN_FLIGHT", str(max(args.clients, 8)))
+    return workdir
+
+def max_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def percentiles(samples):
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "p50_ms": round(float(np.percentile(samples, 50)) * 1000, 2),
+        "p90_ms": round(float(np.percentile(samples, 90)) * 1000, 2),
+        "p99_ms": round(float(np.percentile(samples, 99)) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2),
+    }
+
+def write_synthetic_pdf(path: str, pages: int, words_per_page: int, seed: int = 0):
+    rng = random.Random(seed)
+    bodies = {
+        1: "<< /Type /Catalog /Pages 2 0 R >>",
+        3: "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    page_ids = []
+    for page in range(pages):
+        words = [rng.choice(VOCABULARY) for _ in range(words_per_page)]
+        lines = [" ".join(words[i:i + 12]) for i in range(0, len(words), 12)]
+        stream = "BT /F1 10 Tf 14 TL 50 780 Td " + " ".join(f"({line}) Tj T*" for line in lines) + " ET"
+        page_id, content_id = 4 + 2 * page, 5 + 2 * page
+        bodies[content_id] = f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream"
+        bodies[page_id] = (
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        )
+        page_ids.append(page_id)
+    bodies[2] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {pages} >>"
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id in sorted(bodies):
+        offsets[obj_id] = len(out)
+        out += f"{obj_id} 0 obj\n{bodies[obj_id]}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    size = max(bodies) + 1
+    out += f"xref\n0 {size}\n0000000000 65535 f \n".encode()
+    for obj_id in range(1, size):
+        out += f"{offsets[obj_id]:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+    return path
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(port: int):
+    import uvicorn
+    from main import app
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+async def bench_ingestion(client, workdir: str, pages: int, words_per_page: int):
+    path = write_synthetic_pdf(os.path.join(workdir, "bench.pdf"), pages, words_per_page)
+    started = time.perf_counter()
+    with open(path, "rb") as f:
+        response = await client.post("/chat/upload_pdf/", files={"file": ("bench.pdf", f, "application/pdf")},
+                                     params={"doc_id": "bench-doc"})
+    response.raise_for_status()
+    job_id = response.json()["job_id"]
+    while True:
+        job = (await client.get(f"/chat/ingest_jobs/{job_id}")).json()
+        if job["stage"] in ("done", "failed"):
+            break
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    return {
+        "stage": job["stage"],
+        "error": job["error"],
+        "pages": job["pages_total"],
+        "chunks": job["chunks_total"],
+        "seconds": round(elapsed, 3),
+        "pages_per_s": round((job["pages_total"] or 0) / elapsed, 1),
+        "chunks_per_s": round((job["chunks_total"] or 0) / elapsed, 1),
+        "stage_timings": job["timings"],
+        "max_rss_mb": max_rss_mb(),
+    }
+
+async def bench_ask(client, clients: int, requests_per_client: int):
+    latencies, errors = [], 0
+
+    async def run_client(i):
+        nonlocal errors
+        session_id = f"bench-ask-{uuid.uuid4().hex}"
+        for j in range(requests_per_client):
+            query = f"what is the {VOCABULARY[(i + j) % len(VOCABULARY)]} policy for request {j}"
+            started = time.perf_counter()
+            response = await client.post("/chat/ask_question/", json={"query": query, "session_id": session_id})
+            latencies.append(time.perf_counter() - started)
+            errors += response.status_code != 200
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run_client(i) for i in range(clients)))
+    elapsed = time.perf_counter() - started
+    return {
+        "clients": clients,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "errors": errors,
+        "latency": percentiles(latencies),
+        "max_rss_mb": max_rss_mb(),
+    }
+
+async def bench_websocket(port: int, clients: int, messages_per_client: int, multiplex: bool):
+    import websockets
+    first_token, complete = [], []
+    errors = 0
+    replies = {}
+
+    async def read_frames(ws):
+        async for data in ws:
+            frame = json.loads(data)
+            if frame.get("id") in replies:
+                replies[frame["id"]].put_nowait(frame)
+
+    async def ask(ws, session_id: str, query: str):
+        nonlocal errors
+        request_id = uuid.uuid4().hex
+        replies[request_id] = asyncio.Queue()
+        started = time.perf_counter()
+        first = None
+        await ws.send(json.dumps({"type": "ask", "id": request_id, "session_id": session_id, "query": query}))
+        while True:
+            frame = await asyncio.wait_for(replies[request_id].get(), 60)
+            if frame["type"] == "token":
+                first = first or time.perf_counter()
+            elif frame["type"] == "done":
+                break
+            else:
+                errors += 1
+                break
+        del replies[request_id]
+        if first:
+            first_token.append(first - started)
+            complete.append(time.perf_counter() - started)
+
+    async def run_client(ws, i):
+        session_id = f"bench-ws-{uuid.uuid4().hex}"
+        for j in range(messages_per_client):
+            await ask(ws, session_id, f"how does {VOCABULARY[(i + j) % len(VOCABULARY)]} work")
+
+    async def connect_and_run(client_ids):
+        async with websockets.connect(f"ws://127.0.0.1:{port}/chat/ws/bench-{uuid.uuid4().hex}") as ws:
+            reader = asyncio.create_task(read_frames(ws))
+            try:
+                await asyncio.gather(*(run_client(ws, i) for i in client_ids))
+            finally:
+                reader.cancel()
+
+    started = time.perf_counter()
+    if multiplex:
+        await connect_and_run(range(clients))
+    else:
+        await asyncio.gather(*(connect_and_run([i]) for i in range(clients)))
+    return {
+        "clients": clients,
+        "connections": 1 if multiplex else clients,
+        "seconds": round(time.perf_counter() - started, 3),
+        "errors": errors,
+        "first_token": percentiles(first_token),
+        "complete": percentiles(complete),
+        "max_rss_mb": max_rss_mb(),
+    }
+
+async def seed_sessions(prefix: str, sessions: int, messages_per_session: int):
+    from datetime import datetime, timedelta
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from sqlalchemy.pool import NullPool
+    from db.database import ASYNC_DATABASE_URL
+    from services.message_writer import MessageWriter
+    from services.title_service import title_service
+    writer = MessageWriter(write_behind=False)
+    now = datetime.utcnow()
+    seed_engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=NullPool)
+    async with async_sessionmaker(seed_engine)() as db:
+        turns = []
+        for i in range(sessions):
+            messages = [
+                ("user" if m % 2 == 0 else "assistant", f"message {m} about {VOCABULARY[m % len(VOCABULARY)]}",
+                 now - timedelta(seconds=sessions - i, milliseconds=messages_per_session - m))
+                for m in range(messages_per_session)
+            ]
+            turns.append((f"{prefix}{i}", messages))
+            if len(turns) >= 500:
+                await writer.awrite(db, turns, None)
+                turns = []
+        if turns:
+            await writer.awrite(db, turns, None)
+    await seed_engine.dispose()
+    with title_service._lock:
+        for session_id in [sid for sid in title_service.pending if sid.startswith(prefix)]:
+            del title_service.pending[session_id]
+
+def cleanup_sessions(prefix: str):
+    from sqlalchemy import delete
+    from db.database import SessionLocal
+    from db.models import ChatMessage, ChatSession
+    with SessionLocal() as db:
+        db.execute(delete(ChatMessage).where(ChatMessage.session_id.like(f"{prefix}%")))
+        db.execute(delete(ChatSession).where(ChatSession.id.like(f"{prefix}%")))
+        db.commit()
+
+async def bench_listing(client, sessions: int, messages_per_session: int, pages: int, page_size: int):
+    prefix = f"bench-list-{uuid.uuid4().hex[:8]}-"
+    started = time.perf_counter()
+    await seed_sessions(prefix, sessions, messages_per_session)
+    seed_s = time.perf_counter() - started
+    try:
+        listing, history = [], []
+        cursor = None
+        for _ in range(pages):
+            started = time.perf_counter()
+            body = (await client.get("/chat/sessions/", params={"limit": page_size, **({"cursor": cursor} if cursor else {})})).json()
+            listing.append(time.perf_counter() - started)
+            cursor = body.get("next_cursor")
+            if not cursor:
+                break
+        session_id = f"{prefix}{sessions - 1}"
+        before = None
+        for _ in range(pages):
+            started = time.perf_counter()
+            body = (await client.get(f"/chat/history/{session_id}", params={"limit": page_size, **({"before": before} if before else {})})).json()
+            history.append(time.perf_counter() - started)
+            before = body.get("older_cursor")
+            if not before:
+                break
+    finally:
+        await asyncio.to_thread(cleanup_sessions, prefix)
+    return {
+        "sessions": sessions,
+        "messages_per_session": messages_per_session,
+        "seed_s": round(seed_s, 2),
+        "sessions_page": percentiles(listing),
+        "history_page": percentiles(history),
+        "max_rss_mb": max_rss_mb(),
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+async def run_sections(args, workdir: str, port: int):
+    import httpx
+    results = {}
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120) as client:
+        if "ingest" in args.sections:
+            results["ingest"] = await bench_ingestion(client, workdir, args.pages, args.words_per_page)
+        if "ask" in args.sections:
+            results["ask"] = await bench_ask(client, args.clients, args.requests)
+        if "ws" in args.sections:
+            results["ws"] = await bench_websocket(port, args.clients, args.requests, args.ws_multiplex)
+        if "listing" in args.sections:
+            results["listing"] = await bench_listing(client, args.sessions, args.messages_per_session,
+                                                     args.list_pages, args.page_size)
+        results["startup"] = (await client.get("/health")).json()["startup"]
+    return results
+
+def main(args):
+    workdir = configure(args)
+    port = free_port()
+    baseline_rss = max_rss_mb()
+    server, thread = start_server(port)
+    try:
+        sections = asyncio.run(run_sections(args, workdir, port))
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+    report = {
+        "suite": "rag-chatbot",
+        "revision": git_revision(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "memory": {"baseline_max_rss_mb": baseline_rss, "final_max_rss_mb": max_rss_mb()},
+        "results": sections,
+    }
+    text = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark suite using hashing embeddings and an echo LLM.")
+    parser.add_argument("--sections", nargs="+", default=["ingest", "ask", "ws", "listing"],
+                        choices=["ingest", "ask", "ws", "listing"])
+    parser.add_argument("--workdir", help="directory for the index and embedding cache (default: a fresh temp dir)")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=20, help="requests (or WebSocket messages) per client")
+    parser.add_argument("--ws-multiplex", action="store_true",
+                        help="send every WebSocket client's messages over one shared connection")
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--messages-per-session", type=int, default=20)
+    parser.add_argument("--list-pages", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--embedding-latency-ms", type=float, default=0)
+    parser.add_argument("--llm-latency-ms", type=float, default=200)
+    parser.add_argument("--llm-token-ms", type=float, default=10)
+    main(parser.parse_args())
@@ -0,0 +1,9 @@
+from db.database import Base, engine
+from db.migrations import migrate
+
+def backfill_sessions():
+    Base.metadata.create_all(bind=engine)
+    return migrate(engine)
+
+if __name__ == "__main__":
+    print(f"Backfilled {backfill_sessions()} chat sessions.")
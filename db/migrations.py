@@ -0,0 +1,73 @@
+from sqlalchemy import select, func, text
+from sqlalchemy.orm import aliased
+from sqlalchemy.dialects.postgresql import insert
+from db.models import ChatMessage, ChatSession
+
+MIGRATION_LOCK_ID = 7242031
+
+STATEMENTS = [
+    "CREATE INDEX IF NOT EXISTS ix_chat_messages_session_created_id ON chat_messages (session_id, created_at, id)",
+]
+
+UNIQUE_INDEXES = [
+    ("job_applications", "session_id", "ix_job_applications_session_id"),
+]
+
+def is_unique(conn, index: str):
+    return conn.execute(
+        text("SELECT i.indisunique FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid WHERE c.relname = :name"),
+        {"name": index},
+    ).scalar()
+
+def ensure_unique(conn, table: str, column: str, index: str):
+    if is_unique(conn, index):
+        return
+    deleted = conn.execute(text(
+        f"DELETE FROM {table} a USING {table} b WHERE a.{column} = b.{column} AND a.id < b.id"
+    )).rowcount
+    if deleted:
+        print(f"Removed {deleted} duplicate {table} rows by {column}, keeping the newest, before adding {index}.")
+    conn.execute(text(f"DROP INDEX IF EXISTS {index}"))
+    conn.execute(text(f"CREATE UNIQUE INDEX {index} ON {table} ({column})"))
+
+def sessions_backfill():
+    titled = aliased(ChatMessage)
+    first_title = (
+        select(titled.title)
+        .where(titled.session_id == ChatMessage.session_id, titled.title.isnot(None))
+        .order_by(titled.created_at, titled.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    rows = (
+        select(
+            ChatMessage.session_id,
+            first_title,
+            func.min(ChatMessage.created_at),
+            func.max(ChatMessage.created_at),
+            func.count(ChatMessage.id),
+        )
+        .group_by(ChatMessage.session_id)
+    )
+    stmt = insert(ChatSession).from_select(["id", "title", "created_at", "last_message_at", "message_count"], rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[ChatSession.id],
+        set_={
+            "title": func.coalesce(stmt.excluded.title, ChatSession.title),
+            "created_at": func.least(ChatSession.created_at, stmt.excluded.created_at),
+            "last_message_at": func.greatest(ChatSession.last_message_at, stmt.excluded.last_message_at),
+            "message_count": func.greatest(ChatSession.message_count, stmt.excluded.message_count),
+        },
+        where=(ChatSession.message_count < stmt.excluded.message_count)
+        | (ChatSession.created_at > stmt.excluded.created_at)
+        | ChatSession.title.is_(None),
+    )
+
+def migrate(engine):
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+        for statement in STATEMENTS:
+            conn.execute(text(statement))
+        for table, column, index in UNIQUE_INDEXES:
+            ensure_unique(conn, table, column, index)
+        return conn.execute(sessions_backfill()).rowcount
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
 from datetime import datetime
 from db.database import Base
 
@@ -12,11 +12,15 @@ class ChatMessage(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     title = Column(String, nullable=True)
 
+    __table_args__ = (
+        Index("ix_chat_messages_session_created_id", "session_id", "created_at", "id"),
+    )
+
 class JobApplication(Base):
     __tablename__ = "job_applications"
 
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(String, index=True)
+    session_id = Column(String, index=True, unique=True)
     state = Column(String, default="APPLICATION_STARTED")
     name = Column(String)
     email = Column(String)
@@ -24,4 +28,32 @@ class JobApplication(Base):
     job_role = Column(String)
     experience = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
\ No newline at end of file
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ConversationSummary(Base):
+    __tablename__ = "conversation_summaries"
+
+    session_id = Column(String, primary_key=True)
+    summary = Column(Text, nullable=False, default="")
+    summarized_until_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ChatSession(Base):
+    __tablename__ = "chat_sessions"
+
+    id = Column(String, primary_key=True)
+    title = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_message_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    message_count = Column(Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        Index("ix_chat_sessions_last_message_at_id", "last_message_at", "id"),
+    )
+
+class WorkflowState(Base):
+    __tablename__ = "workflow_states"
+
+    session_id = Column(String, primary_key=True)
+    data = Column(Text, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -1,12 +1,15 @@
 import streamlit as st
 import requests
 import uuid
+import json
 import websockets.sync.client as ws_sync
 import time
 
 API_URL = "http://127.0.0.1:8000/chat"
 WS_URL = "ws://127.0.0.1:8000/chat/ws"
 NEW_CHAT_LABEL = "New Chat (Start Fresh)"
+REPLY_TIMEOUT = 60
+SESSIONS_PAGE_LIMIT = 200
 
 st.set_page_config(page_title="RAG Chatbot", page_icon="🤖", layout="wide")
 st.title("Chatbot using RAG 🔍")
@@ -22,41 +25,72 @@ if "ws_connection" not in st.session_state:
         st.session_state.ws_connection = None
         st.session_state.connection_established = False
 
+def send_frame(frame):
+    try:
+        st.session_state.ws_connection.send(json.dumps(frame))
+    except Exception:
+        st.session_state.ws_connection = ws_sync.connect(f"{WS_URL}/global")
+        st.session_state.connection_established = True
+        st.session_state.ws_connection.send(json.dumps(frame))
+
+def stream_reply(session_id, message):
+    request_id = uuid.uuid4().hex
+    send_frame({"type": "ask", "id": request_id, "session_id": session_id, "query": message})
+    while True:
+        frame = json.loads(st.session_state.ws_connection.recv(timeout=REPLY_TIMEOUT))
+        if frame.get("type") == "ping":
+            send_frame({"type": "pong", "ts": frame.get("ts")})
+            continue
+        if frame.get("id") != request_id:
+            continue
+        if frame["type"] == "token":
+            yield frame["token"]
+        elif frame["type"] == "error":
+            raise Exception(frame["detail"])
+        elif frame["type"] in ("done", "cancelled"):
+            return
+
 def send_message(session_id, message):
     if not st.session_state.get("connection_established"):
         st.error("WebSocket connection not available")
         return None
-    formatted_message = f"{session_id}|{message}"
     try:
-        st.session_state.ws_connection.send(formatted_message)
-        response = st.session_state.ws_connection.recv()
-        return response
+        return "".join(stream_reply(session_id, message))
     except Exception as e:
-        try:
-            st.session_state.ws_connection = ws_sync.connect(f"{WS_URL}/global")
-            st.session_state.connection_established = True
-            st.session_state.ws_connection.send(formatted_message)
-            response = st.session_state.ws_connection.recv()
-            return response
-        except Exception as e:
-            st.session_state.connection_established = False
-            return f"❌ Connection error: {e}"
+        st.session_state.connection_established = False
+        return f"❌ Connection error: {e}"
 
 def load_sessions():
+    all_sessions = []
+    session_id_map = {}
+    params = {"limit": SESSIONS_PAGE_LIMIT}
     try:
-        sessions_resp = requests.get(f"{API_URL}/sessions/")
-        if sessions_resp.status_code == 200:
-            all_sessions_data = sessions_resp.json().get("sessions", [])
-            all_sessions = []
-            session_id_map = {}
-            for s in all_sessions_data:
+        while True:
+            sessions_resp = requests.get(f"{API_URL}/sessions/", params=params)
+            if sessions_resp.status_code != 200:
+                break
+            page = sessions_resp.json()
+            for s in page.get("sessions", []):
                 title = s.get("title") or s.get("id")
                 all_sessions.append(title)
                 session_id_map[title] = s["id"]
-            return all_sessions, session_id_map
+            if not page.get("next_cursor"):
+                break
+            params["cursor"] = page["next_cursor"]
     except Exception as e:
         st.error(f"Error loading sessions: {e}")
-    return [], {}
+    return all_sessions, session_id_map
+
+def load_history(session_id, before=None):
+    params = {"before": before} if before else {}
+    try:
+        history_resp = requests.get(f"{API_URL}/history/{session_id}", params=params)
+        if history_resp.status_code == 200:
+            page = history_resp.json()
+            return page.get("messages", []), page.get("older_cursor")
+    except Exception:
+        pass
+    return [], None
 
 all_sessions, session_id_map = load_sessions()
 
@@ -68,6 +102,8 @@ if "messages" not in st.session_state:
     st.session_state.messages = []
 if "session_loaded_from_db" not in st.session_state:
     st.session_state.session_loaded_from_db = False
+if "history_cursor" not in st.session_state:
+    st.session_state.history_cursor = None
 if "show_confirm_delete" not in st.session_state:
     st.session_state.show_confirm_delete = False
 if "last_session_refresh" not in st.session_state:
@@ -86,14 +122,7 @@ if url_session_id and not st.session_state.session_loaded_from_db:
         if sid == url_session_id:
             st.session_state.selected_session = title
             st.session_state.session_id = sid
-            try:
-                history_resp = requests.get(f"{API_URL}/history/{sid}")
-                if history_resp.status_code == 200:
-                    st.session_state.messages = history_resp.json()
-                else:
-                    st.session_state.messages = []
-            except Exception:
-                st.session_state.messages = []
+            st.session_state.messages, st.session_state.history_cursor = load_history(sid)
             st.session_state.session_loaded_from_db = True
             break
 
@@ -115,17 +144,11 @@ if selected != st.session_state.selected_session:
     st.session_state.session_loaded_from_db = False
 
     if selected != NEW_CHAT_LABEL:
-        try:
-            history_resp = requests.get(f"{API_URL}/history/{st.session_state.session_id}")
-            if history_resp.status_code == 200:
-                st.session_state.messages = history_resp.json()
-            else:
-                st.session_state.messages = []
-        except Exception:
-            st.session_state.messages = []
+        st.session_state.messages, st.session_state.history_cursor = load_history(st.session_state.session_id)
         st.session_state.session_loaded_from_db = True
     else:
         st.session_state.messages = []
+        st.session_state.history_cursor = None
         st.session_state.session_id = None
         st.query_params.clear()
     st.rerun()
@@ -160,6 +183,14 @@ if selected != NEW_CHAT_LABEL:
                 st.session_state.show_confirm_delete = False
                 st.rerun()
 
+if st.session_state.history_cursor and st.session_state.session_id:
+    if st.button("⬆️ Load older messages"):
+        older, st.session_state.history_cursor = load_history(
+            st.session_state.session_id, before=st.session_state.history_cursor
+        )
+        st.session_state.messages = older + st.session_state.messages
+        st.rerun()
+
 for msg in st.session_state.messages:
     with st.chat_message(msg["role"]):
         st.markdown(msg["content"])
@@ -169,6 +200,7 @@ if prompt := st.chat_input("Type your question here..."):
         new_id = str(uuid.uuid4())
         st.session_state.session_id = new_id
         st.session_state.messages = []
+        st.session_state.history_cursor = None
         st.query_params["session"] = new_id
 
     st.session_state.messages.append({"role": "user", "content": prompt})
@@ -180,29 +212,15 @@ if prompt := st.chat_input("Type your question here..."):
         response_placeholder.markdown("▌")
 
         if st.session_state.session_id:
-            st.session_state.ws_connection.send(f"{st.session_state.session_id}|{prompt}")
             full_response = ""
-            start_time = time.time()
-            timeout = 30
-            while time.time() - start_time < timeout:
-                try:
-                    chunk = st.session_state.ws_connection.recv(timeout=0.1)
-                    if chunk is not None:
-                        full_response += chunk
-                        response_placeholder.markdown(full_response + "▌")
-                        start_time = time.time()
-                except TimeoutError:
-                    if full_response and len(full_response) > 10:
-                        if time.time() - start_time > 2.0:
-                            break
-                    continue
-                except Exception as e:
-                    if full_response:
-                        break
-                    else:
-                        st.error(f"Error receiving response: {e}")
-                        full_response = f"❌ Error: {e}"
-                        break
+            try:
+                for chunk in stream_reply(st.session_state.session_id, prompt):
+                    full_response += chunk
+                    response_placeholder.markdown(full_response + "▌")
+            except Exception as e:
+                if not full_response:
+                    st.error(f"Error receiving response: {e}")
+                    full_response = f"❌ Error: {e}"
             response_placeholder.markdown(full_response)
             st.session_state.messages.append({"role": "assistant", "content": full_response})
 
@@ -1,8 +1,46 @@
+import time
+
+PROCESS_STARTED = time.perf_counter()
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
+from services.registry import Registry
+from utils.metrics import metrics
+from utils.tracing import TracingMiddleware
 from routes import chat_routes
 from routes import chat_ws
 
-app = FastAPI(title="RAG Chatbot API")
+IMPORTS_MS = round((time.perf_counter() - PROCESS_STARTED) * 1000, 2)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    registry = Registry(PROCESS_STARTED)
+    registry.timings["import_app_ms"] = IMPORTS_MS
+    app.state.registry = registry
+    await registry.start()
+    try:
+        yield
+    finally:
+        await registry.close()
+
+app = FastAPI(title="RAG Chatbot API", lifespan=lifespan)
+app.add_middleware(TracingMiddleware)
 
 app.include_router(chat_routes.router, prefix="/chat")
-app.include_router(chat_ws.router, prefix="/chat")
\ No newline at end of file
+app.include_router(chat_ws.router, prefix="/chat")
+
+@app.get("/health")
+async def health():
+    return app.state.registry.health()
+
+@app.get("/ready")
+async def ready():
+    registry = app.state.registry
+    if not registry.ready:
+        return JSONResponse(status_code=503, content={"ready": False, "errors": registry.errors})
+    return {"ready": True, "index_version": registry.rag_service.index.version}
+
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -1,64 +1,180 @@
+import asyncio
+import json
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from db.database import SessionLocal, Base, engine
-from services.pdf_service import PDFService
-from services.rag_service import RAGService
-from services.chat_service import ChatService
-
-Base.metadata.create_all(bind=engine)
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.database import AsyncSessionLocal
+from services.ingest_service import IngestQueueFull
+from utils.collection_names import DEFAULT_COLLECTION, CollectionNotFound
+from utils.llm_gateway import LLMOverloaded
+from services.registry import Registry, get_registry
 
 router = APIRouter()
 
-rag_service = RAGService()
-pdf_service = PDFService(rag_service)
-
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 class QuestionRequest(BaseModel):
     query: str
     session_id: str
+    collections: list[str] = None
 
-@router.post("/upload_pdf/")
-async def upload_pdf(file: UploadFile = File(...)):
+class SearchParamsRequest(BaseModel):
+    nprobe: int = None
+    ef_search: int = None
+
+@router.post("/upload_pdf/", status_code=202)
+async def upload_pdf(file: UploadFile = File(...), doc_id: str = None, collection: str = DEFAULT_COLLECTION,
+                     registry: Registry = Depends(get_registry)):
     try:
-        return await pdf_service.process_pdf_file(file)
+        job = await registry.ingest_queue.submit(file, doc_id, collection)
+        return {"job_id": job.id, "stage": job.stage, "status_url": f"/chat/ingest_jobs/{job.id}"}
+    except IngestQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/ingest_jobs/{job_id}")
+async def get_ingest_job(job_id: str, registry: Registry = Depends(get_registry)):
+    job = registry.ingest_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    return job.to_dict()
+
+@router.get("/collections/")
+async def get_collections(registry: Registry = Depends(get_registry)):
+    return await asyncio.to_thread(registry.rag_service.collections.stats)
+
+@router.get("/documents/")
+async def get_documents(collection: str = None, registry: Registry = Depends(get_registry)):
+    try:
+        documents = await asyncio.to_thread(registry.rag_service.list_documents, collection)
+        return {"documents": [
+            {"collection": name, "doc_id": k, "chunks": v}
+            for name, docs in documents.items() for k, v in docs.items()
+        ]}
+    except CollectionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/documents/{doc_id}")
+async def delete_document(doc_id: str, collection: str = DEFAULT_COLLECTION, registry: Registry = Depends(get_registry)):
+    try:
+        deleted = await asyncio.to_thread(registry.rag_service.delete_document, doc_id, collection)
+    except CollectionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"detail": f"Document {doc_id} deleted successfully."}
+
+@router.get("/stats/embedding_cache")
+async def get_embedding_cache_stats(registry: Registry = Depends(get_registry)):
+    return registry.rag_service.embeddings.stats()
+
+@router.get("/stats/index")
+async def get_index_stats(registry: Registry = Depends(get_registry)):
+    return await asyncio.to_thread(registry.rag_service.collections.stats)
+
+@router.put("/index/search_params")
+async def set_search_params(request: SearchParamsRequest, registry: Registry = Depends(get_registry)):
+    registry.rag_service.collections.configure(request.nprobe, request.ef_search)
+    return await asyncio.to_thread(registry.rag_service.collections.stats)
+
+@router.get("/stats/query_batcher")
+async def get_query_batcher_stats(registry: Registry = Depends(get_registry)):
+    return registry.rag_service.query_batcher.stats()
+
+@router.get("/stats/intent_router")
+async def get_intent_router_stats(registry: Registry = Depends(get_registry)):
+    return registry.rag_service.intent_router.stats()
+
+@router.get("/stats/answer_cache")
+async def get_answer_cache_stats(registry: Registry = Depends(get_registry)):
+    return registry.rag_service.answer_cache.stats()
+
+@router.get("/stats/llm_gateway")
+async def get_llm_gateway_stats(registry: Registry = Depends(get_registry)):
+    return registry.rag_service.fallback_llm.stats()
+
+@router.get("/stats/message_writer")
+async def get_message_writer_stats(registry: Registry = Depends(get_registry)):
+    return registry.message_writer.stats()
+
 @router.post("/ask_question/")
-async def ask_question(request: QuestionRequest, db: Session = Depends(get_db)):
+async def ask_question(request: QuestionRequest, db: AsyncSession = Depends(get_db),
+                       registry: Registry = Depends(get_registry)):
     try:
-        chat_service = ChatService(db, rag_service)
-        return chat_service.handle_user_query(request.session_id, request.query)
+        chat_service = registry.chat_service(db)
+        return await chat_service.handle_user_query(request.session_id, request.query, request.collections)
+    except LLMOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except CollectionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/ask_question/stream")
+async def ask_question_stream(request: QuestionRequest, registry: Registry = Depends(get_registry)):
+    async def event_stream():
+        async with AsyncSessionLocal() as db:
+            try:
+                chat_service = registry.chat_service(db)
+                parts = []
+                async for token in chat_service.stream_user_query(request.session_id, request.query,
+                                                                  request.collections):
+                    parts.append(token)
+                    yield f"data: {json.dumps({'token': token})}\n\n"
+                yield f"event: done\ndata: {json.dumps({'query': request.query, 'answer': ''.join(parts)})}\n\n"
+            except Exception as e:
+                code = (503 if isinstance(e, LLMOverloaded) else 404 if isinstance(e, CollectionNotFound)
+                        else 400 if isinstance(e, ValueError) else 500)
+                yield f"event: error\ndata: {json.dumps({'code': code, 'detail': str(e)})}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.get("/history/{session_id}")
-async def get_history(session_id: str, db: Session = Depends(get_db)):
+async def get_history(session_id: str, before: str = None, after: str = None, limit: int = None,
+                      compact: bool = False, db: AsyncSession = Depends(get_db),
+                      registry: Registry = Depends(get_registry)):
     try:
-        chat_service = ChatService(db, rag_service)
-        return chat_service.get_chat_history(session_id)
+        chat_service = registry.chat_service(db)
+        return await chat_service.get_chat_history(session_id, before, after, limit, compact)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/sessions/")
-async def get_sessions(db: Session = Depends(get_db)):
+async def get_sessions(limit: int = None, cursor: str = None, db: AsyncSession = Depends(get_db),
+                       registry: Registry = Depends(get_registry)):
     try:
-        chat_service = ChatService(db, rag_service)
-        return chat_service.get_all_sessions()
+        chat_service = registry.chat_service(db)
+        return await chat_service.get_all_sessions(limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/delete_session/{session_id}")
-async def delete_session(session_id: str, db: Session = Depends(get_db)):
+async def delete_session(session_id: str, db: AsyncSession = Depends(get_db),
+                         registry: Registry = Depends(get_registry)):
     try:
-        chat_service = ChatService(db, rag_service)
-        return chat_service.delete_session(session_id)
+        chat_service = registry.chat_service(db)
+        return await chat_service.delete_session(session_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
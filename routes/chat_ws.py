@@ -1,38 +1,178 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
-from sqlalchemy.orm import Session
-from db.database import SessionLocal
-from services.chat_service import ChatService
-from services.rag_service import RAGService
 import asyncio
+import json
+import os
+import time
+import uuid
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from db.database import AsyncSessionLocal
+from utils.collection_names import CollectionNotFound
+from utils.llm_gateway import LLMOverloaded
+from utils.metrics import ws_connections, ws_requests_in_flight
+from utils.tracing import trace
+
+WS_MAX_IN_FLIGHT = int(os.getenv("WS_MAX_IN_FLIGHT", "8"))
+WS_HEARTBEAT_INTERVAL = float(os.getenv("WS_HEARTBEAT_INTERVAL", "20"))
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "300"))
+WS_MAX_QUERY_LENGTH = int(os.getenv("WS_MAX_QUERY_LENGTH", "8000"))
 
 router = APIRouter()
-rag_service = RAGService()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+class ChatSocket:
+    def __init__(self, websocket: WebSocket, client_id: str):
+        self.websocket = websocket
+        self.client_id = client_id
+        self.registry = websocket.app.state.registry
+        self.tasks = {}
+        self.legacy = True
+        self.last_received = time.monotonic()
+        self.last_sent = time.monotonic()
+        self._send_lock = asyncio.Lock()
+        self._legacy_lock = asyncio.Lock()
+
+    async def send(self, frame: dict):
+        async with self._send_lock:
+            await self.websocket.send_text(json.dumps(frame))
+            self.last_sent = time.monotonic()
+
+    async def send_raw(self, text: str):
+        async with self._send_lock:
+            await self.websocket.send_text(text)
+            self.last_sent = time.monotonic()
+
+    async def run(self):
+        heartbeat = asyncio.create_task(self.heartbeat())
+        try:
+            while True:
+                data = await self.websocket.receive_text()
+                self.last_received = time.monotonic()
+                await self.dispatch(data)
+        except WebSocketDisconnect:
+            print(f"Client disconnected: {self.client_id}")
+        finally:
+            heartbeat.cancel()
+            tasks = list(self.tasks.values())
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(heartbeat, *tasks, return_exceptions=True)
+
+    async def heartbeat(self):
+        interval = min(WS_HEARTBEAT_INTERVAL, WS_IDLE_TIMEOUT)
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            if not self.tasks and now - self.last_received >= WS_IDLE_TIMEOUT:
+                await self.websocket.close(code=1001, reason="idle timeout")
+                return
+            if not self.legacy and now - self.last_sent >= WS_HEARTBEAT_INTERVAL:
+                await self.send({"type": "ping", "ts": time.time()})
+
+    def parse(self, data: str):
+        try:
+            frame = json.loads(data)
+        except ValueError:
+            frame = None
+        if isinstance(frame, dict):
+            self.legacy = False
+            return frame
+        if "|" in data:
+            session_id, query = data.split("|", 1)
+        else:
+            session_id, query = self.client_id, data
+        return {"type": "ask", "session_id": session_id, "query": query, "legacy": True}
+
+    async def dispatch(self, data: str):
+        frame = self.parse(data)
+        kind = frame.get("type")
+        request_id = str(frame.get("id") or uuid.uuid4().hex)
+        if kind == "ping":
+            await self.send({"type": "pong", "ts": frame.get("ts")})
+        elif kind == "pong":
+            return
+        elif kind == "cancel":
+            task = self.tasks.get(request_id)
+            if task:
+                task.cancel()
+        elif kind == "ask":
+            await self.submit(request_id, frame)
+        else:
+            await self.send({"type": "error", "id": frame.get("id"), "code": 400,
+                             "detail": f"Unknown frame type {kind!r}"})
+
+    async def submit(self, request_id: str, frame: dict):
+        query = frame.get("query")
+        error = None
+        if not isinstance(query, str) or not query.strip():
+            error = (400, "'query' must be a non-empty string")
+        elif len(query) > WS_MAX_QUERY_LENGTH:
+            error = (413, f"'query' is longer than {WS_MAX_QUERY_LENGTH} characters")
+        elif request_id in self.tasks:
+            error = (409, f"Request {request_id} is already in flight")
+        elif len(self.tasks) >= WS_MAX_IN_FLIGHT:
+            error = (429, f"Too many requests in flight on this connection (limit {WS_MAX_IN_FLIGHT})")
+        if error:
+            if frame.get("legacy"):
+                await self.send_raw(f"❌ {error[1]}")
+            else:
+                await self.send({"type": "error", "id": request_id, "code": error[0], "detail": error[1]})
+            return
+        task = asyncio.create_task(self.queued(request_id, frame) if frame.get("legacy") else
+                                   self.answer(request_id, frame))
+        self.tasks[request_id] = task
+        ws_requests_in_flight.inc()
+        task.add_done_callback(lambda _: self.finish(request_id))
+
+    def finish(self, request_id: str):
+        self.tasks.pop(request_id, None)
+        ws_requests_in_flight.dec()
+
+    async def queued(self, request_id: str, frame: dict):
+        async with self._legacy_lock:
+            await self.answer(request_id, frame)
+
+    async def answer(self, request_id: str, frame: dict):
+        session_id = str(frame.get("session_id") or self.client_id)
+        legacy = frame.get("legacy", False)
+        parts = []
+        try:
+            with trace("ws_message", session_id=session_id, client_id=self.client_id, message_id=request_id):
+                async with AsyncSessionLocal() as db:
+                    chat_service = self.registry.chat_service(db)
+                    async for token in chat_service.stream_user_query(session_id, frame["query"],
+                                                                      frame.get("collections")):
+                        parts.append(token)
+                        if legacy:
+                            await self.send_raw(token)
+                        else:
+                            await self.send({"type": "token", "id": request_id, "token": token})
+            if not legacy:
+                await self.send({"type": "done", "id": request_id, "session_id": session_id,
+                                 "answer": "".join(parts)})
+        except asyncio.CancelledError:
+            if not legacy:
+                await asyncio.shield(self.send_quietly({"type": "cancelled", "id": request_id}))
+            raise
+        except Exception as e:
+            if legacy:
+                await self.send_quietly(f"❌ Something went wrong: {e}")
+            else:
+                code = (503 if isinstance(e, LLMOverloaded) else 404 if isinstance(e, CollectionNotFound)
+                        else 400 if isinstance(e, ValueError) else 500)
+                await self.send_quietly({"type": "error", "id": request_id, "code": code, "detail": str(e)})
+
+    async def send_quietly(self, frame):
+        try:
+            if isinstance(frame, str):
+                await self.send_raw(frame)
+            else:
+                await self.send(frame)
+        except Exception:
+            pass
 
 @router.websocket("/ws/{client_id}")
-async def websocket_endpoint(websocket: WebSocket, client_id: str, db: Session = Depends(get_db)):
+async def websocket_endpoint(websocket: WebSocket, client_id: str):
     await websocket.accept()
-    chat_service = ChatService(db, rag_service)
+    ws_connections.inc()
     try:
-        while True:
-            data = await websocket.receive_text()
-            if "|" in data:
-                session_id, message_content = data.split("|", 1)
-            else:
-                session_id = client_id
-                message_content = data
-            response_dict = chat_service.handle_user_query(session_id, message_content)
-            answer = response_dict.get("answer", "")
-
-            chunk_size = 50
-            for i in range(0, len(answer), chunk_size):
-                await websocket.send_text(answer[i:i+chunk_size])
-                await asyncio.sleep(0.05)
-    except WebSocketDisconnect:
-        print(f"Client disconnected: {client_id}")
\ No newline at end of file
+        await ChatSocket(websocket, client_id).run()
+    finally:
+        ws_connections.dec()
@@ -0,0 +1,125 @@
+import os
+import re
+import threading
+import time
+import numpy as np
+from utils.embedding_cache import normalize_text
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "500"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+
+CONTEXTUAL_PATTERN = re.compile(
+    r"\b(it|its|this|that|these|those|they|them|he|she|his|her|above|previous|earlier|again|more|else)\b", re.I
+)
+
+class SemanticAnswerCache:
+    def __init__(self, max_entries=ANSWER_CACHE_SIZE, threshold=ANSWER_CACHE_THRESHOLD, ttl=ANSWER_CACHE_TTL):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        self.version = None
+        self.matrix = None
+        self.entries = []
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def is_standalone(self, query: str, history: list = None):
+        if not any(msg["role"] in ("user", "assistant") for msg in history or []):
+            return True
+        return len(query.split()) >= 4 and not CONTEXTUAL_PATTERN.search(query)
+
+    def _normalize(self, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def _keep(self, keep):
+        self.entries = [self.entries[i] for i in keep]
+        self.matrix = self.matrix[keep] if keep else None
+
+    def _check_version(self, version):
+        self.version = version
+        current = dict(version)
+        keep = [i for i, entry in enumerate(self.entries)
+                if all(current.get(name, seen) == seen for name, seen in entry["version"])]
+        if len(keep) != len(self.entries):
+            self.invalidations += 1
+            self._keep(keep)
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        keep = [i for i, entry in enumerate(self.entries) if entry["created_at"] >= cutoff]
+        if len(keep) != len(self.entries):
+            self.evictions += len(self.entries) - len(keep)
+            self._keep(keep)
+
+    def skip(self):
+        with self._lock:
+            self.skipped += 1
+
+    def text_key(self, query: str):
+        return normalize_text(query).casefold()
+
+    def lookup_text(self, query: str, version):
+        key = self.text_key(query)
+        with self._lock:
+            self._check_version(version)
+            self._expire()
+            for entry in self.entries:
+                if entry["key"] == key and entry["version"] == version:
+                    entry["hits"] += 1
+                    self.hits += 1
+                    return entry["answer"]
+            return None
+
+    def lookup(self, vector, version):
+        with self._lock:
+            self._check_version(version)
+            self._expire()
+            rows = [i for i, entry in enumerate(self.entries) if entry["version"] == version]
+            if rows:
+                similarities = self.matrix[rows] @ self._normalize(vector)
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entry = self.entries[rows[best]]
+                    entry["hits"] += 1
+                    self.hits += 1
+                    return entry["answer"]
+            self.misses += 1
+            return None
+
+    def store(self, vector, version, query: str, answer: str):
+        with self._lock:
+            self._check_version(version)
+            row = self._normalize(vector)[None, :]
+            if len(self.entries) >= self.max_entries:
+                oldest = min(range(len(self.entries)), key=lambda i: self.entries[i]["created_at"])
+                del self.entries[oldest]
+                self.matrix = np.delete(self.matrix, oldest, axis=0)
+                self.evictions += 1
+            self.entries.append({"query": query, "key": self.text_key(query), "answer": answer, "version": version,
+                                 "created_at": time.time(), "hits": 0})
+            self.matrix = row if self.matrix is None else np.vstack([self.matrix, row])
+
+    def clear(self):
+        with self._lock:
+            self.matrix = None
+            self.entries = []
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "capacity": self.max_entries,
+            "index_version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "skipped": self.skipped,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
@@ -1,20 +1,53 @@
+import json
+from datetime import datetime
 from db.models import JobApplication
-from sqlalchemy.orm import Session
-
-application_sessions = {}
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from services.workflow_store import workflow_store
 
 class ApplicationService:
     required_fields = ["name", "email", "company", "job_role", "experience"]
 
+    def __init__(self, store=None):
+        self.store = store or workflow_store
+        self.sessions = {}
+        self.loaded = {}
+
+    def remember(self, session_id: str, state: dict):
+        if state is None:
+            self.sessions.pop(session_id, None)
+        else:
+            self.sessions[session_id] = state
+        self.loaded[session_id] = json.dumps(state, sort_keys=True)
+
+    def changes(self):
+        for session_id, snapshot in self.loaded.items():
+            state = self.sessions.get(session_id)
+            if json.dumps(state, sort_keys=True) != snapshot:
+                yield session_id, state
+
+    async def aload(self, db: AsyncSession, session_id: str):
+        if session_id not in self.loaded:
+            self.remember(session_id, await self.store.aget(db, session_id))
+
+    async def asave(self, db: AsyncSession):
+        for session_id, state in list(self.changes()):
+            if state is None:
+                await self.store.adelete(db, session_id)
+            else:
+                await self.store.aput(db, session_id, state)
+            self.remember(session_id, state)
+
     def start_application(self, session_id: str):
-        application_sessions[session_id] = {
+        self.sessions[session_id] = {
             "state": "APPLICATION_STARTED",
             "data": {field: None for field in self.required_fields}
         }
         return "Let's start your job application! Please provide your name:"
 
     def get_session(self, session_id: str):
-        return application_sessions.get(session_id)
+        return self.sessions.get(session_id)
 
     def update_field(self, session_id: str, field: str, value: str):
         session = self.get_session(session_id)
@@ -39,56 +72,40 @@ class ApplicationService:
                 return field
         return None
 
-    def confirm_application(self, session_id: str, db: Session):
+    def prepare_confirmation(self, session_id: str):
         session = self.get_session(session_id)
         if not session:
-            return "No active application found."
+            return None
         data = session["data"]
         for k, v in data.items():
             if v is not None:
                 data[k] = str(v).strip()
             else:
                 data[k] = None
-        try:
-            existing_app = db.query(JobApplication).filter(JobApplication.session_id == session_id).first()
-            if existing_app:
-                existing_app.name = data.get("name")
-                existing_app.email = data.get("email")
-                existing_app.company = data.get("company")
-                existing_app.job_role = data.get("job_role")
-                existing_app.experience = data.get("experience")
-            else:
-                job_app = JobApplication(
-                    session_id=session_id,
-                    name=data.get("name"),
-                    email=data.get("email"),
-                    company=data.get("company"),
-                    job_role=data.get("job_role"),
-                    experience=data.get("experience"),
-                )
-                db.add(job_app)
-            db.commit()
-            del application_sessions[session_id]
-            message = (
-                f"✅ Application confirmed and submitted successfully!\n\n"
-                f"Name: {data.get('name')}\n\n"
-                f"Email: {data.get('email')}\n\n"
-                f"Company: {data.get('company')}\n\n"
-                f"Job Role: {data.get('job_role')}\n\n"
-                f"Experience: {data.get('experience')}"
-            )
-            return message
-        except Exception as e:
-            db.rollback()
-            return f"❌ Failed to confirm application: {e}"
+        return data
+
+    def confirmation_message(self, data: dict):
+        return (
+            f"✅ Application confirmed and submitted successfully!\n\n"
+            f"Name: {data.get('name')}\n\n"
+            f"Email: {data.get('email')}\n\n"
+            f"Company: {data.get('company')}\n\n"
+            f"Job Role: {data.get('job_role')}\n\n"
+            f"Experience: {data.get('experience')}"
+        )
+
+    def application_upsert(self, session_id: str, data: dict):
+        values = {field: data.get(field) for field in self.required_fields}
+        return insert(JobApplication).values(session_id=session_id, **values).on_conflict_do_update(
+            index_elements=[JobApplication.session_id],
+            set_={**values, "updated_at": datetime.utcnow()},
+        )
 
     def cancel_application(self, session_id: str):
-        if session_id in application_sessions:
-            del application_sessions[session_id]
+        self.sessions.pop(session_id, None)
         return "Application canceled."
 
-    def view_application(self, session_id: str, db: Session):
-        app = db.query(JobApplication).filter(JobApplication.session_id == session_id).first()
+    def application_details(self, app: JobApplication):
         if not app:
             return "❌ No application found for your session."
         return (
@@ -100,21 +117,47 @@ class ApplicationService:
             f"Experience: {app.experience or 'N/A'}"
         )
 
-    def update_application(self, session_id: str, db: Session, field: str, value: str):
-        app = db.query(JobApplication).filter(JobApplication.session_id == session_id).first()
+    def validate_update(self, app: JobApplication, field: str):
         if not app:
             return "❌ No existing application found to update."
         if field not in self.required_fields:
             return f"⚠️ '{field}' is not a valid field. Valid fields are: {', '.join(self.required_fields)}"
+        return None
+
+class AsyncApplicationService(ApplicationService):
+    async def get_application(self, session_id: str, db: AsyncSession):
+        result = await db.execute(select(JobApplication).where(JobApplication.session_id == session_id).limit(1))
+        return result.scalars().first()
+
+    async def confirm_application(self, session_id: str, db: AsyncSession):
+        data = self.prepare_confirmation(session_id)
+        if data is None:
+            return "No active application found."
+        try:
+            await db.execute(self.application_upsert(session_id, data))
+            await db.commit()
+            del self.sessions[session_id]
+            return self.confirmation_message(data)
+        except Exception as e:
+            await db.rollback()
+            return f"❌ Failed to confirm application: {e}"
+
+    async def view_application(self, session_id: str, db: AsyncSession):
+        return self.application_details(await self.get_application(session_id, db))
+
+    async def update_application(self, session_id: str, db: AsyncSession, field: str, value: str):
+        app = await self.get_application(session_id, db)
+        error = self.validate_update(app, field)
+        if error:
+            return error
         setattr(app, field, value.strip())
-        db.commit()
-        db.refresh(app)
+        await db.commit()
         return f"✅ Your {field} has been updated to '{value.strip()}'.\n"
 
-    def delete_application(self, session_id: str, db: Session):
-        app = db.query(JobApplication).filter(JobApplication.session_id == session_id).first()
+    async def delete_application(self, session_id: str, db: AsyncSession):
+        app = await self.get_application(session_id, db)
         if not app:
             return "❌ No application found to delete."
-        db.delete(app)
-        db.commit()
-        return "🗑️ Your job application has been permanently deleted."
\ No newline at end of file
+        await db.delete(app)
+        await db.commit()
+        return "🗑️ Your job application has been permanently deleted."
@@ -1,135 +1,252 @@
-from sqlalchemy.orm import Session
-from db.models import ChatMessage
+from datetime import datetime, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.database import AsyncSessionLocal
+from db.models import ChatMessage, ChatSession, ConversationSummary
 from services.rag_service import RAGService
-from services.application_service import ApplicationService
+from services.memory_service import ConversationMemory
+from services.title_service import title_service
+from services.message_writer import message_writer
+from services.application_service import AsyncApplicationService
+from utils.pagination import encode_cursor, decode_cursor
+from utils.tracing import trace, span, record_llm
+from utils.llm_gateway import LLMOverloaded
 from langchain.schema import HumanMessage
-from sqlalchemy import desc, func
+from sqlalchemy import select, delete, tuple_
+import asyncio
 import json
+import os
 
-class ChatService:
-    def __init__(self, db: Session, rag_service: RAGService):
+SESSIONS_PAGE_SIZE = int(os.getenv("SESSIONS_PAGE_SIZE", "50"))
+SESSIONS_MAX_PAGE_SIZE = int(os.getenv("SESSIONS_MAX_PAGE_SIZE", "200"))
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "50"))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "500"))
+
+background_tasks = set()
+summary_refreshes = set()
+
+class AsyncChatService:
+    def __init__(self, db: AsyncSession, rag_service: RAGService):
         self.db = db
         self.rag_service = rag_service
-        self.workflow_service = ApplicationService()
+        self.workflow_service = AsyncApplicationService()
+        self.memory = ConversationMemory(rag_service.fallback_llm)
+
+    async def save_turn(self, session_id: str, query: str, answer: str = None, started_at: datetime = None):
+        turn = message_writer.turn(session_id, query, answer, started_at)
+        await message_writer.submit(self.db, turn, self.rag_service.fallback_llm)
 
-    def save_user_message(self, session_id: str, content: str):
-        first_msg = (
-            self.db.query(ChatMessage)
-            .filter(ChatMessage.session_id == session_id)
-            .first()
+    def sessions_page_query(self, limit: int = None, cursor: str = None):
+        limit = min(limit or SESSIONS_PAGE_SIZE, SESSIONS_MAX_PAGE_SIZE)
+        query = (
+            select(ChatSession)
+            .order_by(ChatSession.last_message_at.desc(), ChatSession.id.desc())
+            .limit(limit + 1)
         )
-        title = None
-        if not first_msg:
-            title = self.generate_session_title_from_content(content)
-
-        msg = ChatMessage(session_id=session_id, role="user", content=content, title=title)
-        self.db.add(msg)
-        self.db.commit()
-        self.db.refresh(msg)
-        return msg
-
-    def save_assistant_message(self, session_id: str, content: str):
-        msg = ChatMessage(session_id=session_id, role="assistant", content=content)
-        self.db.add(msg)
-        self.db.commit()
-        self.db.refresh(msg)
-        return msg
-
-    def generate_session_title_from_content(self, content: str):
-        prompt = f"Generate a concise 3–5 word title for this chat:\n\n{content}"
-        try:
-            response = self.rag_service.fallback_llm.invoke([HumanMessage(content=prompt)])
-            title = response.content.strip()
-            if (title.startswith('"') and title.endswith('"')) or (title.startswith("'") and title.endswith("'")):
-                title = title[1:-1].strip()
-            return title if title else None
-        except Exception:
-            return None
-
-    def delete_session(self, session_id: str):
-        messages = self.db.query(ChatMessage).filter(ChatMessage.session_id == session_id).all()
-        if not messages:
+        if cursor:
+            last_message_at, session_id = decode_cursor(cursor, datetime, str)
+            query = query.where(tuple_(ChatSession.last_message_at, ChatSession.id) < tuple_(last_message_at, session_id))
+        return query, limit
+
+    def sessions_page(self, rows, limit: int):
+        page = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = encode_cursor(page[-1].last_message_at, page[-1].id)
+        return {
+            "sessions": [
+                {
+                    "id": s.id,
+                    "title": s.title or s.id,
+                    "created_at": s.created_at,
+                    "last_message_at": s.last_message_at,
+                    "message_count": s.message_count,
+                }
+                for s in page
+            ],
+            "next_cursor": next_cursor,
+        }
+
+    def delete_statements(self, session_id: str):
+        return [
+            delete(ChatMessage).where(ChatMessage.session_id == session_id),
+            delete(ConversationSummary).where(ConversationSummary.session_id == session_id),
+            delete(ChatSession).where(ChatSession.id == session_id),
+        ]
+
+    async def delete_session(self, session_id: str):
+        message_writer.discard(session_id)
+        messages, summary, session = self.delete_statements(session_id)
+        deleted = (await self.db.execute(messages)).rowcount
+        if not deleted:
+            await self.db.rollback()
             raise Exception("Session not found")
-        for msg in messages:
-            self.db.delete(msg)
-        self.db.commit()
+        await self.db.execute(summary)
+        await self.db.execute(session)
+        await self.db.commit()
+        self.memory.forget(session_id)
         return {"detail": f"Session {session_id} deleted successfully."}
 
-    def get_all_sessions(self):
-        sub_latest = (
-            self.db.query(
-                ChatMessage.session_id,
-                func.max(ChatMessage.created_at).label("latest_time")
-            )
-            .group_by(ChatMessage.session_id)
-            .subquery()
-        )
+    async def get_all_sessions(self, limit: int = None, cursor: str = None):
+        query, limit = self.sessions_page_query(limit, cursor)
+        return self.sessions_page((await self.db.execute(query)).scalars().all(), limit)
 
-        latest_msgs = (
-            self.db.query(ChatMessage)
-            .join(
-                sub_latest,
-                (ChatMessage.session_id == sub_latest.c.session_id)
-                & (ChatMessage.created_at == sub_latest.c.latest_time)
-            )
-            .order_by(desc(ChatMessage.created_at))
-            .all()
-        )
+    async def get_chat_history(self, session_id: str, before: str = None, after: str = None,
+                               limit: int = None, compact: bool = False):
+        query, limit, forward = self.history_page_query(session_id, before, after, limit)
+        return self.history_page((await self.db.execute(query)).all(), limit, forward, after, compact)
 
-        session_list = []
-        for msg in latest_msgs:
-            title = (
-                self.db.query(ChatMessage.title)
-                .filter(
-                    ChatMessage.session_id == msg.session_id,
-                    ChatMessage.title.isnot(None)
-                )
-                .order_by(ChatMessage.created_at.asc())
-                .first()
-            )
-            title = title[0] if title else msg.session_id
-            session_list.append({"id": msg.session_id, "title": title})
-        return {"sessions": session_list}
-
-    def get_chat_history(self, session_id: str):
-        messages = (
-            self.db.query(ChatMessage)
-            .filter(ChatMessage.session_id == session_id)
-            .order_by(ChatMessage.created_at)
-            .all()
+    def history_page_query(self, session_id: str, before: str = None, after: str = None, limit: int = None):
+        if before and after:
+            raise ValueError("Use either 'before' or 'after', not both")
+        limit = min(limit or HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE)
+        position = tuple_(ChatMessage.created_at, ChatMessage.id)
+        query = (
+            select(ChatMessage.id, ChatMessage.role, ChatMessage.content, ChatMessage.created_at)
+            .where(ChatMessage.session_id == session_id)
+            .limit(limit + 1)
         )
-        return [{"role": m.role, "content": m.content, "created_at": m.created_at} for m in messages]
-
-    def handle_user_query(self, session_id: str, query: str):
-        self.save_user_message(session_id, query)
-        history = self.get_last_messages(session_id)
-        response = self.process_query(session_id, query, history=history)
-        self.save_assistant_message(session_id, response["answer"])
-        return response
-
-    def get_last_messages(self, session_id: str, limit: int = None):
-        query = self.db.query(ChatMessage).filter(ChatMessage.session_id == session_id).order_by(
-            ChatMessage.created_at.desc())
-        if limit:
-            query = query.limit(limit)
-        messages = query.all()
-        return [{"role": m.role, "content": m.content} for m in messages]
-
-    def process_query(self, session_id: str, query: str, history: list = None):
+        if after:
+            query = query.where(position > tuple_(*decode_cursor(after, datetime, int)))
+            return query.order_by(ChatMessage.created_at, ChatMessage.id), limit, True
+        if before:
+            query = query.where(position < tuple_(*decode_cursor(before, datetime, int)))
+        return query.order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()), limit, False
+
+    def history_page(self, rows, limit: int, forward: bool, after: str = None, compact: bool = False):
+        has_more = len(rows) > limit
+        page = rows[:limit]
+        if not forward:
+            page.reverse()
+        if compact:
+            messages = [{"r": m.role, "c": m.content, "t": m.created_at.replace(tzinfo=timezone.utc).timestamp()} for m in page]
+        else:
+            messages = [{"id": m.id, "role": m.role, "content": m.content, "created_at": m.created_at} for m in page]
+        return {
+            "messages": messages,
+            "older_cursor": encode_cursor(page[0].created_at, page[0].id) if page and (forward or has_more) else None,
+            "newer_cursor": encode_cursor(page[-1].created_at, page[-1].id) if page else after,
+            "has_more": has_more,
+        }
+
+    async def load_history(self, session_id: str):
+        history, boundary_id = await self.memory.aload(self.db, session_id)
+        return history + message_writer.pending_messages(session_id), boundary_id
+
+    async def handle_user_query(self, session_id: str, query: str, collections: list = None):
+        self.rag_service.collections.require(collections)
+        started_at = datetime.utcnow()
+        with trace("handle_user_query", session_id=session_id):
+            with span("load_history"):
+                history, boundary_id = await self.load_history(session_id)
+            response = await self.process_query(session_id, query, history=history, collections=collections)
+            with span("save_turn"):
+                await self.save_turn(session_id, query, response["answer"], started_at)
+            self.after_reply(session_id, boundary_id)
+            return response
+
+    def after_reply(self, session_id: str, boundary_id: int = None):
+        if boundary_id:
+            self.refresh_summary(session_id, boundary_id)
+        if title_service.pending:
+            title_service.aschedule()
+
+    def refresh_summary(self, session_id: str, boundary_id: int):
+        if session_id in summary_refreshes:
+            return
+        summary_refreshes.add(session_id)
+        task = asyncio.create_task(self._refresh_summary(session_id, boundary_id))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+        task.add_done_callback(lambda _: summary_refreshes.discard(session_id))
+
+    async def _refresh_summary(self, session_id: str, boundary_id: int):
+        async with AsyncSessionLocal() as db:
+            try:
+                await self.memory.aupdate_summary(db, session_id, boundary_id)
+            except Exception:
+                await db.rollback()
+
+    async def process_query(self, session_id: str, query: str, history: list = None, collections: list = None):
+        with span("route"):
+            response = await self.route_query(session_id, query)
+        if response is not None:
+            return response
+        answer = (await self.get_answer(query, history, collections)).get("answer")
+        return {"answer": answer}
+
+    async def stream_user_query(self, session_id: str, query: str, collections: list = None):
+        self.rag_service.collections.require(collections)
+        started_at = datetime.utcnow()
+        with span("load_history"):
+            history, boundary_id = await self.load_history(session_id)
+        parts = []
+        try:
+            with span("route"):
+                response = await self.route_query(session_id, query)
+            if response is not None:
+                parts.append(response["answer"])
+                yield response["answer"]
+            else:
+                async for token in self.rag_service.astream_answer(query, history, collections):
+                    parts.append(token)
+                    yield token
+        except LLMOverloaded:
+            parts = None
+            raise
+        finally:
+            if parts is not None:
+                with span("save_turn"):
+                    await self.save_turn(session_id, query, "".join(parts).strip() or None, started_at)
+        self.after_reply(session_id, boundary_id)
+
+    async def route_query(self, session_id: str, query: str):
+        await self.workflow_service.aload(self.db, session_id)
+        try:
+            return await self.dispatch_query(session_id, query)
+        finally:
+            await self.workflow_service.asave(self.db)
+
+    async def dispatch_query(self, session_id: str, query: str):
+        action, response = self.route_workflow(session_id, query)
+        if action == "answer":
+            return response
+        if action == "confirm":
+            return {"answer": await self.workflow_service.confirm_application(session_id, self.db)}
+        action = self.resolve_action(query, await self.detect_intent(query))
+        if action == "start":
+            return {"answer": self.workflow_service.start_application(session_id)}
+        if action == "view":
+            return {"answer": await self.workflow_service.view_application(session_id, self.db)}
+        if action == "update":
+            try:
+                messages = []
+                for field, value in self.parse_updates(query):
+                    if field is None:
+                        messages.append(value)
+                        continue
+                    messages.append(await self.workflow_service.update_application(session_id, self.db, field, value))
+                return {"answer": "\n".join(messages)}
+            except Exception as e:
+                return {"answer": f"❌ Could not parse update command: {e}"}
+        if action == "delete":
+            return {"answer": await self.workflow_service.delete_application(session_id, self.db)}
+        return None
+
+    def route_workflow(self, session_id: str, query: str):
         workflow_session = self.workflow_service.get_session(session_id)
         if "apply" in query.lower() and "job" in query.lower():
             answer = self.workflow_service.start_application(session_id)
-            return {"answer": answer}
+            return "answer", {"answer": answer}
         if workflow_session:
             state = workflow_session["state"]
             if query.lower() in ["cancel", "exit", "stop"]:
-                return {"answer": self.workflow_service.cancel_application(session_id)}
+                return "answer", {"answer": self.workflow_service.cancel_application(session_id)}
             if state == "AWAITING_CONFIRMATION" and query.lower() in ["yes", "confirm"]:
-                return {"answer": self.workflow_service.confirm_application(session_id, self.db)}
+                return "confirm", None
             next_field = self.workflow_service.next_missing_field(session_id)
             if next_field:
                 if len(query.split()) > 6 or "tell me" in query.lower() or "what" in query.lower():
-                    return {
+                    return "answer", {
                         "answer": (
                             f"You're currently filling your job application. "
                             f"Please provide your **{next_field}**, or type **'cancel'** to stop the application."
@@ -138,58 +255,52 @@ class ChatService:
                 self.workflow_service.update_field(session_id, next_field, query)
                 next_field = self.workflow_service.next_missing_field(session_id)
                 if next_field:
-                    return {"answer": f"Got it! Please provide your {next_field} next."}
+                    return "answer", {"answer": f"Got it! Please provide your {next_field} next."}
                 else:
                     workflow_session["state"] = "AWAITING_CONFIRMATION"
-                    return {"answer": "All details collected. Please confirm your application (yes/no)."}
-        intent = self.check_intent(query)
+                    return "answer", {"answer": "All details collected. Please confirm your application (yes/no)."}
+        return None, None
+
+    def parse_intent(self, intent: str):
         try:
-            intent = json.loads(intent).get("action", "none")
+            return json.loads(intent).get("action", "none")
         except:
-            intent = "none"
-        if "start" in intent or query.lower() in ["/apply", "apply for a job", "start application"]:
-            answer = self.workflow_service.start_application(session_id)
-            return {"answer": answer}
+            return "none"
 
+    def resolve_action(self, query: str, intent: str):
+        if "start" in intent or query.lower() in ["/apply", "apply for a job", "start application"]:
+            return "start"
         if "view" in intent or "show application" in query.lower():
-            answer = self.workflow_service.view_application(session_id, self.db)
-            return {"answer": answer}
-
+            return "view"
         if "update" in intent or "change" in query.lower():
-            try:
-                updates_str = query.split("update", 1)[1]
-                updates_str = updates_str.replace(",", " and ")
-                updates_list = [u.strip() for u in updates_str.split(" and ") if u.strip()]
-                field_aliases = {
-                    "mail": "email",
-                    "role": "job_role",
-                    "company name": "company"
-                }
-                messages = []
-                for item in updates_list:
-                    if "to" not in item:
-                        messages.append(f"⚠️ Could not understand: '{item}'")
-                        continue
-                    field_part, value_part = item.split("to", 1)
-                    field = field_part.replace("my", "").replace("the", "").strip()
-                    if field in field_aliases:
-                        field = field_aliases[field]
-                    value = value_part.strip()
-                    result = self.workflow_service.update_application(session_id, self.db, field, value)
-                    messages.append(result)
-                return {"answer": "\n".join(messages)}
-            except Exception as e:
-                return {"answer": f"❌ Could not parse update command: {e}"}
-
+            return "update"
         if "delete" in intent or "remove" in query.lower():
-            answer = self.workflow_service.delete_application(session_id, self.db)
-            return {"answer": answer}
+            return "delete"
+        return None
 
-        answer = self.get_answer(query, history).get("answer")
-        return {"answer": answer}
+    def parse_updates(self, query: str):
+        updates_str = query.split("update", 1)[1]
+        updates_str = updates_str.replace(",", " and ")
+        updates_list = [u.strip() for u in updates_str.split(" and ") if u.strip()]
+        field_aliases = {
+            "mail": "email",
+            "role": "job_role",
+            "company name": "company"
+        }
+        updates = []
+        for item in updates_list:
+            if "to" not in item:
+                updates.append((None, f"⚠️ Could not understand: '{item}'"))
+                continue
+            field_part, value_part = item.split("to", 1)
+            field = field_part.replace("my", "").replace("the", "").strip()
+            if field in field_aliases:
+                field = field_aliases[field]
+            updates.append((field, value_part.strip()))
+        return updates
 
-    def check_intent(self, query: str):
-        prompt = f"""
+    def intent_prompt(self, query: str):
+        return f"""
             User message: {query}
 
             Identify the user's intent for job application management.
@@ -202,8 +313,18 @@ class ChatService:
 
             Reply in JSON: {{"action": "<one_of_above>"}}
             """
-        result = self.rag_service.fallback_llm.invoke([HumanMessage(content=prompt)])
+
+    async def detect_intent(self, query: str):
+        async def llm_classify(q):
+            return self.parse_intent(await self.check_intent(q))
+        with span("intent"):
+            return await self.rag_service.intent_router.aclassify(query, llm_classify)
+
+    async def check_intent(self, query: str):
+        with span("intent_llm"):
+            result = await self.rag_service.fallback_llm.ainvoke([HumanMessage(content=self.intent_prompt(query))])
+        record_llm("intent", result)
         return result.content
 
-    def get_answer(self, query: str, history: list = None):
-        return self.rag_service.get_answer(query, history)
\ No newline at end of file
+    async def get_answer(self, query: str, history: list = None, collections: list = None):
+        return await self.rag_service.aget_answer(query, history, collections)
@@ -0,0 +1,105 @@
+import os
+import numpy as np
+from langchain.schema import SystemMessage
+from utils.tokenizer import count_tokens
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))
+CONTEXT_FETCH_K = int(os.getenv("CONTEXT_FETCH_K", "20"))
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.95"))
+CONTEXT_MIN_OVERLAP = 20
+CONTEXT_MAX_OVERLAP = 400
+
+CONTEXT_HEADER = "Answer using the excerpts from the indexed documents below. If they do not contain the answer, say so."
+
+def overlap_length(left: str, right: str):
+    longest = min(len(left), len(right), CONTEXT_MAX_OVERLAP)
+    for size in range(longest, CONTEXT_MIN_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+class ContextBuilder:
+    def __init__(self, token_budget=CONTEXT_TOKEN_BUDGET, fetch_k=CONTEXT_FETCH_K,
+                 mmr_lambda=CONTEXT_MMR_LAMBDA, dedup_threshold=CONTEXT_DEDUP_THRESHOLD):
+        self.token_budget = token_budget
+        self.fetch_k = fetch_k
+        self.mmr_lambda = mmr_lambda
+        self.dedup_threshold = dedup_threshold
+
+    def _normalize(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def select(self, query_vector, docs, doc_vectors):
+        if not docs:
+            return []
+        candidates = self._normalize(doc_vectors)
+        relevance = candidates @ self._normalize(query_vector)
+        similarity = candidates @ candidates.T
+        selected, used, remaining = [], 0, list(range(len(docs)))
+        redundancy = np.full(len(docs), -1.0, dtype=np.float32)
+        while remaining:
+            scores = self.mmr_lambda * relevance[remaining] - (1 - self.mmr_lambda) * np.maximum(redundancy[remaining], 0)
+            best = remaining.pop(int(np.argmax(scores)))
+            if redundancy[best] >= self.dedup_threshold:
+                continue
+            tokens = count_tokens(docs[best].page_content)
+            if used + tokens > self.token_budget:
+                continue
+            used += tokens
+            selected.append(best)
+            redundancy = np.maximum(redundancy, similarity[best])
+        return selected
+
+    def passages(self, docs, selected):
+        rank = {i: position for position, i in enumerate(selected)}
+        ordered = sorted(selected, key=lambda i: (
+            str(docs[i].metadata.get("collection")), str(docs[i].metadata.get("doc_id")), docs[i].metadata.get("chunk", 0)
+        ))
+        passages = []
+        for i in ordered:
+            doc = docs[i]
+            chunk = doc.metadata.get("chunk")
+            source = (doc.metadata.get("collection"), doc.metadata.get("doc_id"))
+            last = passages[-1] if passages else None
+            if last and chunk is not None and last["source"] == source and last["last_chunk"] == chunk - 1:
+                last["text"] += doc.page_content[overlap_length(last["text"], doc.page_content):]
+                last["last_chunk"] = chunk
+                last["rank"] = min(last["rank"], rank[i])
+                continue
+            passages.append({
+                "source": source,
+                "collection": doc.metadata.get("collection"),
+                "doc_id": doc.metadata.get("doc_id"),
+                "first_chunk": chunk,
+                "last_chunk": chunk,
+                "text": doc.page_content,
+                "rank": rank[i],
+            })
+        return sorted(passages, key=lambda passage: passage["rank"])
+
+    def format(self, passages):
+        blocks = []
+        for n, passage in enumerate(passages, 1):
+            source = passage["doc_id"] or "unknown"
+            if passage["collection"]:
+                source = f"{passage['collection']}/{source}"
+            if passage["first_chunk"] is not None:
+                chunks = passage["first_chunk"] if passage["first_chunk"] == passage["last_chunk"] else \
+                    f"{passage['first_chunk']}-{passage['last_chunk']}"
+                source = f"{source}, chunk {chunks}"
+            blocks.append(f"[{n}] ({source})\n{passage['text'].strip()}")
+        return f"{CONTEXT_HEADER}\n\n<context>\n" + "\n\n".join(blocks) + "\n</context>"
+
+    def build(self, query_vector, docs, doc_vectors):
+        selected = self.select(query_vector, docs, doc_vectors)
+        if not selected:
+            return None, {"candidates": len(docs), "selected": 0, "tokens": 0}
+        content = self.format(self.passages(docs, selected))
+        return SystemMessage(content=content), {
+            "candidates": len(docs),
+            "selected": len(selected),
+            "tokens": count_tokens(content),
+        }
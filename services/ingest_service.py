@@ -0,0 +1,118 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from utils.collection_names import DEFAULT_COLLECTION, validate_collection
+from utils.tracing import trace
+
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "1"))
+INGEST_MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", "20"))
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "200"))
+
+class IngestQueueFull(Exception):
+    pass
+
+class IngestJob:
+    def __init__(self, filename: str, doc_id: str, collection: str):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.doc_id = doc_id
+        self.collection = collection
+        self.stage = "queued"
+        self.pages = 0
+        self.pages_total = None
+        self.chunks = 0
+        self.chunks_total = None
+        self.error = None
+        self.result = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.timings = {}
+        self._stage_started = time.monotonic()
+
+    def add_time(self, name: str, seconds: float):
+        self.timings[name] = round(self.timings.get(name, 0.0) + seconds, 4)
+
+    def set_stage(self, stage: str):
+        now = time.monotonic()
+        self.add_time(self.stage, now - self._stage_started)
+        self.stage = stage
+        self._stage_started = now
+        if stage in ("done", "failed"):
+            self.finished_at = time.time()
+
+    @property
+    def finished(self):
+        return self.stage in ("done", "failed")
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "filename": self.filename,
+            "doc_id": self.doc_id,
+            "collection": self.collection,
+            "stage": self.stage,
+            "pages": self.pages,
+            "pages_total": self.pages_total,
+            "chunks": self.chunks,
+            "chunks_total": self.chunks_total,
+            "error": self.error,
+            "result": self.result,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "timings": self.timings,
+        }
+
+class IngestJobQueue:
+    def __init__(self, pdf_service, max_workers=INGEST_CONCURRENCY,
+                 max_pending=INGEST_MAX_PENDING, history=INGEST_JOB_HISTORY):
+        self.pdf_service = pdf_service
+        self.max_pending = max_pending
+        self.history = history
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self.jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def pending(self):
+        return sum(1 for job in self.jobs.values() if not job.finished)
+
+    async def submit(self, file, doc_id: str = None, collection: str = DEFAULT_COLLECTION):
+        validate_collection(collection)
+        with self._lock:
+            if self.pending() >= self.max_pending:
+                raise IngestQueueFull("Too many ingestion jobs in progress, please retry later.")
+            job = IngestJob(file.filename, doc_id or file.filename, collection)
+            self.jobs[job.id] = job
+            self._prune()
+        try:
+            file_path = await self.pdf_service.save_upload(file, job.id)
+        except Exception as e:
+            job.error = str(e)
+            job.set_stage("failed")
+            raise
+        asyncio.get_running_loop().run_in_executor(self.executor, self._run, job, file_path)
+        return job
+
+    def _run(self, job: IngestJob, file_path: str):
+        try:
+            with trace("ingest_file", request_id=job.id, doc_id=job.doc_id, collection=job.collection,
+                       filename=job.filename):
+                job.result = self.pdf_service.ingest_file(file_path, job.doc_id, job, job.collection)
+            job.set_stage("done")
+        except Exception as e:
+            job.error = str(e)
+            job.set_stage("failed")
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self.jobs[job_id]
+
+    def get(self, job_id: str):
+        return self.jobs.get(job_id)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
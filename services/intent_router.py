@@ -0,0 +1,159 @@
+import os
+import re
+import threading
+import time
+import numpy as np
+
+INTENT_SIMILARITY_THRESHOLD = float(os.getenv("INTENT_SIMILARITY_THRESHOLD", "0.55"))
+INTENT_MARGIN = float(os.getenv("INTENT_MARGIN", "0.05"))
+
+DOMAIN_PATTERN = re.compile(r"\b(apply|applying|application|job|resume|cv|email|mail|company|role|experience|my name)\b", re.I)
+
+INTENT_RULES = [
+    ("start", re.compile(r"^/apply$|\b(start|begin|new|submit|fill)\b.*\b(job )?application\b", re.I)),
+    ("view", re.compile(r"\b(view|show|see|check|display)\b.*\bapplication\b", re.I)),
+    ("delete", re.compile(r"\b(delete|remove|withdraw|erase)\b.*\bapplication\b", re.I)),
+    ("update", re.compile(r"\b(update|change|edit|modify)\b.*\b(name|e?mail|company|role|experience)\b", re.I)),
+]
+
+INTENT_EXAMPLES = {
+    "start": [
+        "I want to apply for a job",
+        "start a new job application",
+        "can I submit an application",
+        "begin my application",
+        "I'd like to apply for the open role",
+    ],
+    "view": [
+        "show my application",
+        "what details did I submit",
+        "view my job application",
+        "let me see my application status",
+    ],
+    "update": [
+        "update my email to someone@example.com",
+        "change my company to Acme",
+        "edit my experience in the application",
+        "I need to correct my job role",
+    ],
+    "delete": [
+        "delete my application",
+        "remove my job application",
+        "withdraw my application",
+        "I don't want my application anymore, erase it",
+    ],
+    "none": [
+        "how many leave days do I get",
+        "what is the notice period",
+        "what is the work from home policy",
+        "who do I contact for payroll questions",
+        "what are the office hours",
+        "how do I change my email signature",
+        "is there a dress code at work",
+    ],
+}
+
+class IntentRouter:
+    def __init__(self, embeddings, threshold=INTENT_SIMILARITY_THRESHOLD, margin=INTENT_MARGIN):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.margin = margin
+        self.labels = None
+        self.matrix = None
+        self.counts = {"rule": 0, "embedding": 0, "llm": 0}
+        self.latency = {"rule": 0.0, "embedding": 0.0, "llm": 0.0}
+        self._lock = threading.Lock()
+
+    def match_rules(self, query: str):
+        text = query.strip()
+        if not DOMAIN_PATTERN.search(text) and text.lower() != "/apply":
+            return "none"
+        for intent, pattern in INTENT_RULES:
+            if pattern.search(text):
+                return intent
+        return None
+
+    def load_examples(self, vectors=None):
+        with self._lock:
+            if self.matrix is not None:
+                return
+            labels, texts = [], []
+            for label, examples in INTENT_EXAMPLES.items():
+                labels.extend([label] * len(examples))
+                texts.extend(examples)
+            if vectors is None:
+                vectors = self.embeddings.embed_documents(texts)
+            matrix = np.asarray(vectors, dtype=np.float32)
+            self.matrix = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+            self.labels = labels
+
+    def example_texts(self):
+        return [text for examples in INTENT_EXAMPLES.values() for text in examples]
+
+    def score(self, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        similarities = self.matrix @ (vector / np.linalg.norm(vector))
+        best = {}
+        for label, similarity in zip(self.labels, similarities):
+            best[label] = max(best.get(label, -1.0), float(similarity))
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)
+        intent, top = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else -1.0
+        if top >= self.threshold and top - runner_up >= self.margin:
+            return intent
+        return None
+
+    def record(self, source: str, started: float):
+        with self._lock:
+            self.counts[source] += 1
+            self.latency[source] += time.perf_counter() - started
+
+    def classify(self, query: str, llm_classify):
+        started = time.perf_counter()
+        intent = self.match_rules(query)
+        if intent is not None:
+            self.record("rule", started)
+            return intent
+        try:
+            if self.matrix is None:
+                self.load_examples()
+            intent = self.score(self.embeddings.embed_query(query))
+        except Exception:
+            intent = None
+        if intent is not None:
+            self.record("embedding", started)
+            return intent
+        intent = llm_classify(query)
+        self.record("llm", started)
+        return intent
+
+    async def aclassify(self, query: str, llm_classify):
+        started = time.perf_counter()
+        intent = self.match_rules(query)
+        if intent is not None:
+            self.record("rule", started)
+            return intent
+        try:
+            if self.matrix is None:
+                self.load_examples(await self.embeddings.aembed_documents(self.example_texts()))
+            intent = self.score(await self.embeddings.aembed_query(query))
+        except Exception:
+            intent = None
+        if intent is not None:
+            self.record("embedding", started)
+            return intent
+        intent = await llm_classify(query)
+        self.record("llm", started)
+        return intent
+
+    def stats(self):
+        total = sum(self.counts.values())
+        return {
+            "total": total,
+            "counts": dict(self.counts),
+            "hit_rate": {source: (count / total if total else 0.0) for source, count in self.counts.items()},
+            "avg_latency_ms": {
+                source: (self.latency[source] / count * 1000 if count else 0.0)
+                for source, count in self.counts.items()
+            },
+        }
@@ -0,0 +1,120 @@
+import os
+from collections import OrderedDict
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from langchain.schema import HumanMessage
+from db.models import ChatMessage, ConversationSummary
+from utils.tokenizer import count_tokens
+
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "1500"))
+MEMORY_FETCH_LIMIT = int(os.getenv("MEMORY_FETCH_LIMIT", "40"))
+MEMORY_SUMMARY_BATCH = int(os.getenv("MEMORY_SUMMARY_BATCH", "200"))
+MEMORY_SUMMARY_MIN_TOKENS = int(os.getenv("MEMORY_SUMMARY_MIN_TOKENS", "400"))
+MEMORY_CACHE_SIZE = int(os.getenv("MEMORY_CACHE_SIZE", "1000"))
+
+summary_cache = OrderedDict()
+
+class ConversationMemory:
+    def __init__(self, llm, token_budget=MEMORY_TOKEN_BUDGET, fetch_limit=MEMORY_FETCH_LIMIT,
+                 summary_min_tokens=MEMORY_SUMMARY_MIN_TOKENS):
+        self.llm = llm
+        self.token_budget = token_budget
+        self.fetch_limit = fetch_limit
+        self.summary_min_tokens = summary_min_tokens
+
+    def cached_state(self, session_id: str):
+        state = summary_cache.get(session_id)
+        if state is not None:
+            summary_cache.move_to_end(session_id)
+        return state
+
+    def cache_state(self, session_id: str, summary: str, until_id: int):
+        summary_cache[session_id] = (summary, until_id)
+        summary_cache.move_to_end(session_id)
+        while len(summary_cache) > MEMORY_CACHE_SIZE:
+            summary_cache.popitem(last=False)
+
+    def forget(self, session_id: str):
+        summary_cache.pop(session_id, None)
+
+    def window_query(self, session_id: str, until_id: int):
+        return (
+            select(ChatMessage.id, ChatMessage.role, ChatMessage.content)
+            .where(ChatMessage.session_id == session_id, ChatMessage.id > until_id)
+            .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+            .limit(self.fetch_limit)
+        )
+
+    def overflow_query(self, session_id: str, until_id: int, before_id: int):
+        return (
+            select(ChatMessage.id, ChatMessage.role, ChatMessage.content)
+            .where(
+                ChatMessage.session_id == session_id,
+                ChatMessage.id > until_id,
+                ChatMessage.id < before_id,
+            )
+            .order_by(ChatMessage.created_at, ChatMessage.id)
+            .limit(MEMORY_SUMMARY_BATCH)
+        )
+
+    def build_window(self, rows, summary: str):
+        budget = self.token_budget - (count_tokens(summary) if summary else 0)
+        window = []
+        for row in rows:
+            tokens = count_tokens(row.content)
+            if window and tokens > budget:
+                break
+            budget -= tokens
+            window.append(row)
+        overflow = sum(count_tokens(row.content) for row in rows[len(window):])
+        window.reverse()
+        history = []
+        if summary:
+            history.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+        history.extend({"role": row.role, "content": row.content} for row in window)
+        due = overflow >= self.summary_min_tokens or len(rows) >= self.fetch_limit
+        boundary_id = window[0].id if window and due else None
+        return history, boundary_id
+
+    def summary_prompt(self, summary: str, rows):
+        transcript = "\n".join(f"{row.role}: {row.content}" for row in rows)
+        return (
+            "Update the running summary of this conversation with the new turns below. "
+            "Keep names, numbers, decisions and open questions; stay under 150 words.\n\n"
+            f"Current summary:\n{summary or '(none)'}\n\n"
+            f"New turns:\n{transcript}\n\n"
+            "Updated summary:"
+        )
+
+    async def aload_state(self, db: AsyncSession, session_id: str):
+        state = self.cached_state(session_id)
+        if state is None:
+            row = await db.get(ConversationSummary, session_id)
+            state = (row.summary, row.summarized_until_id) if row else ("", 0)
+            self.cache_state(session_id, *state)
+        return state
+
+    async def aload(self, db: AsyncSession, session_id: str):
+        summary, until_id = await self.aload_state(db, session_id)
+        rows = (await db.execute(self.window_query(session_id, until_id))).all()
+        return self.build_window(rows, summary)
+
+    async def aupdate_summary(self, db: AsyncSession, session_id: str, before_id: int):
+        state = await db.get(ConversationSummary, session_id)
+        summary, until_id = (state.summary, state.summarized_until_id) if state else ("", 0)
+        rows = (await db.execute(self.overflow_query(session_id, until_id, before_id))).all()
+        if not rows:
+            return summary
+        response = await self.llm.ainvoke([HumanMessage(content=self.summary_prompt(summary, rows))])
+        summary = response.content.strip()
+        self.save_state(state, db, session_id, summary, rows[-1].id)
+        await db.commit()
+        return summary
+
+    def save_state(self, row, db, session_id: str, summary: str, until_id: int):
+        if row is None:
+            db.add(ConversationSummary(session_id=session_id, summary=summary, summarized_until_id=until_id))
+        else:
+            row.summary = summary
+            row.summarized_until_id = until_id
+        self.cache_state(session_id, summary, until_id)
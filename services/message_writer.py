@@ -0,0 +1,169 @@
+import asyncio
+import os
+from datetime import datetime
+from sqlalchemy import insert as sa_insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.postgresql import insert
+from db.database import AsyncSessionLocal
+from db.models import ChatMessage, ChatSession
+from services.title_service import title_service, placeholder_title
+
+MESSAGE_WRITE_BEHIND = os.getenv("MESSAGE_WRITE_BEHIND", "0") == "1"
+MESSAGE_FLUSH_INTERVAL = float(os.getenv("MESSAGE_FLUSH_INTERVAL", "0.05"))
+MESSAGE_FLUSH_BATCH = int(os.getenv("MESSAGE_FLUSH_BATCH", "200"))
+
+class MessageWriter:
+    def __init__(self, write_behind=MESSAGE_WRITE_BEHIND, flush_interval=MESSAGE_FLUSH_INTERVAL,
+                 flush_batch=MESSAGE_FLUSH_BATCH):
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.buffer = []
+        self.llm = None
+        self.flushes = 0
+        self.flushed_turns = 0
+        self._task = None
+        self._wakeup = None
+
+    def session_upsert(self, turns):
+        per_session = {}
+        for session_id, messages in turns:
+            first = per_session.get(session_id)
+            created_at = messages[0][2]
+            last_at = messages[-1][2]
+            if first is None:
+                per_session[session_id] = {
+                    "id": session_id,
+                    "title": placeholder_title(messages[0][1]),
+                    "created_at": created_at,
+                    "last_message_at": last_at,
+                    "message_count": len(messages),
+                }
+            else:
+                first["last_message_at"] = max(first["last_message_at"], last_at)
+                first["message_count"] += len(messages)
+        stmt = insert(ChatSession).values(list(per_session.values()))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ChatSession.id],
+            set_={
+                "last_message_at": stmt.excluded.last_message_at,
+                "message_count": ChatSession.message_count + stmt.excluded.message_count,
+            },
+        ).returning(ChatSession.id, ChatSession.message_count)
+        return stmt, per_session
+
+    def message_rows(self, turns, new_sessions):
+        rows = []
+        titled = set()
+        for session_id, messages in turns:
+            for role, content, created_at in messages:
+                title = None
+                if session_id in new_sessions and session_id not in titled and role == "user":
+                    title = new_sessions[session_id]["title"]
+                    titled.add(session_id)
+                rows.append({
+                    "session_id": session_id,
+                    "role": role,
+                    "content": content,
+                    "created_at": created_at,
+                    "title": title,
+                })
+        return rows
+
+    def new_sessions(self, returned, per_session):
+        return {
+            session_id: per_session[session_id]
+            for session_id, count in returned
+            if count == per_session[session_id]["message_count"]
+        }
+
+    def existing_titles_query(self, session_ids):
+        return (
+            select(ChatMessage.session_id, ChatMessage.title)
+            .where(ChatMessage.session_id.in_(session_ids), ChatMessage.title.isnot(None))
+            .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+        )
+
+    async def keep_existing_titles(self, db: AsyncSession, new_sessions):
+        if not new_sessions:
+            return
+        titles = dict((await db.execute(self.existing_titles_query(list(new_sessions)))).all())
+        for session_id, title in titles.items():
+            del new_sessions[session_id]
+            await db.execute(update(ChatSession).where(ChatSession.id == session_id).values(title=title))
+
+    def enqueue_titles(self, turns, new_sessions, llm):
+        for session_id, messages in turns:
+            if session_id in new_sessions:
+                title_service.enqueue(llm, session_id, messages[0][1], new_sessions.pop(session_id)["title"])
+
+    async def awrite(self, db: AsyncSession, turns, llm):
+        stmt, per_session = self.session_upsert(turns)
+        new_sessions = self.new_sessions((await db.execute(stmt)).all(), per_session)
+        await self.keep_existing_titles(db, new_sessions)
+        await db.execute(sa_insert(ChatMessage), self.message_rows(turns, new_sessions))
+        await db.commit()
+        self.enqueue_titles(turns, new_sessions, llm)
+
+    def turn(self, session_id: str, user_content: str, assistant_content: str = None, started_at: datetime = None):
+        messages = [("user", user_content, started_at or datetime.utcnow())]
+        if assistant_content is not None:
+            messages.append(("assistant", assistant_content, datetime.utcnow()))
+        return session_id, messages
+
+    async def submit(self, db: AsyncSession, turn, llm):
+        if not self.write_behind:
+            await self.awrite(db, [turn], llm)
+            return
+        self.llm = llm
+        self.buffer.append(turn)
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self.run())
+        if len(self.buffer) >= self.flush_batch:
+            self._wakeup.set()
+
+    async def run(self):
+        while self.buffer:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        turns, self.buffer = self.buffer[:self.flush_batch], self.buffer[self.flush_batch:]
+        if not turns:
+            return
+        try:
+            async with AsyncSessionLocal() as db:
+                await self.awrite(db, turns, self.llm)
+            self.flushes += 1
+            self.flushed_turns += len(turns)
+            if title_service.pending:
+                title_service.aschedule()
+        except Exception as e:
+            self.buffer = turns + self.buffer
+            print(f"Message flush failed: {e}")
+            await asyncio.sleep(self.flush_interval)
+
+    def pending_messages(self, session_id: str):
+        return [
+            {"role": role, "content": content}
+            for sid, messages in self.buffer if sid == session_id
+            for role, content, _ in messages
+        ]
+
+    def discard(self, session_id: str):
+        self.buffer = [turn for turn in self.buffer if turn[0] != session_id]
+
+    def stats(self):
+        return {
+            "write_behind": self.write_behind,
+            "buffered_turns": len(self.buffer),
+            "flushes": self.flushes,
+            "flushed_turns": self.flushed_turns,
+        }
+
+message_writer = MessageWriter()
@@ -1,31 +1,135 @@
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from PyPDF2 import PdfReader
 from langchain.text_splitter import CharacterTextSplitter
 from services.rag_service import RAGService
+from utils.collection_names import DEFAULT_COLLECTION
+from utils.tracing import span
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+PDF_EXTRACT_PROCESSES = int(os.getenv("PDF_EXTRACT_PROCESSES", "0"))
+PDF_EXTRACT_PAGES_PER_TASK = int(os.getenv("PDF_EXTRACT_PAGES_PER_TASK", "16"))
 
 os.makedirs("pdfs", exist_ok=True)
 
+def extract_pages(file_path: str, start: int, stop: int):
+    reader = PdfReader(file_path)
+    return [(reader.pages[i].extract_text() or "") for i in range(start, stop)]
+
 class PDFService:
-    def __init__(self, rag_service: RAGService):
+    def __init__(self, rag_service: RAGService, extract_processes=PDF_EXTRACT_PROCESSES):
         self.rag_service = rag_service
+        self.extract_processes = extract_processes
+        self.extract_pool = ProcessPoolExecutor(max_workers=extract_processes) if extract_processes > 0 else None
 
-    async def process_pdf_file(self, file):
-        file_path = f"pdfs/{file.filename}"
-        content = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(content)
+    async def save_upload(self, file, upload_id: str):
+        file_path = os.path.join("pdfs", f"{upload_id}.pdf")
+        tmp_path = f"{file_path}.part"
+        with span("save_upload"):
+            with open(tmp_path, "wb") as f:
+                while True:
+                    block = await file.read(UPLOAD_CHUNK_SIZE)
+                    if not block:
+                        break
+                    f.write(block)
+            os.replace(tmp_path, file_path)
+        return file_path
 
-        text = self.read_pdf(file_path)
-        chunks = self.split_text(text)
-        self.rag_service.create_vectorstore(chunks)
-        return {"message": "PDF processed and vectorstore created."}
+    def ingest_file(self, file_path: str, doc_id: str, job=None, collection: str = DEFAULT_COLLECTION):
+        if job:
+            job.set_stage("parsing")
+        pages = self.iter_pages(file_path, job)
+        chunks = self.timed(self.iter_chunks(pages), job, "parse_calls")
+        staging = None
+        count = 0
+        for batch in self.iter_batches(chunks, EMBED_BATCH_SIZE):
+            if job and job.stage == "parsing":
+                job.set_stage("embedding")
+            started = time.monotonic()
+            with span("embed_batch", chunks=len(batch)):
+                staging = self.rag_service.stage_batch(staging, doc_id, count, batch)
+            count += len(batch)
+            if job:
+                job.chunks = count
+                job.add_time("embed_calls", time.monotonic() - started)
+        if job:
+            job.chunks_total = count
+            job.set_stage("indexing")
+        with span("publish"):
+            version = self.rag_service.publish_document(doc_id, staging, collection)
+        return {
+            "message": "PDF processed and added to the vectorstore.",
+            "doc_id": doc_id,
+            "collection": collection,
+            "chunks": count,
+            "index_version": version,
+        }
 
-    def read_pdf(self, file_path: str):
+    def iter_pages(self, file_path: str, job=None):
         reader = PdfReader(file_path)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-        return text
+        total = len(reader.pages)
+        if job:
+            job.pages_total = total
+        if self.extract_pool is None:
+            for page in reader.pages:
+                text = page.extract_text() or ""
+                if job:
+                    job.pages += 1
+                yield text
+            return
+        ranges = [(start, min(start + PDF_EXTRACT_PAGES_PER_TASK, total))
+                  for start in range(0, total, PDF_EXTRACT_PAGES_PER_TASK)]
+        window = self.extract_processes * 2
+        pending = []
+        for start, stop in ranges:
+            pending.append(self.extract_pool.submit(extract_pages, file_path, start, stop))
+            if len(pending) >= window:
+                yield from self._drain(pending.pop(0), job)
+        for future in pending:
+            yield from self._drain(future, job)
+
+    def _drain(self, future, job):
+        for text in future.result():
+            if job:
+                job.pages += 1
+            yield text
+
+    def iter_chunks(self, pages, chunk_size=500, chunk_overlap=50):
+        buffer = ""
+        for text in pages:
+            buffer += text + "\n"
+            if len(buffer) < chunk_size * 4:
+                continue
+            chunks = self.split_text(buffer, chunk_size, chunk_overlap)
+            yield from chunks[:-1]
+            buffer = chunks[-1] + "\n" if chunks else ""
+        if buffer.strip():
+            yield from self.split_text(buffer, chunk_size, chunk_overlap)
+
+    def timed(self, items, job, name: str):
+        iterator = iter(items)
+        while True:
+            started = time.monotonic()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                if job:
+                    job.add_time(name, time.monotonic() - started)
+            yield item
+
+    def iter_batches(self, items, size: int):
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
 
     def split_text(self, text: str, chunk_size=500, chunk_overlap=50):
         splitter = CharacterTextSplitter(
@@ -33,4 +137,4 @@ class PDFService:
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap
         )
-        return splitter.split_text(text)
\ No newline at end of file
+        return splitter.split_text(text)
@@ -1,46 +1,205 @@
+import os
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain_community.vectorstores import FAISS
-from langchain.chains import RetrievalQA
-from langchain.schema import HumanMessage, AIMessage
-from utils.vectorstore_utils import save_vectorstore, load_vectorstore
+from langchain.schema import HumanMessage, AIMessage, SystemMessage
+from utils.collection_manager import CollectionManager
+from utils.collection_names import DEFAULT_COLLECTION
+from utils.query_batcher import QueryBatcher
+from utils.llm_gateway import LLMGateway, LLMOverloaded
+from utils.tracing import span, record_llm, bind
+from utils.metrics import context_tokens
+from utils.embedding_cache import EmbeddingCache, CachedEmbeddings
+from services.intent_router import IntentRouter
+from services.answer_cache import SemanticAnswerCache
+from services.context_builder import ContextBuilder
+from utils.vectorstore_utils import clone_vectorstore, document_chunk_ids
 
-VECTORSTORE_PATH = ".vectorstore"
+VECTORSTORE_PATH = os.getenv("VECTORSTORE_PATH", ".vectorstore")
+EMBEDDING_MODEL = "text-embedding-3-small"
 
 class RAGService:
-    def __init__(self):
-        self.embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-        self.fallback_llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0)
-
-    def create_vectorstore(self, chunks):
-        vectorstore = FAISS.from_texts(chunks, self.embeddings)
-        save_vectorstore(vectorstore, VECTORSTORE_PATH)
-
-    def load_rag(self):
-        vectorstore = load_vectorstore(VECTORSTORE_PATH, self.embeddings)
-        retriever = vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 3})
-        qa = RetrievalQA.from_chain_type(
-            llm=ChatOpenAI(model_name="gpt-4o-mini", temperature=0),
-            chain_type="stuff",
-            retriever=retriever
+    def __init__(self, embeddings=None, llm=None):
+        embeddings = embeddings or OpenAIEmbeddings(model=EMBEDDING_MODEL)
+        self.embeddings = CachedEmbeddings(embeddings, EmbeddingCache(model=embeddings.model), embeddings.model)
+        self.fallback_llm = LLMGateway(llm or ChatOpenAI(model_name="gpt-4o-mini", temperature=0, max_retries=0))
+        self.collections = CollectionManager(VECTORSTORE_PATH, self.embeddings)
+        self.intent_router = IntentRouter(self.embeddings)
+        self.answer_cache = SemanticAnswerCache()
+        self.query_batcher = QueryBatcher(self.embeddings, self.collections.search)
+        self.context_builder = ContextBuilder()
+
+    @property
+    def index(self):
+        return self.collections.get(DEFAULT_COLLECTION)
+
+    def stage_batch(self, staging, doc_id: str, offset: int, chunks: list, vectors: list = None):
+        if vectors is None:
+            vectors = self.embeddings.embed_documents(chunks)
+        text_embeddings = list(zip(chunks, vectors))
+        metadatas = [{"doc_id": doc_id, "chunk": offset + i} for i in range(len(chunks))]
+        ids = [f"{doc_id}:{offset + i}" for i in range(len(chunks))]
+        if staging is None:
+            return FAISS.from_embeddings(text_embeddings, self.embeddings, metadatas=metadatas, ids=ids)
+        staging.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        return staging
+
+    def publish_document(self, doc_id: str, staging, collection: str = DEFAULT_COLLECTION):
+        index = self.collections.get(collection, create=True)
+        with self.collections.write_lock(collection, create=True), index.exclusive():
+            snapshot = index.snapshot(force=True)
+            if snapshot is None:
+                return index.publish(staging) if staging is not None else None
+            vectorstore = clone_vectorstore(snapshot.vectorstore)
+            stale_ids = document_chunk_ids(vectorstore, doc_id)
+            if stale_ids:
+                vectorstore.delete(stale_ids)
+            if staging is not None:
+                vectorstore.merge_from(staging)
+            return index.publish(vectorstore)
+
+    def delete_document(self, doc_id: str, collection: str = DEFAULT_COLLECTION):
+        index = self.collections.get(collection)
+        with self.collections.write_lock(collection), index.exclusive():
+            snapshot = index.snapshot(force=True)
+            if snapshot is None:
+                return False
+            stale_ids = document_chunk_ids(snapshot.vectorstore, doc_id)
+            if not stale_ids:
+                return False
+            vectorstore = clone_vectorstore(snapshot.vectorstore)
+            vectorstore.delete(stale_ids)
+            index.publish(vectorstore)
+            return True
+
+    def list_documents(self, collection: str = None):
+        documents = {}
+        for name in [collection] if collection else self.collections.names():
+            found = self.collections.get(name).documents()
+            if found is not None:
+                documents[name] = found
+        return documents
+
+    def load_rag(self, collections: list = None):
+        snapshot = self.collections.snapshot(collections)
+        if snapshot is None:
+            raise Exception("No documents have been indexed yet. Please upload a PDF first.")
+        return snapshot
+
+    def build_messages(self, query_vector, docs, doc_vectors, query: str, history: list = None):
+        context_message, stats = self.context_builder.build(query_vector, docs, doc_vectors)
+        context_tokens.observe(stats["tokens"])
+        bind(context=stats)
+        context_messages = [context_message] if context_message is not None else []
+        if history:
+            for msg in history:
+                if msg["role"] == "user":
+                    context_messages.append(HumanMessage(content=msg["content"]))
+                elif msg["role"] == "system":
+                    context_messages.append(SystemMessage(content=msg["content"]))
+                else:
+                    context_messages.append(AIMessage(content=msg["content"]))
+        context_messages.append(HumanMessage(content=query))
+        return context_messages
+
+    def lookup_answer(self, snapshot, query_vector, query: str, history: list = None):
+        if not self.answer_cache.is_standalone(query, history):
+            self.answer_cache.skip()
+            return None
+        return self.answer_cache.lookup(query_vector, snapshot.version)
+
+    def lookup_exact(self, snapshot, query: str, history: list = None):
+        if not self.answer_cache.is_standalone(query, history):
+            return None
+        return self.answer_cache.lookup_text(query, snapshot.version)
+
+    def retrieve(self, snapshot, query: str, history: list = None):
+        cached = self.lookup_exact(snapshot, query, history)
+        if cached is not None:
+            return None, cached, [], []
+        query_vector = self.embeddings.embed_query(query)
+        cached = self.lookup_answer(snapshot, query_vector, query, history)
+        if cached is not None:
+            return query_vector, cached, [], []
+        docs, doc_vectors = self.collections.search(snapshot, [query_vector], self.context_builder.fetch_k)[0]
+        return query_vector, None, docs, doc_vectors
+
+    async def aretrieve(self, snapshot, query: str, history: list = None):
+        cached = self.lookup_exact(snapshot, query, history)
+        if cached is not None:
+            return None, cached, [], []
+        return await self.query_batcher.retrieve(
+            snapshot, query, self.context_builder.fetch_k,
+            lambda vector: self.lookup_answer(snapshot, vector, query, history),
         )
-        return qa, retriever
 
-    def get_answer(self, query: str, history: list = None):
+    def remember_answer(self, snapshot, query_vector, query: str, answer: str, history: list = None):
+        if not self.answer_cache.is_standalone(query, history):
+            return
+        if query_vector is not None and answer and not answer.startswith("❌"):
+            self.answer_cache.store(query_vector, snapshot.version, query, answer)
+
+    def get_answer(self, query: str, history: list = None, collections: list = None):
+        try:
+            with span("load_rag"):
+                snapshot = self.load_rag(collections)
+            with span("retrieve"):
+                query_vector, cached, docs, doc_vectors = self.retrieve(snapshot, query, history)
+            if cached is not None:
+                return {"query": query, "answer": cached, "cached": True}
+            with span("context"):
+                context_messages = self.build_messages(query_vector, docs, doc_vectors, query, history)
+            with span("llm"):
+                fallback_response = self.fallback_llm.invoke(context_messages)
+            record_llm("answer", fallback_response)
+            answer = fallback_response.content.strip()
+            self.remember_answer(snapshot, query_vector, query, answer, history)
+        except LLMOverloaded:
+            raise
+        except Exception as e:
+            answer = f"❌ Something went wrong: {e}"
+        return {"query": query, "answer": answer}
+
+    async def aget_answer(self, query: str, history: list = None, collections: list = None):
         try:
-            qa, retriever = self.load_rag()
-            docs = retriever.get_relevant_documents(query)
-            context_messages = []
-            for doc in docs:
-                context_messages.append(HumanMessage(content=doc.page_content))
-            if history:
-                for msg in history:
-                    if msg["role"] == "user":
-                        context_messages.append(HumanMessage(content=msg["content"]))
-                    else:
-                        context_messages.append(AIMessage(content=msg["content"]))
-            context_messages.append(HumanMessage(content=query))
-            fallback_response = self.fallback_llm.invoke(context_messages)
+            with span("load_rag"):
+                snapshot = self.load_rag(collections)
+            with span("retrieve"):
+                query_vector, cached, docs, doc_vectors = await self.aretrieve(snapshot, query, history)
+            if cached is not None:
+                return {"query": query, "answer": cached, "cached": True}
+            with span("context"):
+                context_messages = self.build_messages(query_vector, docs, doc_vectors, query, history)
+            with span("llm"):
+                fallback_response = await self.fallback_llm.ainvoke(context_messages)
+            record_llm("answer", fallback_response)
             answer = fallback_response.content.strip()
+            self.remember_answer(snapshot, query_vector, query, answer, history)
+        except LLMOverloaded:
+            raise
         except Exception as e:
             answer = f"❌ Something went wrong: {e}"
-        return {"query": query, "answer": answer}
\ No newline at end of file
+        return {"query": query, "answer": answer}
+
+    async def astream_answer(self, query: str, history: list = None, collections: list = None):
+        try:
+            with span("load_rag"):
+                snapshot = self.load_rag(collections)
+            with span("retrieve"):
+                query_vector, cached, docs, doc_vectors = await self.aretrieve(snapshot, query, history)
+            if cached is not None:
+                yield cached
+                return
+            with span("context"):
+                context_messages = self.build_messages(query_vector, docs, doc_vectors, query, history)
+            parts = []
+            with span("llm_stream"):
+                async for chunk in self.fallback_llm.astream(context_messages):
+                    if chunk.content:
+                        parts.append(chunk.content)
+                        yield chunk.content
+            record_llm("answer", completion_tokens=len(parts))
+            self.remember_answer(snapshot, query_vector, query, "".join(parts).strip(), history)
+        except LLMOverloaded:
+            raise
+        except Exception as e:
+            yield f"❌ Something went wrong: {e}"
@@ -0,0 +1,188 @@
+import asyncio
+import os
+import time
+from fastapi import Request
+from sqlalchemy import text
+from db.database import Base, engine, async_engine, AsyncSessionLocal
+from db.migrations import migrate
+from utils.metrics import metrics, cache_hit_ratio, cache_entries
+
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "50"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+WARMUP_EMBEDDINGS = os.getenv("WARMUP_EMBEDDINGS", "0") == "1"
+MODEL_PROVIDER = os.getenv("MODEL_PROVIDER", "openai").lower()
+
+class Registry:
+    def __init__(self, process_started: float = None):
+        self.process_started = process_started or time.perf_counter()
+        self.ready = False
+        self.timings = {}
+        self.errors = {}
+        self.http_client = None
+        self.http_async_client = None
+        self.rag_service = None
+        self.pdf_service = None
+        self.ingest_queue = None
+        self.message_writer = None
+        self.workflow_store = None
+        self.chat_service_class = None
+        self._sweeper = None
+
+    def record(self, name: str, started: float):
+        self.timings[name] = round((time.perf_counter() - started) * 1000, 2)
+
+    def build(self):
+        started = time.perf_counter()
+        import httpx
+        from services.rag_service import RAGService
+        from services.pdf_service import PDFService
+        from services.chat_service import AsyncChatService
+        from services.ingest_service import IngestJobQueue
+        from services.message_writer import message_writer
+        from services.workflow_store import workflow_store
+        self.record("import_modules_ms", started)
+        started = time.perf_counter()
+        limits = httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS, max_keepalive_connections=OPENAI_MAX_CONNECTIONS)
+        self.http_client = httpx.Client(limits=limits, timeout=OPENAI_TIMEOUT)
+        self.http_async_client = httpx.AsyncClient(limits=limits, timeout=OPENAI_TIMEOUT)
+        embeddings, llm = self.model_clients()
+        self.rag_service = RAGService(embeddings=embeddings, llm=llm)
+        self.pdf_service = PDFService(self.rag_service)
+        self.ingest_queue = IngestJobQueue(self.pdf_service)
+        self.message_writer = message_writer
+        self.workflow_store = workflow_store
+        self.chat_service_class = AsyncChatService
+        metrics.add_collector(self.collect_metrics)
+        self.record("build_clients_ms", started)
+
+    def model_clients(self):
+        if MODEL_PROVIDER == "fake":
+            from utils.fake_providers import HashingEmbeddings, EchoChatModel
+            return HashingEmbeddings(), EchoChatModel()
+        from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+        from services.rag_service import EMBEDDING_MODEL
+        embeddings = OpenAIEmbeddings(
+            model=EMBEDDING_MODEL,
+            http_client=self.http_client,
+            http_async_client=self.http_async_client,
+        )
+        llm = ChatOpenAI(
+            model_name="gpt-4o-mini",
+            temperature=0,
+            max_retries=0,
+            http_client=self.http_client,
+            http_async_client=self.http_async_client,
+        )
+        return embeddings, llm
+
+    async def warmup(self):
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(Base.metadata.create_all, bind=engine)
+            await asyncio.to_thread(migrate, engine)
+            async with async_engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+        except Exception as e:
+            self.errors["database"] = str(e)
+        self.record("warmup_database_ms", started)
+
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(self.rag_service.index.snapshot)
+        except Exception as e:
+            self.errors["index"] = str(e)
+        self.record("warmup_index_ms", started)
+
+        started = time.perf_counter()
+        from utils.tokenizer import get_encoding
+        await asyncio.to_thread(get_encoding)
+        self.record("warmup_tokenizer_ms", started)
+
+        if WARMUP_EMBEDDINGS:
+            started = time.perf_counter()
+            try:
+                router = self.rag_service.intent_router
+                router.load_examples(await self.rag_service.embeddings.aembed_documents(router.example_texts()))
+            except Exception as e:
+                self.errors["embeddings"] = str(e)
+            self.record("warmup_embeddings_ms", started)
+
+        self.ready = "database" not in self.errors
+        self.timings["cold_start_ms"] = round((time.perf_counter() - self.process_started) * 1000, 2)
+
+    async def start(self):
+        self.build()
+        await self.warmup()
+        self._sweeper = asyncio.create_task(self.sweep_workflows())
+
+    async def sweep_workflows(self):
+        from services.workflow_store import WORKFLOW_SWEEP_INTERVAL
+        while True:
+            await asyncio.sleep(WORKFLOW_SWEEP_INTERVAL)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self.workflow_store.asweep(db)
+            except Exception as e:
+                print(f"Workflow sweep failed: {e}")
+
+    async def close(self):
+        self.ready = False
+        if self._sweeper:
+            self._sweeper.cancel()
+        if self.ingest_queue:
+            self.ingest_queue.shutdown()
+        while self.message_writer and self.message_writer.buffer:
+            pending = len(self.message_writer.buffer)
+            await self.message_writer.flush()
+            if len(self.message_writer.buffer) >= pending:
+                break
+        if self.rag_service:
+            self.rag_service.embeddings.cache.flush()
+            self.rag_service.collections.shutdown()
+        if self.http_async_client:
+            await self.http_async_client.aclose()
+        if self.http_client:
+            self.http_client.close()
+        await async_engine.dispose()
+        engine.dispose()
+
+    def collect_metrics(self):
+        embedding_cache = self.rag_service.embeddings.stats()
+        answer_cache = self.rag_service.answer_cache.stats()
+        intent_router = self.rag_service.intent_router.stats()
+        cache_hit_ratio.set(embedding_cache["hit_ratio"], cache="embedding")
+        cache_entries.set(embedding_cache["entries"], cache="embedding")
+        cache_hit_ratio.set(answer_cache["hit_ratio"], cache="answer")
+        cache_entries.set(answer_cache["entries"], cache="answer")
+        if intent_router["total"]:
+            cache_hit_ratio.set(1 - intent_router["hit_rate"]["llm"], cache="intent_router")
+        batcher = self.rag_service.query_batcher.stats()
+        metrics.gauge("rag_query_batch_avg_size", "Average micro-batch size for query retrieval.").set(batcher["avg_batch"])
+        metrics.gauge("rag_message_writer_buffered_turns", "Chat turns waiting for write-behind.").set(
+            self.message_writer.stats()["buffered_turns"]
+        )
+        collection_bytes = metrics.gauge(
+            "rag_collection_memory_bytes", "Estimated memory held by each loaded collection shard.", ("collection",)
+        )
+        for name, manager in list(self.rag_service.collections.managers.items()):
+            collection_bytes.set(manager.memory_bytes, collection=name)
+        gateway = self.rag_service.fallback_llm.stats()
+        metrics.gauge("rag_llm_queue_depth", "LLM calls waiting for a concurrency slot.").set(gateway["queue_depth"])
+        metrics.gauge("rag_llm_active_calls", "LLM calls currently holding a concurrency slot.").set(gateway["active"])
+        metrics.gauge("rag_ready", "1 once warmup has completed.").set(1 if self.ready else 0)
+
+    def chat_service(self, db):
+        return self.chat_service_class(db, self.rag_service)
+
+    def health(self):
+        return {
+            "status": "ok",
+            "ready": self.ready,
+            "uptime_s": round(time.perf_counter() - self.process_started, 1),
+            "index_version": self.rag_service.index.version if self.rag_service else None,
+            "startup": self.timings,
+            "errors": self.errors,
+        }
+
+def get_registry(request: Request):
+    return request.app.state.registry
@@ -0,0 +1,104 @@
+import asyncio
+import json
+import os
+import threading
+from sqlalchemy import update
+from langchain.schema import HumanMessage
+from db.database import AsyncSessionLocal
+from db.models import ChatMessage, ChatSession
+
+TITLE_BATCH_WAIT = float(os.getenv("TITLE_BATCH_WAIT", "0.5"))
+TITLE_BATCH_SIZE = int(os.getenv("TITLE_BATCH_SIZE", "10"))
+
+def placeholder_title(content: str):
+    words = content.split()
+    title = " ".join(words[:6])
+    if len(words) > 6:
+        title += "…"
+    return title[:60] or "New Chat"
+
+def title_prompt(content: str):
+    return f"Generate a concise 3–5 word title for this chat:\n\n{content}"
+
+def batch_title_prompt(contents: list):
+    numbered = "\n".join(f"{i}. {content}" for i, content in enumerate(contents, 1))
+    return (
+        "Generate a concise 3–5 word title for each of these chats.\n"
+        'Reply in JSON mapping each number to its title, e.g. {"1": "<title>", "2": "<title>"}.\n\n'
+        f"{numbered}"
+    )
+
+def clean_title(title: str):
+    title = title.strip()
+    if (title.startswith('"') and title.endswith('"')) or (title.startswith("'") and title.endswith("'")):
+        title = title[1:-1].strip()
+    return title if title else None
+
+class TitleService:
+    def __init__(self):
+        self.pending = {}
+        self.llm = None
+        self._lock = threading.Lock()
+        self._task = None
+
+    def enqueue(self, llm, session_id: str, content: str, placeholder: str):
+        with self._lock:
+            self.llm = llm
+            self.pending[session_id] = (content, placeholder)
+
+    def take_batch(self):
+        with self._lock:
+            session_ids = list(self.pending)[:TITLE_BATCH_SIZE]
+            return [(sid, *self.pending.pop(sid)) for sid in session_ids]
+
+    def prompt_for(self, batch):
+        if len(batch) == 1:
+            return title_prompt(batch[0][1])
+        return batch_title_prompt([content for _, content, _ in batch])
+
+    def parse_titles(self, batch, text: str):
+        if len(batch) == 1:
+            return {batch[0][0]: clean_title(text)}
+        try:
+            text = text.strip().removeprefix("```json").removeprefix("```").removesuffix("```")
+            titles = json.loads(text)
+        except ValueError:
+            return {}
+        return {
+            sid: clean_title(str(titles.get(str(i), "")))
+            for i, (sid, _, _) in enumerate(batch, 1)
+        }
+
+    def update_statements(self, session_id: str, placeholder: str, title: str):
+        return [
+            update(ChatMessage)
+            .where(ChatMessage.session_id == session_id, ChatMessage.title == placeholder)
+            .values(title=title),
+            update(ChatSession)
+            .where(ChatSession.id == session_id, ChatSession.title == placeholder)
+            .values(title=title),
+        ]
+
+    def aschedule(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.arun())
+
+    async def arun(self):
+        while self.pending:
+            await asyncio.sleep(TITLE_BATCH_WAIT)
+            batch = self.take_batch()
+            if not batch:
+                continue
+            try:
+                response = await self.llm.ainvoke([HumanMessage(content=self.prompt_for(batch))])
+                titles = self.parse_titles(batch, response.content)
+                async with AsyncSessionLocal() as db:
+                    for session_id, _, placeholder in batch:
+                        if titles.get(session_id):
+                            for stmt in self.update_statements(session_id, placeholder, titles[session_id]):
+                                await db.execute(stmt)
+                    await db.commit()
+            except Exception as e:
+                print(f"Title generation failed: {e}")
+
+title_service = TitleService()
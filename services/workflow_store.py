@@ -0,0 +1,104 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
+from db.models import WorkflowState
+
+WORKFLOW_STORE = os.getenv("WORKFLOW_STORE", "database")
+WORKFLOW_TTL = float(os.getenv("WORKFLOW_TTL", "3600"))
+WORKFLOW_SWEEP_INTERVAL = float(os.getenv("WORKFLOW_SWEEP_INTERVAL", "300"))
+
+class InMemoryWorkflowStore:
+    def __init__(self, ttl=WORKFLOW_TTL):
+        self.ttl = ttl
+        self.states = {}
+        self._lock = threading.Lock()
+
+    async def aget(self, db, session_id: str):
+        with self._lock:
+            entry = self.states.get(session_id)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                del self.states[session_id]
+                return None
+            return json.loads(entry[0])
+
+    async def aput(self, db, session_id: str, state: dict):
+        with self._lock:
+            self.states[session_id] = (json.dumps(state), time.monotonic() + self.ttl)
+
+    async def adelete(self, db, session_id: str):
+        with self._lock:
+            self.states.pop(session_id, None)
+
+    async def asweep(self, db=None):
+        now = time.monotonic()
+        with self._lock:
+            expired = [sid for sid, (_, expires_at) in self.states.items() if expires_at < now]
+            for sid in expired:
+                del self.states[sid]
+        return len(expired)
+
+class DatabaseWorkflowStore:
+    def __init__(self, ttl=WORKFLOW_TTL, sweep_interval=WORKFLOW_SWEEP_INTERVAL):
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._last_sweep = time.monotonic()
+
+    def get_query(self, session_id: str):
+        return select(WorkflowState.data).where(
+            WorkflowState.session_id == session_id,
+            WorkflowState.expires_at > datetime.utcnow(),
+        )
+
+    def put_statement(self, session_id: str, state: dict):
+        expires_at = datetime.utcnow() + timedelta(seconds=self.ttl)
+        data = json.dumps(state)
+        return insert(WorkflowState).values(session_id=session_id, data=data, expires_at=expires_at).on_conflict_do_update(
+            index_elements=[WorkflowState.session_id],
+            set_={"data": data, "expires_at": expires_at},
+        )
+
+    def delete_statement(self, session_id: str):
+        return delete(WorkflowState).where(WorkflowState.session_id == session_id)
+
+    def sweep_statement(self):
+        return delete(WorkflowState).where(WorkflowState.expires_at <= datetime.utcnow())
+
+    def sweep_due(self):
+        if time.monotonic() - self._last_sweep < self.sweep_interval:
+            return False
+        self._last_sweep = time.monotonic()
+        return True
+
+    async def aget(self, db, session_id: str):
+        data = (await db.execute(self.get_query(session_id))).scalar()
+        return json.loads(data) if data else None
+
+    async def aput(self, db, session_id: str, state: dict):
+        await db.execute(self.put_statement(session_id, state))
+        if self.sweep_due():
+            await db.execute(self.sweep_statement())
+        await db.commit()
+
+    async def adelete(self, db, session_id: str):
+        await db.execute(self.delete_statement(session_id))
+        await db.commit()
+
+    async def asweep(self, db):
+        count = (await db.execute(self.sweep_statement())).rowcount
+        await db.commit()
+        return count
+
+def create_workflow_store(kind=WORKFLOW_STORE):
+    if kind == "memory":
+        return InMemoryWorkflowStore()
+    if kind == "database":
+        return DatabaseWorkflowStore()
+    raise ValueError(f"Unknown WORKFLOW_STORE: {kind}")
+
+workflow_store = create_workflow_store()
@@ -0,0 +1,24 @@
+import pytest
+from services.rag_service import RAGService
+from utils.fake_providers import HashingEmbeddings, EchoChatModel
+
+@pytest.fixture
+def make_service(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    services = []
+
+    def make():
+        services.append(RAGService(embeddings=HashingEmbeddings(), llm=EchoChatModel()))
+        return services[-1]
+
+    yield make
+    for service in services:
+        service.embeddings.cache.flush()
+        service.collections.shutdown()
+
+@pytest.fixture
+def publish():
+    def publish(service, doc_id, chunks, collection="default"):
+        staging = service.stage_batch(None, doc_id, 0, chunks)
+        return service.publish_document(doc_id, staging, collection)
+    return publish
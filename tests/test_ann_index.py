@@ -0,0 +1,38 @@
+import faiss
+import pytest
+from utils.ann_index import index_spec, index_kind, build_index, flat_index
+
+SPECS = {
+    "ivf": index_spec("ivf", nlist=2, nprobe=2),
+    "hnsw": index_spec("hnsw", m=8, ef_construction=40, ef_search=32),
+}
+
+def chunks(name, count):
+    return [f"{name} passage {i} " + " ".join(f"w{i}x{j}" for j in range(4)) for i in range(count)]
+
+@pytest.mark.parametrize("kind", ["ivf", "hnsw"])
+def test_republish_with_ann_index(make_service, publish, kind):
+    service = make_service()
+    service.collections.spec = SPECS[kind]
+    publish(service, "a", chunks("alpha", 60))
+    publish(service, "b", chunks("beta", 40))
+    publish(service, "a", chunks("alpha", 50))
+    snapshot = service.collections.get().snapshot()
+    assert index_kind(snapshot.vectorstore.index) == kind
+    assert service.list_documents() == {"default": {"a": 50, "b": 40}}
+    assert service.delete_document("b") is True
+    assert service.list_documents() == {"default": {"a": 50}}
+
+@pytest.mark.parametrize("metric, flat_type", [(faiss.METRIC_L2, faiss.IndexFlatL2),
+                                               (faiss.METRIC_INNER_PRODUCT, faiss.IndexFlatIP)])
+def test_flat_copy_matches_metric(metric, flat_type):
+    vectors = faiss.rand((100, 8))
+    index = build_index(vectors, 8, metric, SPECS["hnsw"])
+    flat = flat_index(index)
+    assert type(faiss.downcast_index(flat)) is flat_type
+    assert flat.ntotal == 100
+    flat.merge_from(flat_type(8))
+
+def test_small_ivf_stays_exact():
+    index = build_index(faiss.rand((10, 8)), 8, faiss.METRIC_L2, index_spec("ivf", nlist=4))
+    assert index_kind(index) == "flat"
@@ -0,0 +1,65 @@
+import asyncio
+from services.answer_cache import SemanticAnswerCache
+
+V1 = (("default", "1"),)
+V2 = (("default", "2"),)
+
+def unit(*values):
+    return [float(v) for v in values]
+
+def test_exact_text_lookup_ignores_case_and_spacing():
+    cache = SemanticAnswerCache()
+    cache.store(unit(1, 0), V1, "What is the  notice period?", "30 days")
+    assert cache.lookup_text("what is the notice period?", V1) == "30 days"
+    assert cache.lookup_text("what is the notice", V1) is None
+
+def test_semantic_lookup_uses_threshold():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.store(unit(1, 0), V1, "q", "a")
+    assert cache.lookup(unit(1, 0.1), V1) == "a"
+    assert cache.lookup(unit(1, 1), V1) is None
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 1)
+
+def test_new_index_version_invalidates_entries():
+    cache = SemanticAnswerCache()
+    cache.store(unit(1, 0), V1, "q", "a")
+    assert cache.lookup(unit(1, 0), V2) is None
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["invalidations"] == 1
+
+def test_version_change_keeps_entries_for_other_collections():
+    cache = SemanticAnswerCache()
+    cache.store(unit(1, 0), (("default", "1"),), "q1", "a1")
+    cache.store(unit(0, 1), (("manuals", "1"),), "q2", "a2")
+    assert cache.lookup_text("q2", (("default", "2"), ("manuals", "1"))) is None
+    assert cache.lookup_text("q2", (("manuals", "1"),)) == "a2"
+    assert [entry["query"] for entry in cache.entries] == ["q2"]
+
+def test_ttl_expires_entries():
+    cache = SemanticAnswerCache(ttl=-1)
+    cache.store(unit(1, 0), V1, "q", "a")
+    assert cache.lookup(unit(1, 0), V1) is None
+    assert cache.stats()["evictions"] == 1
+
+def test_capacity_evicts_oldest():
+    cache = SemanticAnswerCache(max_entries=2)
+    for i in range(3):
+        cache.store(unit(1, i), V1, f"q{i}", f"a{i}")
+    assert [entry["query"] for entry in cache.entries] == ["q1", "q2"]
+    assert cache.matrix.shape == (2, 2)
+
+def test_follow_ups_are_not_standalone():
+    cache = SemanticAnswerCache()
+    history = [{"role": "user", "content": "tell me about leave"}]
+    assert cache.is_standalone("and that?", [])
+    assert not cache.is_standalone("tell me more about it", history)
+    assert cache.is_standalone("what is the notice period", history)
+
+def test_repeat_question_is_served_from_cache_until_republish(make_service, publish):
+    service = make_service()
+    publish(service, "a", ["notice period is thirty days"])
+    first = asyncio.run(service.aget_answer("what is the notice period"))
+    assert "cached" not in first
+    assert asyncio.run(service.aget_answer("What is the notice  period"))["cached"] is True
+    publish(service, "b", ["leave is twenty four days"])
+    assert "cached" not in asyncio.run(service.aget_answer("what is the notice period"))
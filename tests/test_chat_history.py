@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from db.database import Base
+from db.models import ChatMessage
+from services.chat_service import AsyncChatService
+from utils.pagination import encode_cursor
+
+START = datetime(2024, 1, 1, 12, 0, 0)
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[ChatMessage.__table__])
+    with Session(engine) as session:
+        for i in range(7):
+            session.add(ChatMessage(session_id="s1", role="user" if i % 2 == 0 else "assistant",
+                                    content=f"m{i}", created_at=START + timedelta(seconds=i // 2)))
+        session.add(ChatMessage(session_id="s2", role="user", content="other", created_at=START))
+        session.commit()
+        yield session
+    engine.dispose()
+
+@pytest.fixture
+def chat():
+    return AsyncChatService(None, SimpleNamespace(fallback_llm=None))
+
+def history(db, chat, **kwargs):
+    before, after = kwargs.get("before"), kwargs.get("after")
+    query, limit, forward = chat.history_page_query("s1", before, after, kwargs.get("limit"))
+    return chat.history_page(db.execute(query).all(), limit, forward, after, kwargs.get("compact", False))
+
+def contents(page):
+    return [m["content"] for m in page["messages"]]
+
+def test_history_pages_backwards_without_gaps(db, chat):
+    page = history(db, chat, limit=3)
+    assert contents(page) == ["m4", "m5", "m6"]
+    assert page["has_more"]
+    seen = contents(page)
+    while page["has_more"]:
+        page = history(db, chat, before=page["older_cursor"], limit=3)
+        seen = contents(page) + seen
+    assert seen == [f"m{i}" for i in range(7)]
+    assert page["older_cursor"] is None
+
+def test_history_pages_forward_from_cursor(db, chat):
+    first = history(db, chat, limit=3)
+    older = history(db, chat, before=first["older_cursor"], limit=2)
+    assert contents(older) == ["m2", "m3"]
+    newer = history(db, chat, after=older["newer_cursor"], limit=10)
+    assert contents(newer) == ["m4", "m5", "m6"]
+    assert not newer["has_more"]
+    caught_up = history(db, chat, after=newer["newer_cursor"])
+    assert caught_up["messages"] == []
+    assert caught_up["newer_cursor"] == newer["newer_cursor"]
+
+def test_history_rejects_both_directions(db, chat):
+    cursor = encode_cursor(START, 1)
+    with pytest.raises(ValueError):
+        history(db, chat, before=cursor, after=cursor)
+
+def test_compact_history_uses_utc_timestamps(db, chat):
+    page = history(db, chat, limit=1, compact=True)
+    assert page["messages"] == [{"r": "user", "c": "m6", "t": 1704110403.0}]
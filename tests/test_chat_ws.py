@@ -0,0 +1,93 @@
+import asyncio
+import json
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import routes.chat_ws
+from routes.chat_ws import router
+from utils.llm_gateway import LLMOverloaded
+
+class StubChatService:
+    def __init__(self, active):
+        self.active = active
+
+    async def stream_user_query(self, session_id, query, collections=None):
+        if query == "busy":
+            raise LLMOverloaded("busy")
+        self.active.append(query)
+        try:
+            for token in (f"{query}-1", f"{query}-2"):
+                await asyncio.sleep(0.01)
+                yield token
+        finally:
+            self.active.remove(query)
+
+class StubRegistry:
+    def __init__(self):
+        self.active = []
+        self.peak = 0
+
+    def chat_service(self, db):
+        self.peak = max(self.peak, len(self.active) + 1)
+        return StubChatService(self.active)
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(router, prefix="/chat")
+    app.state.registry = StubRegistry()
+    with TestClient(app) as client:
+        yield client
+
+def receive_until_done(ws, count):
+    frames = {}
+    while len([f for f in frames.values() if f["type"] in ("done", "error")]) < count:
+        frame = json.loads(ws.receive_text())
+        if frame["type"] in ("done", "error"):
+            frames[frame["id"]] = frame
+    return frames
+
+def test_multiplexed_asks_complete_by_id(client):
+    with client.websocket_connect("/chat/ws/c1") as ws:
+        ws.send_text(json.dumps({"type": "ask", "id": "a", "session_id": "s", "query": "one"}))
+        ws.send_text(json.dumps({"type": "ask", "id": "b", "session_id": "s", "query": "two"}))
+        frames = receive_until_done(ws, 2)
+    assert frames["a"]["answer"] == "one-1one-2"
+    assert frames["b"]["answer"] == "two-1two-2"
+
+def test_ping_and_unknown_frames(client):
+    with client.websocket_connect("/chat/ws/c1") as ws:
+        ws.send_text(json.dumps({"type": "ping", "ts": 1}))
+        assert json.loads(ws.receive_text()) == {"type": "pong", "ts": 1}
+        ws.send_text(json.dumps({"type": "bogus", "id": "x"}))
+        assert json.loads(ws.receive_text())["code"] == 400
+
+def test_query_limits(client, monkeypatch):
+    monkeypatch.setattr(routes.chat_ws, "WS_MAX_QUERY_LENGTH", 5)
+    with client.websocket_connect("/chat/ws/c1") as ws:
+        ws.send_text(json.dumps({"type": "ask", "id": "a", "query": " "}))
+        assert json.loads(ws.receive_text())["code"] == 400
+        ws.send_text(json.dumps({"type": "ask", "id": "b", "query": "too long"}))
+        assert json.loads(ws.receive_text())["code"] == 413
+
+def test_in_flight_limit(client, monkeypatch):
+    monkeypatch.setattr(routes.chat_ws, "WS_MAX_IN_FLIGHT", 1)
+    with client.websocket_connect("/chat/ws/c1") as ws:
+        ws.send_text(json.dumps({"type": "ask", "id": "a", "query": "one"}))
+        ws.send_text(json.dumps({"type": "ask", "id": "b", "query": "two"}))
+        frames = receive_until_done(ws, 2)
+    assert frames["a"]["type"] == "done"
+    assert frames["b"]["code"] == 429
+
+def test_overload_maps_to_503(client):
+    with client.websocket_connect("/chat/ws/c1") as ws:
+        ws.send_text(json.dumps({"type": "ask", "id": "a", "query": "busy"}))
+        assert receive_until_done(ws, 1)["a"]["code"] == 503
+
+def test_legacy_asks_run_one_at_a_time(client):
+    with client.websocket_connect("/chat/ws/c1") as ws:
+        ws.send_text("s|one")
+        ws.send_text("s|two")
+        tokens = [ws.receive_text() for _ in range(4)]
+    assert tokens == ["one-1", "one-2", "two-1", "two-2"]
+    assert client.app.state.registry.peak == 1
@@ -0,0 +1,41 @@
+import os
+import pytest
+from utils.collection_names import CollectionNotFound
+from utils.vectorstore_utils import DOCUMENTS_FILE, current_version
+
+def test_collections_are_isolated(make_service, publish):
+    service = make_service()
+    publish(service, "a", ["alpha one"])
+    publish(service, "b", ["beta one"], collection="manuals")
+    assert service.list_documents() == {"default": {"a": 1}, "manuals": {"b": 1}}
+    snapshot = service.collections.snapshot(["default", "manuals"])
+    docs, _ = service.collections.search(snapshot, [service.embeddings.embed_query("beta one")], 2)[0]
+    assert [(doc.metadata["collection"], doc.metadata["doc_id"]) for doc in docs][0] == ("manuals", "b")
+
+def test_unknown_collection_is_rejected(make_service):
+    service = make_service()
+    with pytest.raises(CollectionNotFound):
+        service.list_documents("missing")
+    with pytest.raises(CollectionNotFound):
+        service.collections.snapshot(["missing"])
+    with pytest.raises(ValueError):
+        service.collections.get("../escape")
+    assert "missing" not in service.collections.managers
+
+def test_listing_documents_does_not_load_shards(make_service, publish):
+    writer = make_service()
+    publish(writer, "a", ["alpha one", "alpha two"])
+    publish(writer, "b", ["beta one"], collection="manuals")
+    reader = make_service()
+    assert reader.list_documents() == {"default": {"a": 2}, "manuals": {"b": 1}}
+    assert not any(manager.loaded for manager in reader.collections.managers.values())
+    assert reader.collections.loads == 0
+    publish(writer, "c", ["gamma one"], collection="manuals")
+    assert reader.list_documents("manuals") == {"manuals": {"b": 1, "c": 1}}
+
+def test_listing_falls_back_for_versions_without_document_counts(make_service, publish):
+    service = make_service()
+    publish(service, "a", ["alpha one"])
+    path = service.collections.path("default")
+    os.remove(os.path.join(path, current_version(path), DOCUMENTS_FILE))
+    assert make_service().list_documents() == {"default": {"a": 1}}
@@ -0,0 +1,46 @@
+import pytest
+from langchain_core.documents import Document
+import services.context_builder
+from services.context_builder import ContextBuilder, overlap_length
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    monkeypatch.setattr(services.context_builder, "count_tokens", lambda text: len(text.split()))
+
+def doc(text, doc_id="hr", chunk=None, collection=None):
+    metadata = {"doc_id": doc_id}
+    if chunk is not None:
+        metadata["chunk"] = chunk
+    if collection:
+        metadata["collection"] = collection
+    return Document(page_content=text, metadata=metadata)
+
+def test_near_duplicates_are_dropped():
+    docs = [doc("leave policy a"), doc("leave policy copy"), doc("payroll dates")]
+    selected = ContextBuilder(token_budget=100).select([1, 0], docs, [[1, 0], [0.999, 0.01], [0.6, 0.8]])
+    assert selected == [0, 2]
+
+def test_budget_skips_chunks_that_do_not_fit():
+    docs = [doc("one two three four"), doc("five six seven eight nine"), doc("ten")]
+    selected = ContextBuilder(token_budget=5, dedup_threshold=1.1).select([1, 0], docs, [[1, 0], [0.9, 0.1], [0.8, 0.2]])
+    assert selected == [0, 2]
+
+def test_adjacent_chunks_are_merged_without_overlap():
+    shared = "the notice period is thirty days for staff"
+    docs = [doc(f"Section one. {shared}", chunk=3), doc(f"{shared} and sixty for managers.", chunk=4),
+            doc("Unrelated chunk.", chunk=9)]
+    passages = ContextBuilder().passages(docs, [1, 0, 2])
+    assert len(passages) == 2
+    assert passages[0]["text"] == f"Section one. {shared} and sixty for managers."
+    assert (passages[0]["first_chunk"], passages[0]["last_chunk"]) == (3, 4)
+
+def test_overlap_needs_a_minimum_length():
+    assert overlap_length("abc xyz", "xyz def") == 0
+    assert overlap_length("a" * 5 + "b" * 25, "b" * 25 + "c") == 25
+
+def test_build_labels_sources_and_reports_stats():
+    docs = [doc("leave is 24 days", doc_id="handbook", chunk=0, collection="hr")]
+    message, stats = ContextBuilder().build([1, 0], docs, [[1, 0]])
+    assert "[1] (hr/handbook, chunk 0)\nleave is 24 days" in message.content
+    assert stats["candidates"] == stats["selected"] == 1
+    assert ContextBuilder().build([1, 0], [], []) == (None, {"candidates": 0, "selected": 0, "tokens": 0})
@@ -0,0 +1,60 @@
+import os
+import numpy as np
+import pytest
+from utils.embedding_cache import EmbeddingCache, CachedEmbeddings, cache_key
+from utils.fake_providers import HashingEmbeddings
+
+@pytest.fixture
+def cached(tmp_path):
+    embeddings = HashingEmbeddings(dim=16)
+    cache = EmbeddingCache(str(tmp_path), model=embeddings.model, max_entries=8)
+    yield CachedEmbeddings(embeddings, cache, embeddings.model)
+    cache.flush()
+
+def vector(value, dim=4):
+    return [float(value)] * dim
+
+A, B, C = (cache_key(text, "m") for text in "abc")
+
+def test_hits_and_misses_are_counted(cached):
+    first = cached.embed_documents(["leave policy", "leave  policy", "payroll"])
+    assert cached.embeddings.texts == 2
+    assert first[0] == first[1]
+    second = cached.embed_documents(["payroll", "leave policy"])
+    assert cached.embeddings.texts == 2
+    np.testing.assert_allclose(second, [first[2], first[0]])
+    stats = cached.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 2, 2)
+    assert stats["hit_ratio"] == 0.5
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_entries=2)
+    cache.put_many([(A, vector(1)), (B, vector(2))])
+    assert set(cache.get_many([A])) == {A}
+    cache.put_many([(C, vector(3))])
+    assert set(cache.get_many([A, B, C])) == {A, C}
+    assert cache.stats()["evictions"] == 1
+
+def test_entries_survive_reopen(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), model="m", max_entries=4)
+    cache.put_many([(A, vector(1)), (B, vector(2))])
+    cache.flush()
+    reopened = EmbeddingCache(str(tmp_path), model="m", max_entries=4)
+    assert reopened.get_many([A, B]) == {A: vector(1), B: vector(2)}
+    assert EmbeddingCache(str(tmp_path), model="m", max_entries=8).get_many([A]) == {}
+
+def test_models_and_dimensions_use_separate_files(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), model="text/embed:v1", max_entries=4)
+    cache.put_many([(A, vector(1, dim=4))])
+    cache.put_many([(B, vector(2, dim=8))])
+    cache.flush()
+    assert sorted(os.listdir(cache.path)) == [
+        "digests-4.u8", "digests-8.u8", "index-4.json", "index-8.json", "vectors-4.f32", "vectors-8.f32",
+    ]
+    assert os.path.basename(cache.path) == "text_embed_v1"
+    assert cache.get_many([A, B]) == {B: vector(2, dim=8)}
+    assert EmbeddingCache(str(tmp_path), model="other", max_entries=4).get_many([B]) == {}
+
+def test_cache_key_depends_on_model_and_normalized_text():
+    assert cache_key(" leave\tpolicy ", "m") == cache_key("leave policy", "m")
+    assert cache_key("leave policy", "m") != cache_key("leave policy", "n")
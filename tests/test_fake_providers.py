@@ -0,0 +1,24 @@
+import asyncio
+import numpy as np
+from langchain_core.messages import HumanMessage
+from utils.fake_providers import HashingEmbeddings, EchoChatModel
+
+def test_hashing_embeddings_are_deterministic_unit_vectors():
+    embeddings = HashingEmbeddings()
+    first, second = embeddings.embed_documents(["Leave policy", "leave  POLICY"])
+    assert first == second == HashingEmbeddings().embed_query("leave policy")
+    assert np.isclose(np.linalg.norm(first), 1.0)
+    assert len(first) == embeddings.dim
+    assert (embeddings.calls, embeddings.texts) == (1, 2)
+
+def test_empty_text_still_embeds():
+    assert np.isclose(np.linalg.norm(HashingEmbeddings().embed_query("")), 1.0)
+
+def test_echo_model_invoke_and_stream_agree():
+    model = EchoChatModel(max_words=3)
+    messages = [HumanMessage(content="how many leave days do I get")]
+    assert model.invoke(messages).content == "Echo: how many leave"
+
+    async def stream():
+        return "".join([chunk.content async for chunk in model.astream(messages)])
+    assert asyncio.run(stream()) == "Echo: how many leave"
@@ -0,0 +1,61 @@
+from functools import partial
+import pytest
+import utils.mmap_store
+import utils.vectorstore_utils
+from utils.mmap_store import MmapVectorStore, save_mmap_store
+
+def test_publish_and_list_documents(make_service, publish):
+    service = make_service()
+    publish(service, "a", ["alpha one", "alpha two"])
+    publish(service, "b", ["beta one"])
+    assert service.list_documents() == {"default": {"a": 2, "b": 1}}
+
+def test_republish_replaces_chunks(make_service, publish):
+    service = make_service()
+    publish(service, "a", ["alpha one", "alpha two", "alpha three"])
+    publish(service, "a", ["alpha again"])
+    assert service.list_documents("default") == {"default": {"a": 1}}
+
+def test_delete_document(make_service, publish):
+    service = make_service()
+    publish(service, "a", ["alpha one"])
+    publish(service, "b", ["beta one"])
+    assert service.delete_document("a") is True
+    assert service.delete_document("a") is False
+    assert service.list_documents() == {"default": {"b": 1}}
+
+def test_publish_bumps_version(make_service, publish):
+    service = make_service()
+    first = publish(service, "a", ["alpha one"])
+    second = publish(service, "b", ["beta one"])
+    assert first != second
+    assert service.index.version == second
+
+def test_publish_from_stale_worker_keeps_other_documents(make_service, publish):
+    first, second = make_service(), make_service()
+    publish(first, "a", ["alpha one"])
+    assert second.list_documents() == {"default": {"a": 1}}
+    publish(first, "b", ["beta one"])
+    publish(second, "c", ["gamma one"])
+    assert first.collections.get().snapshot(force=True).vectorstore.index.ntotal == 3
+    assert make_service().list_documents() == {"default": {"a": 1, "b": 1, "c": 1}}
+
+def test_get_answer_reports_empty_index(make_service):
+    answer = make_service().get_answer("anything")["answer"]
+    assert "No documents have been indexed yet" in answer
+
+@pytest.mark.parametrize("compression", ["none", "pq"])
+def test_republish_with_mmap_storage(make_service, publish, monkeypatch, compression):
+    monkeypatch.setattr(utils.mmap_store, "PQ_MIN_POINTS", 256)
+    monkeypatch.setattr(utils.vectorstore_utils, "save_mmap_store", partial(save_mmap_store, compression=compression))
+    service = make_service()
+    service.collections.get().storage = "mmap"
+    publish(service, "a", [f"alpha passage {i}" for i in range(200)])
+    publish(service, "b", [f"beta passage {i}" for i in range(100)])
+    publish(service, "a", [f"alpha again {i}" for i in range(160)])
+    vectorstore = service.collections.get().snapshot().vectorstore
+    assert isinstance(vectorstore, MmapVectorStore)
+    assert vectorstore.compression == compression
+    assert service.list_documents() == {"default": {"a": 160, "b": 100}}
+    assert service.delete_document("b") is True
+    assert service.list_documents() == {"default": {"a": 160}}
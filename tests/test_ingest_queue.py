@@ -0,0 +1,103 @@
+import asyncio
+import os
+import threading
+import time
+import pytest
+from services.ingest_service import IngestJobQueue, IngestQueueFull
+from services.pdf_service import PDFService
+
+class Upload:
+    def __init__(self, filename, data=b"%PDF-1.4"):
+        self.filename = filename
+        self.data = data
+
+    async def read(self, size):
+        block, self.data = self.data[:size], self.data[size:]
+        return block
+
+class StubPDFService:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.release = threading.Event()
+        self.ingested = []
+
+    async def save_upload(self, file, upload_id):
+        return f"{upload_id}.pdf"
+
+    def ingest_file(self, file_path, doc_id, job=None, collection="default"):
+        self.release.wait(5)
+        if self.fail:
+            raise RuntimeError("bad pdf")
+        self.ingested.append((file_path, doc_id, collection))
+        return {"doc_id": doc_id, "chunks": 1}
+
+def wait_finished(job):
+    deadline = time.monotonic() + 5
+    while not job.finished and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return job
+
+@pytest.fixture
+def queue():
+    queues = []
+
+    def make(pdf_service, **kwargs):
+        queues.append(IngestJobQueue(pdf_service, **kwargs))
+        return queues[-1]
+    yield make
+    for queue in queues:
+        queue.shutdown()
+
+def test_job_runs_in_background(queue):
+    service = StubPDFService()
+    ingest = queue(service)
+    job = asyncio.run(ingest.submit(Upload("report.pdf"), collection="manuals"))
+    assert ingest.get(job.id) is job and not job.finished
+    service.release.set()
+    assert wait_finished(job).stage == "done"
+    assert service.ingested == [(f"{job.id}.pdf", "report.pdf", "manuals")]
+    assert job.to_dict()["result"] == {"doc_id": "report.pdf", "chunks": 1}
+
+def test_failed_job_records_error(queue):
+    service = StubPDFService(fail=True)
+    service.release.set()
+    job = asyncio.run(queue(service).submit(Upload("report.pdf"), doc_id="r1"))
+    assert wait_finished(job).stage == "failed"
+    assert job.error == "bad pdf"
+    assert job.finished_at is not None
+
+def test_queue_rejects_when_full(queue):
+    service = StubPDFService()
+    ingest = queue(service, max_pending=2)
+
+    async def run():
+        await ingest.submit(Upload("a.pdf"))
+        await ingest.submit(Upload("b.pdf"))
+        with pytest.raises(IngestQueueFull):
+            await ingest.submit(Upload("c.pdf"))
+    asyncio.run(run())
+    service.release.set()
+
+def test_invalid_collection_is_rejected_before_queueing(queue):
+    ingest = queue(StubPDFService())
+    with pytest.raises(ValueError):
+        asyncio.run(ingest.submit(Upload("a.pdf"), collection="../escape"))
+    assert ingest.jobs == {}
+
+def test_finished_jobs_are_pruned_to_history(queue):
+    service = StubPDFService()
+    service.release.set()
+    ingest = queue(service, history=2)
+    jobs = [wait_finished(asyncio.run(ingest.submit(Upload(f"{i}.pdf")))) for i in range(4)]
+    asyncio.run(ingest.submit(Upload("last.pdf")))
+    assert [job.id for job in jobs if job.id in ingest.jobs] == [jobs[2].id, jobs[3].id]
+
+def test_upload_is_saved_under_the_job_id(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("pdfs")
+    monkeypatch.setattr("services.pdf_service.UPLOAD_CHUNK_SIZE", 4)
+    path = asyncio.run(PDFService(None).save_upload(Upload("../../etc/passwd", b"%PDF-1.4 body"), "job1"))
+    assert path == os.path.join("pdfs", "job1.pdf")
+    with open(path, "rb") as f:
+        assert f.read() == b"%PDF-1.4 body"
+    assert os.listdir("pdfs") == ["job1.pdf"]
@@ -0,0 +1,51 @@
+import asyncio
+import pytest
+from services.intent_router import IntentRouter
+from utils.fake_providers import HashingEmbeddings
+
+@pytest.fixture
+def router():
+    return IntentRouter(HashingEmbeddings())
+
+def fail_llm(query):
+    raise AssertionError(f"LLM should not be called for {query!r}")
+
+@pytest.mark.parametrize("query, intent", [
+    ("/apply", "start"),
+    ("I want to start a new job application", "start"),
+    ("show my application", "view"),
+    ("please withdraw my application", "delete"),
+    ("update my email to a@b.com", "update"),
+    ("how many leave days do I get", "none"),
+])
+def test_rules_answer_without_embeddings(router, query, intent):
+    assert router.classify(query, fail_llm) == intent
+    assert router.matrix is None
+    assert router.stats()["counts"]["rule"] == 1
+
+def test_embedding_match_skips_llm(router):
+    assert router.classify("I need to correct my job role", fail_llm) == "update"
+    assert router.stats()["counts"] == {"rule": 0, "embedding": 1, "llm": 0}
+
+def test_unclear_query_falls_back_to_llm(router):
+    calls = []
+
+    async def llm_classify(query):
+        calls.append(query)
+        return "none"
+    assert asyncio.run(router.aclassify("quarterly resume xylophone zebra", llm_classify)) == "none"
+    assert calls == ["quarterly resume xylophone zebra"]
+    assert router.stats()["hit_rate"]["llm"] == 1.0
+
+def test_embedding_errors_fall_back_to_llm():
+    class Broken(HashingEmbeddings):
+        def embed_documents(self, texts):
+            raise RuntimeError("provider down")
+    router = IntentRouter(Broken())
+    assert router.classify("I need to correct my job role", lambda query: "update") == "update"
+    assert router.stats()["counts"]["llm"] == 1
+
+def test_margin_rejects_ambiguous_scores(router):
+    router.load_examples()
+    router.margin = 2.0
+    assert router.score(router.embeddings.embed_query("I need to correct my job role")) is None
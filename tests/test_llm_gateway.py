@@ -0,0 +1,222 @@
+import asyncio
+import threading
+import time
+import pytest
+from langchain_core.messages import HumanMessage
+from utils.llm_gateway import LLMGateway, LLMOverloaded, prompt_key
+
+class RateLimitError(Exception):
+    status_code = 429
+
+class FakeLLM:
+    def __init__(self, delay=0.05, failures=0):
+        self.delay = delay
+        self.failures = failures
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def enter(self):
+        with self._lock:
+            self.calls += 1
+            if self.failures:
+                self.failures -= 1
+                raise RateLimitError("slow down")
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+
+    def leave(self):
+        with self._lock:
+            self.active -= 1
+
+    def invoke(self, messages, **kwargs):
+        self.enter()
+        try:
+            time.sleep(self.delay)
+        finally:
+            self.leave()
+        return f"{messages[-1].content}{kwargs or ''}"
+
+    async def ainvoke(self, messages, **kwargs):
+        self.enter()
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.leave()
+        return f"{messages[-1].content}{kwargs or ''}"
+
+    async def astream(self, messages, **kwargs):
+        self.enter()
+        try:
+            for word in messages[-1].content.split():
+                await asyncio.sleep(0)
+                yield word
+        finally:
+            self.leave()
+
+def ask(text):
+    return [HumanMessage(content=text)]
+
+def test_identical_prompts_are_coalesced():
+    llm = FakeLLM()
+    gateway = LLMGateway(llm)
+
+    async def run():
+        return await asyncio.gather(*[gateway.ainvoke(ask("same")) for _ in range(10)])
+
+    assert asyncio.run(run()) == ["same"] * 10
+    assert llm.calls == 1
+    assert gateway.stats()["coalesced"] == 9
+    assert gateway.stats()["in_flight_prompts"] == 0
+
+def test_kwargs_are_part_of_the_key():
+    key = prompt_key(ask("q"), {"stop": ["a"], "temperature": 0})
+    assert key == prompt_key(ask("q"), {"temperature": 0, "stop": ["a"]})
+    assert prompt_key(ask("q"), {"stop": ["a"]}) != prompt_key(ask("q"))
+    llm = FakeLLM()
+    gateway = LLMGateway(llm)
+
+    async def run():
+        return await asyncio.gather(gateway.ainvoke(ask("q")), gateway.ainvoke(ask("q"), stop=["x"]))
+
+    assert asyncio.run(run()) == ["q", "q{'stop': ['x']}"]
+    assert llm.calls == 2
+
+def test_cancelled_leader_does_not_fail_followers():
+    llm = FakeLLM(delay=0.1)
+    gateway = LLMGateway(llm)
+
+    async def run():
+        leader = asyncio.create_task(gateway.ainvoke(ask("shared")))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(gateway.ainvoke(ask("shared")))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == "shared"
+    assert llm.calls == 1
+
+def test_concurrency_is_capped():
+    llm = FakeLLM(delay=0.02)
+    gateway = LLMGateway(llm, max_concurrency=2)
+
+    async def run():
+        return await asyncio.gather(*[gateway.ainvoke(ask(f"q{i}")) for i in range(8)])
+
+    assert asyncio.run(run()) == [f"q{i}" for i in range(8)]
+    assert llm.peak == 2
+    assert gateway.stats()["active"] == 0
+
+def test_sync_and_async_callers_share_slots():
+    llm = FakeLLM(delay=0.02)
+    gateway = LLMGateway(llm, max_concurrency=2)
+    results = []
+    threads = [threading.Thread(target=lambda i=i: results.append(gateway.invoke(ask(f"s{i}")))) for i in range(4)]
+
+    async def run():
+        for thread in threads:
+            thread.start()
+        return await asyncio.gather(*[gateway.ainvoke(ask(f"a{i}")) for i in range(4)])
+
+    assert asyncio.run(run()) == [f"a{i}" for i in range(4)]
+    for thread in threads:
+        thread.join()
+    assert sorted(results) == [f"s{i}" for i in range(4)]
+    assert llm.peak <= 2
+
+def test_full_queue_is_rejected():
+    gateway = LLMGateway(FakeLLM(delay=0.05), max_concurrency=1, max_queue=1)
+
+    async def run():
+        return await asyncio.gather(*[gateway.ainvoke(ask(f"q{i}")) for i in range(3)], return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert results[:2] == ["q0", "q1"]
+    assert isinstance(results[2], LLMOverloaded)
+    assert gateway.stats()["rejected"] == 1
+
+def test_queue_timeout():
+    gateway = LLMGateway(FakeLLM(delay=0.1), max_concurrency=1, queue_timeout=0.01)
+
+    async def run():
+        return await asyncio.gather(gateway.ainvoke(ask("a")), gateway.ainvoke(ask("b")), return_exceptions=True)
+
+    first, second = asyncio.run(run())
+    assert first == "a"
+    assert isinstance(second, LLMOverloaded)
+    assert gateway.stats()["queue_timeouts"] == 1
+    assert gateway.stats()["active"] == 0
+
+def test_rate_limits_are_retried():
+    llm = FakeLLM(delay=0, failures=2)
+    gateway = LLMGateway(llm, retry_base_ms=1, retry_max_ms=2)
+    assert gateway.invoke(ask("retry")) == "retry"
+    assert llm.calls == 3
+    assert gateway.stats()["retries"] == 2
+
+def test_rate_limit_retries_are_bounded():
+    gateway = LLMGateway(FakeLLM(delay=0, failures=5), max_retries=1, retry_base_ms=1)
+    with pytest.raises(RateLimitError):
+        asyncio.run(gateway.ainvoke(ask("q")))
+    assert gateway.stats()["active"] == 0
+
+def test_stream_releases_slot():
+    gateway = LLMGateway(FakeLLM(), max_concurrency=1)
+
+    async def run():
+        return [chunk async for chunk in gateway.astream(ask("a b c"))]
+
+    assert asyncio.run(run()) == ["a", "b", "c"]
+    assert gateway.stats()["active"] == 0
+
+def overloaded_service(make_service, publish, monkeypatch):
+    service = make_service()
+    publish(service, "a", ["alpha one"])
+    async def reject(*args, **kwargs):
+        raise LLMOverloaded("busy")
+
+    async def reject_stream(*args, **kwargs):
+        raise LLMOverloaded("busy")
+        yield
+    monkeypatch.setattr(service.fallback_llm, "ainvoke", reject)
+    monkeypatch.setattr(service.fallback_llm, "astream", reject_stream)
+    return service
+
+def test_overload_propagates_from_rag_service(make_service, publish, monkeypatch):
+    service = overloaded_service(make_service, publish, monkeypatch)
+    with pytest.raises(LLMOverloaded):
+        asyncio.run(service.aget_answer("alpha"))
+
+    async def stream():
+        return [token async for token in service.astream_answer("alpha")]
+    with pytest.raises(LLMOverloaded):
+        asyncio.run(stream())
+
+def test_overloaded_stream_does_not_save_turn(make_service, publish, monkeypatch):
+    from services.chat_service import AsyncChatService
+    chat = AsyncChatService(None, overloaded_service(make_service, publish, monkeypatch))
+    saved = []
+
+    async def load_history(session_id):
+        return [], None
+
+    async def route_query(session_id, query):
+        return None
+
+    async def save_turn(*args):
+        saved.append(args)
+    monkeypatch.setattr(chat, "load_history", load_history)
+    monkeypatch.setattr(chat, "route_query", route_query)
+    monkeypatch.setattr(chat, "save_turn", save_turn)
+
+    async def stream():
+        return [token async for token in chat.stream_user_query("s1", "alpha")]
+    with pytest.raises(LLMOverloaded):
+        asyncio.run(stream())
+    with pytest.raises(LLMOverloaded):
+        asyncio.run(chat.handle_user_query("s1", "alpha"))
+    assert saved == []
@@ -0,0 +1,84 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+import services.chat_service
+import services.memory_service
+from db.database import Base
+from db.models import ChatMessage
+from services.chat_service import AsyncChatService
+from services.memory_service import ConversationMemory
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    monkeypatch.setattr(services.memory_service, "count_tokens", lambda text: len(text.split()))
+
+def rows(*sizes):
+    return [SimpleNamespace(id=len(sizes) - i, role="user" if (len(sizes) - i) % 2 else "assistant",
+                            content=" ".join(["word"] * size))
+            for i, size in enumerate(sizes)]
+
+def test_window_keeps_newest_messages_within_budget():
+    memory = ConversationMemory(None, token_budget=10, fetch_limit=40, summary_min_tokens=100)
+    history, boundary_id = memory.build_window(rows(4, 4, 4, 4), "")
+    assert [len(msg["content"].split()) for msg in history] == [4, 4]
+    assert boundary_id is None
+
+def test_summary_is_counted_against_the_budget():
+    memory = ConversationMemory(None, token_budget=10, fetch_limit=40, summary_min_tokens=100)
+    history, _ = memory.build_window(rows(4, 4, 4), "short summary here")
+    assert history[0]["role"] == "system"
+    assert len(history) == 2
+
+def test_newest_message_is_kept_even_when_over_budget():
+    memory = ConversationMemory(None, token_budget=2, fetch_limit=40, summary_min_tokens=100)
+    history, _ = memory.build_window(rows(5, 1), "")
+    assert len(history) == 1
+
+def test_overflow_past_threshold_triggers_summary_boundary():
+    memory = ConversationMemory(None, token_budget=8, fetch_limit=40, summary_min_tokens=6)
+    window_rows = rows(4, 4, 3, 3)
+    history, boundary_id = memory.build_window(window_rows, "")
+    assert boundary_id == window_rows[1].id
+    assert len(history) == 2
+
+def test_full_fetch_triggers_summary_boundary():
+    memory = ConversationMemory(None, token_budget=100, fetch_limit=3, summary_min_tokens=100)
+    window_rows = rows(1, 1, 1)
+    assert memory.build_window(window_rows, "")[1] == window_rows[-1].id
+
+def test_window_and_overflow_queries_respect_summary_boundary():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[ChatMessage.__table__])
+    memory = ConversationMemory(None, fetch_limit=3)
+    with Session(engine) as db:
+        db.add_all([ChatMessage(session_id="s1", role="user", content=f"m{i}") for i in range(6)])
+        db.add(ChatMessage(session_id="s2", role="user", content="other"))
+        db.commit()
+        window = db.execute(memory.window_query("s1", until_id=2)).all()
+        overflow = db.execute(memory.overflow_query("s1", until_id=1, before_id=5)).all()
+    engine.dispose()
+    assert [row.content for row in window] == ["m5", "m4", "m3"]
+    assert [row.content for row in overflow] == ["m1", "m2", "m3"]
+
+def test_summary_refresh_runs_once_per_session(monkeypatch):
+    chat = AsyncChatService(None, SimpleNamespace(fallback_llm=None))
+    started = []
+
+    async def refresh(session_id, boundary_id):
+        started.append((session_id, boundary_id))
+        await asyncio.sleep(0.01)
+    monkeypatch.setattr(chat, "_refresh_summary", refresh)
+
+    async def run():
+        chat.refresh_summary("s1", 10)
+        chat.refresh_summary("s1", 12)
+        chat.refresh_summary("s2", 7)
+        await asyncio.gather(*services.chat_service.background_tasks)
+        await asyncio.sleep(0)
+        chat.refresh_summary("s1", 14)
+        await asyncio.gather(*services.chat_service.background_tasks)
+    asyncio.run(run())
+    assert started == [("s1", 10), ("s2", 7), ("s1", 14)]
+    assert services.chat_service.summary_refreshes == set()
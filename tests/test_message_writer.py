@@ -0,0 +1,74 @@
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+from db.database import Base
+from db.models import ChatMessage
+from services.message_writer import MessageWriter
+
+START = datetime(2024, 1, 1, 12, 0, 0)
+
+def turn(session_id, minute, user="How many leave days do I get?", assistant="24 days."):
+    return session_id, [("user", user, START + timedelta(minutes=minute)),
+                        ("assistant", assistant, START + timedelta(minutes=minute, seconds=1))]
+
+def test_session_upsert_folds_turns_per_session():
+    writer = MessageWriter(write_behind=False)
+    stmt, per_session = writer.session_upsert([turn("s1", 0), turn("s2", 1), turn("s1", 2, user="And sick leave?")])
+    assert per_session["s1"]["message_count"] == 4
+    assert per_session["s1"]["created_at"] == START
+    assert per_session["s1"]["last_message_at"] == START + timedelta(minutes=2, seconds=1)
+    assert per_session["s1"]["title"] == "How many leave days do I…"
+    assert per_session["s2"]["message_count"] == 2
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    assert "message_count = (chat_sessions.message_count + excluded.message_count)" in sql
+    assert "RETURNING chat_sessions.id, chat_sessions.message_count" in sql
+
+def test_new_sessions_are_rows_the_upsert_created():
+    writer = MessageWriter(write_behind=False)
+    _, per_session = writer.session_upsert([turn("new", 0), turn("old", 0)])
+    new_sessions = writer.new_sessions([("new", 2), ("old", 6)], per_session)
+    assert list(new_sessions) == ["new"]
+
+def test_only_first_user_message_of_a_new_session_is_titled():
+    writer = MessageWriter(write_behind=False)
+    turns = [turn("new", 0), turn("new", 1, user="Second question"), turn("old", 0)]
+    _, per_session = writer.session_upsert(turns)
+    rows = writer.message_rows(turns, writer.new_sessions([("new", 4), ("old", 8)], per_session))
+    assert [(row["session_id"], row["role"], row["title"]) for row in rows] == [
+        ("new", "user", "How many leave days do I…"),
+        ("new", "assistant", None),
+        ("new", "user", None),
+        ("new", "assistant", None),
+        ("old", "user", None),
+        ("old", "assistant", None),
+    ]
+
+def test_existing_titles_query_keeps_the_oldest_title():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[ChatMessage.__table__])
+    with Session(engine) as db:
+        db.add_all([
+            ChatMessage(session_id="s1", role="user", content="a", title="First", created_at=START),
+            ChatMessage(session_id="s1", role="user", content="b", title="Later", created_at=START + timedelta(1)),
+            ChatMessage(session_id="s2", role="user", content="c", title=None, created_at=START),
+        ])
+        db.commit()
+        titles = dict(db.execute(MessageWriter().existing_titles_query(["s1", "s2"])).all())
+    engine.dispose()
+    assert titles == {"s1": "First"}
+
+def test_write_behind_buffers_pending_turns():
+    writer = MessageWriter(write_behind=True, flush_interval=60)
+
+    async def run():
+        await writer.submit(None, writer.turn("s1", "hello", "hi"), None)
+        await writer.submit(None, writer.turn("s2", "other"), None)
+        pending = writer.pending_messages("s1")
+        writer.discard("s1")
+        writer._task.cancel()
+        return pending
+    assert asyncio.run(run()) == [{"role": "user", "content": "hello"}, {"role": "assistant", "content": "hi"}]
+    assert [session_id for session_id, _ in writer.buffer] == ["s2"]
+    assert writer.stats()["buffered_turns"] == 1
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from langchain_community.vectorstores import FAISS
+from utils.fake_providers import HashingEmbeddings
+from utils.mmap_store import MmapVectorStore, save_mmap_store
+from utils.vectorstore_utils import batch_search, clone_vectorstore, document_chunk_ids, list_documents
+
+TOPICS = ["refund policy", "shipping times", "password reset", "invoice download", "account deletion",
+          "api rate limits", "team invitations", "billing address", "export to csv", "two factor login"]
+
+@pytest.fixture(scope="module")
+def embeddings():
+    return HashingEmbeddings()
+
+@pytest.fixture(scope="module")
+def faiss_store(embeddings):
+    texts = [f"{topic} " + " ".join(f"note{j}" for j in range(i)) for i in range(6) for topic in TOPICS]
+    metadatas = [{"doc_id": f"doc-{i % 4}", "chunk": i} for i in range(len(texts))]
+    ids = [f"doc-{i % 4}:{i}" for i in range(len(texts))]
+    return FAISS.from_texts(texts, embeddings, metadatas=metadatas, ids=ids)
+
+@pytest.fixture(scope="module")
+def mmap_path(faiss_store, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("mmap"))
+    save_mmap_store(faiss_store, path, compression="none")
+    return path
+
+@pytest.fixture
+def mmap_store(mmap_path, embeddings):
+    return MmapVectorStore(mmap_path, embeddings)
+
+def queries(embeddings):
+    return embeddings.embed_documents(["how do I reset my password", "refund policy", "csv export", "rate limits"])
+
+def test_search_matches_faiss(faiss_store, mmap_store, embeddings):
+    expected = batch_search(faiss_store, queries(embeddings), 5)
+    found = batch_search(mmap_store, queries(embeddings), 5)
+    for (expected_docs, expected_vectors), (docs, vectors) in zip(expected, found):
+        assert [doc.page_content for doc in docs] == [doc.page_content for doc in expected_docs]
+        assert [doc.metadata for doc in docs] == [doc.metadata for doc in expected_docs]
+        np.testing.assert_allclose(vectors, expected_vectors, rtol=1e-5)
+
+def test_scores_match_faiss(faiss_store, mmap_store, embeddings):
+    vector = queries(embeddings)[0]
+    expected_scores, expected_rows = faiss_store.index.search(np.asarray([vector], dtype=np.float32), 5)
+    rows, scores = mmap_store.search_rows([vector], 5)[0]
+    assert rows.tolist() == expected_rows[0].tolist()
+    np.testing.assert_allclose(scores, expected_scores[0], rtol=1e-4, atol=1e-5)
+
+def test_fp16_keeps_top_result(faiss_store, embeddings, tmp_path):
+    save_mmap_store(faiss_store, str(tmp_path), compression="fp16")
+    store = MmapVectorStore(str(tmp_path), embeddings)
+    expected = batch_search(faiss_store, queries(embeddings), 3)
+    found = batch_search(store, queries(embeddings), 3)
+    assert [docs[0].page_content for docs, _ in found] == [docs[0].page_content for docs, _ in expected]
+
+def test_document_listing_matches_faiss(faiss_store, mmap_store):
+    assert mmap_store.list_documents() == list_documents(faiss_store)
+    assert sorted(document_chunk_ids(mmap_store, "doc-1")) == sorted(document_chunk_ids(faiss_store, "doc-1"))
+
+def test_clone_round_trips_to_faiss(faiss_store, mmap_store, embeddings):
+    clone = clone_vectorstore(mmap_store)
+    assert isinstance(clone, FAISS)
+    assert clone.index.ntotal == faiss_store.index.ntotal
+    expected = batch_search(faiss_store, queries(embeddings), 5)
+    found = batch_search(clone, queries(embeddings), 5)
+    assert [[doc.page_content for doc in docs] for docs, _ in found] == \
+        [[doc.page_content for doc in docs] for docs, _ in expected]
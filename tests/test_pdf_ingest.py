@@ -0,0 +1,48 @@
+from services.ingest_service import IngestJob
+from services.pdf_service import PDFService
+
+def page(n):
+    return "\n".join(f"page {n} line {i} " + "x" * 40 for i in range(20))
+
+def test_chunks_stream_before_all_pages_are_read():
+    pulled = []
+
+    def pages():
+        for n in range(50):
+            pulled.append(n)
+            yield page(n)
+    chunks = PDFService(None).iter_chunks(pages())
+    next(chunks)
+    assert len(pulled) < 5
+
+def test_streamed_chunks_cover_every_line():
+    service = PDFService(None)
+    pages = [page(n) for n in range(12)]
+    streamed = list(service.iter_chunks(iter(pages)))
+    assert all(len(chunk) <= 500 for chunk in streamed)
+    lines = {line for chunk in streamed for line in chunk.split("\n")}
+    assert lines == {line for text in pages for line in text.split("\n")}
+
+def test_batches_are_bounded():
+    batches = list(PDFService(None).iter_batches(range(10), 4))
+    assert batches == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+
+def test_ingest_file_embeds_in_batches_and_tracks_progress(make_service, monkeypatch):
+    monkeypatch.setattr("services.pdf_service.EMBED_BATCH_SIZE", 8)
+    rag = make_service()
+    service = PDFService(rag)
+    monkeypatch.setattr(service, "iter_pages", lambda file_path, job=None: iter([page(n) for n in range(6)]))
+    calls = []
+    stage_batch = rag.stage_batch
+
+    def counting_stage_batch(staging, doc_id, start, chunks):
+        calls.append(len(chunks))
+        return stage_batch(staging, doc_id, start, chunks)
+    monkeypatch.setattr(rag, "stage_batch", counting_stage_batch)
+    job = IngestJob("report.pdf", "report", "default")
+    result = service.ingest_file("report.pdf", "report", job)
+    assert result["chunks"] == sum(calls) == job.chunks_total == job.chunks
+    assert max(calls) <= 8 and len(calls) > 1
+    assert job.stage == "indexing"
+    assert {"parsing", "embedding", "parse_calls", "embed_calls"} <= set(job.timings)
+    assert rag.list_documents() == {"default": {"report": result["chunks"]}}
@@ -0,0 +1,77 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from utils.fake_providers import HashingEmbeddings
+from utils.query_batcher import QueryBatcher
+
+class RecordingSearch:
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.calls = []
+
+    def __call__(self, snapshot, vectors, k):
+        self.calls.append((snapshot.version, len(vectors), k))
+        return [([f"{snapshot.version}:{k}:{self.text(vector)}"], [vector]) for vector in vectors]
+
+    def text(self, vector):
+        return next(text for text, known in self.embeddings.known.items() if known == vector)
+
+class KnownEmbeddings(HashingEmbeddings):
+    def __init__(self):
+        super().__init__()
+        self.known = {}
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        vectors = super().embed_documents(texts)
+        self.known.update(zip(texts, vectors))
+        return vectors
+
+@pytest.fixture
+def batcher():
+    embeddings = KnownEmbeddings()
+    return QueryBatcher(embeddings, RecordingSearch(embeddings), window_ms=20, max_batch=32)
+
+def gather(batcher, requests):
+    async def run():
+        return await asyncio.gather(*(batcher.retrieve(*request) for request in requests))
+    return asyncio.run(run())
+
+def test_results_fan_back_to_each_caller(batcher):
+    v1 = SimpleNamespace(version="v1")
+    results = gather(batcher, [(v1, "leave", 4), (v1, "payroll", 4), (v1, "leave", 4)])
+    assert [docs for _, _, docs, _ in results] == [["v1:4:leave"], ["v1:4:payroll"], ["v1:4:leave"]]
+    assert batcher.embeddings.batches == [["leave", "payroll"]]
+    assert batcher.search.calls == [("v1", 3, 4)]
+    assert batcher.stats()["largest_batch"] == 3
+
+def test_searches_are_grouped_by_version_and_k(batcher):
+    v1, v2 = SimpleNamespace(version="v1"), SimpleNamespace(version="v2")
+    results = gather(batcher, [(v1, "a", 4), (v2, "b", 4), (v1, "c", 2)])
+    assert [docs for _, _, docs, _ in results] == [["v1:4:a"], ["v2:4:b"], ["v1:2:c"]]
+    assert sorted(batcher.search.calls) == [("v1", 1, 2), ("v1", 1, 4), ("v2", 1, 4)]
+
+def test_cache_hits_skip_the_search(batcher):
+    v1 = SimpleNamespace(version="v1")
+    results = gather(batcher, [(v1, "cached", 4, lambda vector: "answer"), (v1, "fresh", 4, lambda vector: None)])
+    assert results[0][1:] == ("answer", [], [])
+    assert results[1][2] == ["v1:4:fresh"]
+    assert batcher.search.calls == [("v1", 1, 4)]
+
+def test_full_batch_flushes_without_waiting():
+    embeddings = KnownEmbeddings()
+    batcher = QueryBatcher(embeddings, RecordingSearch(embeddings), window_ms=10_000, max_batch=2)
+    v1 = SimpleNamespace(version="v1")
+    assert len(gather(batcher, [(v1, "a", 4), (v1, "b", 4)])) == 2
+
+def test_errors_reach_every_caller(batcher):
+    def broken(snapshot, vectors, k):
+        raise RuntimeError("index gone")
+    batcher.search = broken
+    v1 = SimpleNamespace(version="v1")
+
+    async def run():
+        return await asyncio.gather(batcher.retrieve(v1, "a", 4), batcher.retrieve(v1, "b", 4),
+                                    return_exceptions=True)
+    assert [str(e) for e in asyncio.run(run())] == ["index gone", "index gone"]
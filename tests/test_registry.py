@@ -0,0 +1,22 @@
+import asyncio
+import services.registry
+from services.registry import Registry
+from utils.fake_providers import HashingEmbeddings, EchoChatModel
+
+def test_build_wires_services_and_records_timings(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(services.registry, "MODEL_PROVIDER", "fake")
+    registry = Registry()
+    registry.build()
+    try:
+        assert isinstance(registry.rag_service.embeddings.embeddings, HashingEmbeddings)
+        assert isinstance(registry.rag_service.fallback_llm.llm, EchoChatModel)
+        assert registry.pdf_service.rag_service is registry.rag_service
+        assert registry.chat_service(None).rag_service is registry.rag_service
+        assert set(registry.timings) == {"import_modules_ms", "build_clients_ms"}
+    finally:
+        registry.ingest_queue.shutdown()
+        registry.rag_service.embeddings.cache.flush()
+        registry.rag_service.collections.shutdown()
+        asyncio.run(registry.http_async_client.aclose())
+        registry.http_client.close()
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from db.database import Base
+from db.models import ChatSession
+from services.chat_service import AsyncChatService
+from utils.pagination import encode_cursor, decode_cursor
+
+START = datetime(2024, 1, 1, 12, 0, 0)
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[ChatSession.__table__])
+    with Session(engine) as session:
+        for i in range(5):
+            session.add(ChatSession(id=f"session-{i}", title=f"Chat {i}" if i else None, created_at=START,
+                                    last_message_at=START + timedelta(minutes=i // 2), message_count=i))
+        session.commit()
+        yield session
+    engine.dispose()
+
+@pytest.fixture
+def chat():
+    return AsyncChatService(None, SimpleNamespace(fallback_llm=None))
+
+def sessions(db, chat, cursor=None, limit=None):
+    query, limit = chat.sessions_page_query(limit, cursor)
+    return chat.sessions_page(db.execute(query).scalars().all(), limit)
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(START, "session-1")
+    assert "=" not in cursor
+    assert decode_cursor(cursor, datetime, str) == (START, "session-1")
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", encode_cursor(START), encode_cursor("yesterday", 1)])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, datetime, int)
+
+def test_sessions_page_by_last_message(db, chat):
+    page = sessions(db, chat, limit=2)
+    assert [s["id"] for s in page["sessions"]] == ["session-4", "session-3"]
+    seen = [s["id"] for s in page["sessions"]]
+    while page["next_cursor"]:
+        page = sessions(db, chat, cursor=page["next_cursor"], limit=2)
+        seen += [s["id"] for s in page["sessions"]]
+    assert seen == ["session-4", "session-3", "session-2", "session-1", "session-0"]
+
+def test_last_page_has_no_cursor(db, chat):
+    page = sessions(db, chat, limit=5)
+    assert len(page["sessions"]) == 5
+    assert page["next_cursor"] is None
+
+def test_untitled_session_falls_back_to_id(db, chat):
+    page = sessions(db, chat)
+    untitled = next(s for s in page["sessions"] if s["id"] == "session-0")
+    assert untitled["title"] == "session-0"
+    assert untitled["message_count"] == 0
@@ -0,0 +1,59 @@
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+import services.title_service
+from db.database import Base
+from db.models import ChatMessage, ChatSession
+from services.title_service import TitleService, placeholder_title, clean_title
+
+def test_placeholder_title_truncates_long_questions():
+    assert placeholder_title("How many leave days do I get each year?") == "How many leave days do I…"
+    assert placeholder_title("Hi") == "Hi"
+    assert placeholder_title("   ") == "New Chat"
+
+def test_clean_title_strips_quotes():
+    assert clean_title(' "Leave Policy" ') == "Leave Policy"
+    assert clean_title("''") is None
+
+def test_batches_are_capped_and_drain_in_order(monkeypatch):
+    monkeypatch.setattr(services.title_service, "TITLE_BATCH_SIZE", 2)
+    titles = TitleService()
+    for i in range(3):
+        titles.enqueue(None, f"s{i}", f"question {i}", f"placeholder {i}")
+    assert [sid for sid, _, _ in titles.take_batch()] == ["s0", "s1"]
+    assert [sid for sid, _, _ in titles.take_batch()] == ["s2"]
+    assert titles.take_batch() == []
+
+def test_single_chat_uses_plain_prompt():
+    titles = TitleService()
+    batch = [("s1", "How many leave days?", "How many leave days?")]
+    assert "Reply in JSON" not in titles.prompt_for(batch)
+    assert titles.parse_titles(batch, '"Leave Days"') == {"s1": "Leave Days"}
+
+def test_batch_reply_is_mapped_back_by_number():
+    titles = TitleService()
+    batch = [("s1", "leave?", "leave?"), ("s2", "payroll?", "payroll?"), ("s3", "badge?", "badge?")]
+    prompt = titles.prompt_for(batch)
+    assert "1. leave?" in prompt and "3. badge?" in prompt
+    reply = '```json\n{"1": "Leave Days", "3": "Security Badge"}\n```'
+    assert titles.parse_titles(batch, reply) == {"s1": "Leave Days", "s2": None, "s3": "Security Badge"}
+    assert titles.parse_titles(batch, "not json") == {}
+
+def test_updates_only_replace_the_placeholder():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[ChatMessage.__table__, ChatSession.__table__])
+    with Session(engine) as db:
+        db.add_all([
+            ChatSession(id="s1", title="leave?", message_count=2),
+            ChatSession(id="s2", title="Renamed", message_count=2),
+            ChatMessage(session_id="s1", role="user", content="leave?", title="leave?"),
+            ChatMessage(session_id="s2", role="user", content="leave?", title="Renamed"),
+        ])
+        db.commit()
+        for session_id in ("s1", "s2"):
+            for stmt in TitleService().update_statements(session_id, "leave?", "Leave Days"):
+                db.execute(stmt)
+        db.commit()
+        sessions = dict(db.execute(select(ChatSession.id, ChatSession.title)).all())
+        messages = dict(db.execute(select(ChatMessage.session_id, ChatMessage.title)).all())
+    engine.dispose()
+    assert sessions == messages == {"s1": "Leave Days", "s2": "Renamed"}
@@ -0,0 +1,62 @@
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, insert
+from sqlalchemy.dialects import postgresql
+from db.database import Base
+from db.models import WorkflowState
+from services.application_service import AsyncApplicationService
+from services.workflow_store import InMemoryWorkflowStore, DatabaseWorkflowStore
+
+def test_memory_store_round_trip():
+    store = InMemoryWorkflowStore(ttl=60)
+    asyncio.run(store.aput(None, "s1", {"state": "APPLICATION_STARTED"}))
+    assert asyncio.run(store.aget(None, "s1")) == {"state": "APPLICATION_STARTED"}
+    asyncio.run(store.adelete(None, "s1"))
+    assert asyncio.run(store.aget(None, "s1")) is None
+
+def test_memory_store_expires_and_sweeps():
+    store = InMemoryWorkflowStore(ttl=-1)
+    asyncio.run(store.aput(None, "s1", {"state": "x"}))
+    assert asyncio.run(store.aget(None, "s1")) is None
+    asyncio.run(store.aput(None, "s1", {"state": "x"}))
+    asyncio.run(store.aput(None, "s2", {"state": "y"}))
+    assert asyncio.run(store.asweep()) == 2
+    assert store.states == {}
+
+def test_database_store_ignores_and_sweeps_expired_rows():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[WorkflowState.__table__])
+    store = DatabaseWorkflowStore(ttl=60)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(WorkflowState), [
+            {"session_id": "live", "data": '{"state": "a"}', "expires_at": now + timedelta(minutes=5)},
+            {"session_id": "stale", "data": '{"state": "b"}', "expires_at": now - timedelta(minutes=5)},
+        ])
+        assert conn.execute(store.get_query("live")).scalar() == '{"state": "a"}'
+        assert conn.execute(store.get_query("stale")).scalar() is None
+        assert conn.execute(store.sweep_statement()).rowcount == 1
+
+def test_sweep_due_respects_interval():
+    store = DatabaseWorkflowStore(sweep_interval=0)
+    assert store.sweep_due() is True
+    assert DatabaseWorkflowStore(sweep_interval=3600).sweep_due() is False
+
+def test_application_service_saves_only_changes():
+    store = InMemoryWorkflowStore(ttl=60)
+    service = AsyncApplicationService(store)
+    asyncio.run(service.aload(None, "s1"))
+    service.start_application("s1")
+    service.update_field("s1", "name", " Ada ")
+    asyncio.run(service.asave(None))
+    assert asyncio.run(store.aget(None, "s1"))["data"]["name"] == "Ada"
+    assert list(service.changes()) == []
+    service.cancel_application("s1")
+    asyncio.run(service.asave(None))
+    assert asyncio.run(store.aget(None, "s1")) is None
+
+def test_application_upsert_refreshes_updated_at():
+    stmt = AsyncApplicationService().application_upsert("s1", {"name": "Ada"})
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (session_id) DO UPDATE SET" in sql
+    assert "updated_at = " in sql.split("DO UPDATE SET", 1)[1]
@@ -0,0 +1,95 @@
+import os
+from collections import namedtuple
+import faiss
+import numpy as np
+
+IndexSpec = namedtuple("IndexSpec", ["kind", "nlist", "nprobe", "m", "ef_construction", "ef_search"])
+
+INDEX_TYPE = os.getenv("INDEX_TYPE", "flat").lower()
+INDEX_NLIST = int(os.getenv("INDEX_NLIST", "256"))
+INDEX_NPROBE = int(os.getenv("INDEX_NPROBE", "16"))
+INDEX_HNSW_M = int(os.getenv("INDEX_HNSW_M", "32"))
+INDEX_EF_CONSTRUCTION = int(os.getenv("INDEX_EF_CONSTRUCTION", "200"))
+INDEX_EF_SEARCH = int(os.getenv("INDEX_EF_SEARCH", "64"))
+INDEX_KINDS = ("flat", "ivf", "hnsw")
+
+# faiss warns below ~39 training points per centroid; smaller corpora stay exact.
+IVF_MIN_POINTS_PER_LIST = 39
+
+def index_spec(kind=INDEX_TYPE, nlist=INDEX_NLIST, nprobe=INDEX_NPROBE, m=INDEX_HNSW_M,
+               ef_construction=INDEX_EF_CONSTRUCTION, ef_search=INDEX_EF_SEARCH):
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"Unknown index type {kind!r}, expected one of {', '.join(INDEX_KINDS)}")
+    return IndexSpec(kind, nlist, nprobe, m, ef_construction, ef_search)
+
+def index_kind(index):
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    try:
+        faiss.extract_index_ivf(index)
+        return "ivf"
+    except RuntimeError:
+        return "flat"
+
+def effective_kind(spec, count: int):
+    if spec.kind == "ivf" and count < spec.nlist * IVF_MIN_POINTS_PER_LIST:
+        return "flat"
+    return spec.kind
+
+def index_vectors(index):
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype=np.float32)
+    if index_kind(index) == "ivf":
+        faiss.extract_index_ivf(index).make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+def reconstruct_rows(index, ids):
+    if index_kind(index) == "ivf":
+        ivf = faiss.extract_index_ivf(index)
+        if ivf.direct_map.type == faiss.DirectMap.NoMap:
+            ivf.make_direct_map()
+    if not len(ids):
+        return np.empty((0, index.d), dtype=np.float32)
+    return np.vstack([index.reconstruct(int(i)) for i in ids])
+
+def flat_for_metric(dim: int, metric):
+    if metric == faiss.METRIC_L2:
+        return faiss.IndexFlatL2(dim)
+    if metric == faiss.METRIC_INNER_PRODUCT:
+        return faiss.IndexFlatIP(dim)
+    return faiss.IndexFlat(dim, metric)
+
+def build_index(vectors, dim: int, metric, spec):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    kind = effective_kind(spec, len(vectors))
+    if kind == "ivf":
+        index = faiss.index_factory(dim, f"IVF{spec.nlist},Flat", metric)
+        index.train(vectors)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, spec.m, metric)
+        index.hnsw.efConstruction = spec.ef_construction
+    else:
+        index = flat_for_metric(dim, metric)
+    if len(vectors):
+        index.add(vectors)
+    set_search_params(index, spec)
+    return index
+
+def set_search_params(index, spec):
+    kind = index_kind(index)
+    if kind == "ivf":
+        faiss.extract_index_ivf(index).nprobe = spec.nprobe
+    elif kind == "hnsw":
+        faiss.downcast_index(index).hnsw.efSearch = spec.ef_search
+
+def flat_index(index):
+    if isinstance(faiss.downcast_index(index), (faiss.IndexFlatL2, faiss.IndexFlatIP)):
+        return faiss.clone_index(index)
+    return build_index(index_vectors(index), index.d, index.metric_type, index_spec("flat"))
+
+def rebuild_index(index, spec):
+    if index_kind(index) == effective_kind(spec, index.ntotal):
+        set_search_params(index, spec)
+        return index
+    return build_index(index_vectors(index), index.d, index.metric_type, spec)
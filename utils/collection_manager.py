@@ -0,0 +1,158 @@
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from langchain.schema import Document
+from utils.collection_names import DEFAULT_COLLECTION, COLLECTION_NAME_PATTERN, CollectionNotFound, validate_collection
+from utils.index_manager import IndexManager
+from utils.vectorstore_utils import batch_search, current_version
+
+CollectionSnapshot = namedtuple("CollectionSnapshot", ["version", "snapshots"])
+
+COLLECTIONS_DIR = "collections"
+COLLECTION_MEMORY_BUDGET_MB = float(os.getenv("COLLECTION_MEMORY_BUDGET_MB", "1024"))
+COLLECTION_SEARCH_WORKERS = int(os.getenv("COLLECTION_SEARCH_WORKERS", "4"))
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+class CollectionManager:
+    def __init__(self, root, embeddings, memory_budget_mb=COLLECTION_MEMORY_BUDGET_MB,
+                 search_workers=COLLECTION_SEARCH_WORKERS):
+        self.root = root
+        self.embeddings = embeddings
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.spec = None
+        self.managers = OrderedDict()
+        self.write_locks = {}
+        self.loads = 0
+        self.evictions = 0
+        self.fanouts = 0
+        self.executor = ThreadPoolExecutor(max_workers=search_workers, thread_name_prefix="collection-search")
+        self._lock = threading.Lock()
+
+    def path(self, name: str):
+        if name == DEFAULT_COLLECTION:
+            return self.root
+        return os.path.join(self.root, COLLECTIONS_DIR, name)
+
+    def exists(self, name: str):
+        path = self.path(name)
+        return current_version(path) is not None or os.path.exists(os.path.join(path, "index.faiss"))
+
+    def names(self):
+        names = [DEFAULT_COLLECTION] if self.exists(DEFAULT_COLLECTION) else []
+        try:
+            entries = sorted(os.listdir(os.path.join(self.root, COLLECTIONS_DIR)))
+        except FileNotFoundError:
+            entries = []
+        return names + [name for name in entries
+                        if name != DEFAULT_COLLECTION and COLLECTION_NAME_PATTERN.match(name) and self.exists(name)]
+
+    def get(self, name: str = DEFAULT_COLLECTION, create: bool = False):
+        validate_collection(name)
+        with self._lock:
+            manager = self.managers.get(name)
+            if manager is None:
+                if not create and name != DEFAULT_COLLECTION and not self.exists(name):
+                    raise CollectionNotFound(f"Collection {name!r} does not exist")
+                manager = self.managers[name] = IndexManager(self.path(name), self.embeddings, spec=self.spec)
+                self.write_locks[name] = threading.Lock()
+            self.managers.move_to_end(name)
+            return manager
+
+    def require(self, names=None):
+        for name in names or []:
+            self.get(name)
+
+    def write_lock(self, name: str = DEFAULT_COLLECTION, create: bool = False):
+        self.get(name, create)
+        return self.write_locks[name]
+
+    def snapshot(self, names=None):
+        names = list(dict.fromkeys(names or [DEFAULT_COLLECTION]))
+        snapshots = []
+        for name in names:
+            manager = self.get(name)
+            loaded = manager.loaded
+            snapshot = manager.snapshot()
+            if snapshot is None:
+                continue
+            if not loaded:
+                self.loads += 1
+            snapshots.append((name, snapshot))
+        self.evict(keep=names)
+        if not snapshots:
+            return None
+        return CollectionSnapshot(tuple((name, snapshot.version) for name, snapshot in snapshots), tuple(snapshots))
+
+    def memory_bytes(self):
+        return sum(manager.memory_bytes for manager in list(self.managers.values()))
+
+    def evict(self, keep=()):
+        with self._lock:
+            total = sum(manager.memory_bytes for manager in self.managers.values())
+            for name, manager in list(self.managers.items()):
+                if total <= self.memory_budget:
+                    break
+                if name in keep or not manager.loaded or self.write_locks[name].locked():
+                    continue
+                total -= manager.memory_bytes
+                manager.unload()
+                self.evictions += 1
+
+    def search(self, snapshot, vectors, k: int):
+        if len(snapshot.snapshots) == 1:
+            return batch_search(snapshot.snapshots[0][1].vectorstore, vectors, k)
+        self.fanouts += 1
+        futures = [
+            (name, self.executor.submit(batch_search, shard.vectorstore, vectors, k))
+            for name, shard in snapshot.snapshots
+        ]
+        shards = [(name, future.result()) for name, future in futures]
+        queries = normalize(vectors)
+        return [self.merge(query, [(name, found[i]) for name, found in shards], k) for i, query in enumerate(queries)]
+
+    def merge(self, query, shards, k: int):
+        docs, vectors = [], []
+        for name, (shard_docs, shard_vectors) in shards:
+            docs.extend(Document(page_content=doc.page_content, metadata={**doc.metadata, "collection": name})
+                        for doc in shard_docs)
+            vectors.extend(shard_vectors)
+        if not docs:
+            return [], np.empty((0, len(query)), dtype=np.float32)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        top = np.argsort(-(normalize(vectors) @ query), kind="stable")[:k]
+        return [docs[i] for i in top], vectors[top]
+
+    def configure(self, nprobe: int = None, ef_search: int = None):
+        spec = None
+        for manager in list(self.managers.values()):
+            spec = manager.configure(nprobe, ef_search)
+        if spec is None:
+            spec = self.get(DEFAULT_COLLECTION).configure(nprobe, ef_search)
+        self.spec = spec
+        return spec
+
+    def stats(self):
+        collections = {}
+        for name in self.names():
+            manager = self.managers.get(name)
+            if manager is None or not manager.loaded:
+                collections[name] = {"loaded": False, "version": current_version(self.path(name))}
+                continue
+            collections[name] = {"loaded": True, "memory_bytes": manager.memory_bytes, **manager.stats()}
+        return {
+            "collections": collections,
+            "memory_bytes": self.memory_bytes(),
+            "memory_budget_bytes": self.memory_budget,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "fanout_searches": self.fanouts,
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
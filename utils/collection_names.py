@@ -0,0 +1,13 @@
+import os
+import re
+
+DEFAULT_COLLECTION = os.getenv("DEFAULT_COLLECTION", "default")
+COLLECTION_NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+class CollectionNotFound(LookupError):
+    pass
+
+def validate_collection(name: str):
+    if not name or not COLLECTION_NAME_PATTERN.match(name):
+        raise ValueError(f"Invalid collection name {name!r}: use up to 64 letters, digits, '-' or '_'")
+    return name
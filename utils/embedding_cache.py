@@ -0,0 +1,173 @@
+import atexit
+import glob
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", ".embedding_cache")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000"))
+EMBEDDING_CACHE_FLUSH_INTERVAL = float(os.getenv("EMBEDDING_CACHE_FLUSH_INTERVAL", "5"))
+
+DIGEST_SIZE = 16
+
+def normalize_text(text: str):
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def cache_key(text: str, model: str):
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    def __init__(self, path=EMBEDDING_CACHE_DIR, model: str = "default", max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+                 flush_interval=EMBEDDING_CACHE_FLUSH_INTERVAL):
+        self.path = os.path.join(path, re.sub(r"[^A-Za-z0-9_.-]", "_", model))
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.index_file = self.vectors_file = self.digests_file = None
+        self.dim = None
+        self.slots = OrderedDict()
+        self.free_slots = []
+        self.vectors = None
+        self.digests = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+        indexes = glob.glob(os.path.join(self.path, "index-*.json"))
+        if indexes:
+            self._load(int(re.search(r"index-(\d+)\.json$", max(indexes, key=os.path.getmtime)).group(1)))
+        atexit.register(self.flush)
+
+    def _files(self, dim):
+        self.index_file = os.path.join(self.path, f"index-{dim}.json")
+        self.vectors_file = os.path.join(self.path, f"vectors-{dim}.f32")
+        self.digests_file = os.path.join(self.path, f"digests-{dim}.u8")
+
+    def _load(self, dim):
+        self._files(dim)
+        meta = None
+        if os.path.exists(self.index_file) and os.path.exists(self.vectors_file):
+            with open(self.index_file) as f:
+                meta = json.load(f)
+        if meta is None or meta.get("capacity") != self.max_entries:
+            self._open(dim, "w+")
+            return
+        self._open(dim, "r+")
+        self.slots = OrderedDict((key, slot) for key, slot in meta["slots"])
+        used = set(self.slots.values())
+        self.free_slots = [slot for slot in range(self.max_entries - 1, -1, -1) if slot not in used]
+
+    def _open(self, dim, mode):
+        self.dim = dim
+        self._files(dim)
+        self.vectors = np.memmap(self.vectors_file, dtype=np.float32, mode=mode, shape=(self.max_entries, dim))
+        self.digests = np.memmap(self.digests_file, dtype=np.uint8, mode=mode, shape=(self.max_entries, DIGEST_SIZE))
+        if mode == "w+":
+            self.slots = OrderedDict()
+            self.free_slots = list(range(self.max_entries - 1, -1, -1))
+
+    def _digest(self, key):
+        return np.frombuffer(bytes.fromhex(key)[:DIGEST_SIZE], dtype=np.uint8)
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                slot = self.slots.get(key)
+                if slot is not None and np.array_equal(self.digests[slot], self._digest(key)):
+                    self.slots.move_to_end(key)
+                    found[key] = self.vectors[slot].tolist()
+                    self.hits += 1
+                else:
+                    if slot is not None:
+                        del self.slots[key]
+                        self.free_slots.append(slot)
+                    self.misses += 1
+        return found
+
+    def put_many(self, items):
+        with self._lock:
+            for key, vector in items:
+                if self.vectors is None or len(vector) != self.dim:
+                    self._switch(len(vector))
+                slot = self.slots.get(key)
+                if slot is None:
+                    if not self.free_slots:
+                        _, evicted = self.slots.popitem(last=False)
+                        self.free_slots.append(evicted)
+                        self.evictions += 1
+                    slot = self.free_slots.pop()
+                self.vectors[slot] = vector
+                self.digests[slot] = self._digest(key)
+                self.slots[key] = slot
+                self.slots.move_to_end(key)
+                self._dirty = True
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _switch(self, dim):
+        self._flush()
+        self._load(dim)
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._dirty or self.vectors is None:
+            return
+        self.vectors.flush()
+        self.digests.flush()
+        meta = {"dim": self.dim, "capacity": self.max_entries, "slots": list(self.slots.items())}
+        tmp_file = f"{self.index_file}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_file, self.index_file)
+        self._dirty = False
+        self._last_flush = time.monotonic()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.slots),
+            "capacity": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, embeddings, cache: EmbeddingCache, model: str):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model
+
+    def embed_documents(self, texts):
+        keys = [cache_key(text, self.model) for text in texts]
+        found = self.cache.get_many(dict.fromkeys(keys))
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = list(zip(missing.keys(), vectors))
+            self.cache.put_many(computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def stats(self):
+        return self.cache.stats()
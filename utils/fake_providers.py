@@ -0,0 +1,85 @@
+import asyncio
+import hashlib
+import os
+import re
+import time
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+FAKE_EMBEDDING_DIM = int(os.getenv("FAKE_EMBEDDING_DIM", "256"))
+FAKE_EMBEDDING_LATENCY_MS = float(os.getenv("FAKE_EMBEDDING_LATENCY_MS", "0"))
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "0"))
+FAKE_LLM_TOKEN_MS = float(os.getenv("FAKE_LLM_TOKEN_MS", "0"))
+FAKE_LLM_MAX_WORDS = int(os.getenv("FAKE_LLM_MAX_WORDS", "40"))
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+class HashingEmbeddings(Embeddings):
+    def __init__(self, dim=FAKE_EMBEDDING_DIM, latency_ms=FAKE_EMBEDDING_LATENCY_MS):
+        self.dim = dim
+        self.latency_ms = latency_ms
+        self.model = f"hashing-{dim}"
+        self.calls = 0
+        self.texts = 0
+
+    def vector(self, text: str):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            vector[0] = 1.0
+            norm = 1.0
+        return (vector / norm).tolist()
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        self.texts += len(texts)
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return [self.vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+class EchoChatModel(BaseChatModel):
+    latency_ms: float = FAKE_LLM_LATENCY_MS
+    token_ms: float = FAKE_LLM_TOKEN_MS
+    max_words: int = FAKE_LLM_MAX_WORDS
+
+    @property
+    def _llm_type(self):
+        return "echo"
+
+    def reply_words(self, messages):
+        return ["Echo:"] + str(messages[-1].content).split()[:self.max_words]
+
+    def delay(self, words):
+        return (self.latency_ms + self.token_ms * len(words)) / 1000
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        words = self.reply_words(messages)
+        time.sleep(self.delay(words))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=" ".join(words)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        words = self.reply_words(messages)
+        await asyncio.sleep(self.delay(words))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=" ".join(words)))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency_ms / 1000)
+        for i, word in enumerate(self.reply_words(messages)):
+            time.sleep(self.token_ms / 1000)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else f" {word}"))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency_ms / 1000)
+        for i, word in enumerate(self.reply_words(messages)):
+            await asyncio.sleep(self.token_ms / 1000)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else f" {word}"))
@@ -0,0 +1,121 @@
+import fcntl
+import os
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from utils.vectorstore_utils import save_vectorstore, load_vectorstore, current_version, read_documents, list_documents
+from utils.ann_index import index_spec, index_kind, rebuild_index, set_search_params
+from utils.mmap_store import INDEX_STORAGE, MmapVectorStore
+
+IndexSnapshot = namedtuple("IndexSnapshot", ["version", "vectorstore"])
+
+INDEX_REFRESH_INTERVAL = float(os.getenv("INDEX_REFRESH_INTERVAL", "5"))
+LOCK_FILE = ".publish.lock"
+
+class IndexManager:
+    def __init__(self, path, embeddings, refresh_interval=INDEX_REFRESH_INTERVAL, spec=None, storage=INDEX_STORAGE):
+        self.path = path
+        self.embeddings = embeddings
+        self.spec = spec or index_spec()
+        self.storage = storage
+        self.refresh_interval = refresh_interval
+        self._snapshot = None
+        self._last_check = 0.0
+        self.memory_bytes = 0
+        self._lock = threading.Lock()
+
+    def _make_snapshot(self, version, vectorstore):
+        if isinstance(vectorstore, MmapVectorStore):
+            self.memory_bytes = vectorstore.stats()["resident_code_bytes"]
+        else:
+            set_search_params(vectorstore.index, self.spec)
+            self.memory_bytes = vectorstore.index.ntotal * vectorstore.index.d * 4 + sum(
+                len(doc.page_content) for doc in vectorstore.docstore._dict.values()
+            )
+        return IndexSnapshot(version, vectorstore)
+
+    def snapshot(self, force: bool = False):
+        snapshot = self._snapshot
+        if not force and snapshot is not None and time.monotonic() - self._last_check < self.refresh_interval:
+            return snapshot
+        with self._lock:
+            self._last_check = time.monotonic()
+            version = current_version(self.path)
+            if self._snapshot is not None and self._snapshot.version == version:
+                return self._snapshot
+            if version is None and not os.path.exists(os.path.join(self.path, "index.faiss")):
+                return self._snapshot
+            vectorstore = load_vectorstore(self.path, self.embeddings, version)
+            self._snapshot = self._make_snapshot(version, vectorstore)
+            return self._snapshot
+
+    @contextmanager
+    def exclusive(self):
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, LOCK_FILE), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def publish(self, vectorstore):
+        if self.storage != "mmap":
+            vectorstore.index = rebuild_index(vectorstore.index, self.spec)
+        with self._lock:
+            version = save_vectorstore(vectorstore, self.path, storage=self.storage)
+            if self.storage == "mmap":
+                vectorstore = load_vectorstore(self.path, self.embeddings, version)
+            self._snapshot = self._make_snapshot(version, vectorstore)
+            self._last_check = time.monotonic()
+            return version
+
+    def unload(self):
+        with self._lock:
+            self._snapshot = None
+            self._last_check = 0.0
+            self.memory_bytes = 0
+
+    def documents(self):
+        snapshot = self._snapshot
+        version = current_version(self.path)
+        if snapshot is not None and snapshot.version == version:
+            return list_documents(snapshot.vectorstore)
+        documents = read_documents(self.path, version)
+        if documents is None and (version or os.path.exists(os.path.join(self.path, "index.faiss"))):
+            documents = list_documents(load_vectorstore(self.path, self.embeddings, version))
+        return documents
+
+    @property
+    def loaded(self):
+        return self._snapshot is not None
+
+    def configure(self, nprobe: int = None, ef_search: int = None):
+        self.spec = self.spec._replace(
+            nprobe=nprobe or self.spec.nprobe,
+            ef_search=ef_search or self.spec.ef_search,
+        )
+        snapshot = self._snapshot
+        if snapshot is not None and not isinstance(snapshot.vectorstore, MmapVectorStore):
+            set_search_params(snapshot.vectorstore.index, self.spec)
+        return self.spec
+
+    def stats(self):
+        snapshot = self._snapshot
+        if snapshot is not None and isinstance(snapshot.vectorstore, MmapVectorStore):
+            return {
+                "version": snapshot.version,
+                **snapshot.vectorstore.stats(),
+            }
+        return {
+            "version": snapshot.version if snapshot else None,
+            "index_type": index_kind(snapshot.vectorstore.index) if snapshot else None,
+            "vectors": snapshot.vectorstore.index.ntotal if snapshot else 0,
+            "spec": self.spec._asdict(),
+        }
+
+    @property
+    def version(self):
+        snapshot = self._snapshot
+        return snapshot.version if snapshot else None
@@ -0,0 +1,281 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from utils.metrics import llm_coalesced, llm_retries, llm_rejected
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "200"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_RETRY_BASE_MS = float(os.getenv("LLM_RETRY_BASE_MS", "500"))
+LLM_RETRY_MAX_MS = float(os.getenv("LLM_RETRY_MAX_MS", "10000"))
+
+class LLMOverloaded(Exception):
+    pass
+
+def is_rate_limit(error: Exception):
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429 or "RateLimit" in type(error).__name__
+
+def retry_after(error: Exception):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def prompt_key(messages, kwargs=None):
+    payload = [[(getattr(m, "type", None), getattr(m, "content", m)) for m in messages], kwargs or {}]
+    return hashlib.sha256(json.dumps(payload, default=str, sort_keys=True).encode("utf-8")).hexdigest()
+
+class Waiter:
+    def __init__(self, loop=None):
+        self.loop = loop
+        self.granted = False
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+        self.enqueued = time.monotonic()
+
+    def grant(self):
+        self.granted = True
+        if self.loop:
+            self.loop.call_soon_threadsafe(self._wake)
+        else:
+            self.event.set()
+
+    def _wake(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+class LLMGateway:
+    def __init__(self, llm, max_concurrency=LLM_MAX_CONCURRENCY, max_queue=LLM_MAX_QUEUE,
+                 queue_timeout=LLM_QUEUE_TIMEOUT, max_retries=LLM_MAX_RETRIES,
+                 retry_base_ms=LLM_RETRY_BASE_MS, retry_max_ms=LLM_RETRY_MAX_MS):
+        self.llm = llm
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.retry_base = retry_base_ms / 1000
+        self.retry_max = retry_max_ms / 1000
+        self.active = 0
+        self.waiters = deque()
+        self.inflight = {}
+        self.leaders = set()
+        self.requests = 0
+        self.upstream_calls = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.peak_queue = 0
+        self.queued = 0
+        self.queue_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def _enqueue(self, waiter: Waiter):
+        with self._lock:
+            self.requests += 1
+            if self.active < self.max_concurrency and not self.waiters:
+                self.active += 1
+                return True
+            if len(self.waiters) >= self.max_queue:
+                self.rejected += 1
+                llm_rejected.inc(reason="queue_full")
+                raise LLMOverloaded("Too many LLM requests are waiting, please retry later.")
+            self.waiters.append(waiter)
+            self.queued += 1
+            self.peak_queue = max(self.peak_queue, len(self.waiters))
+            return False
+
+    def _granted(self, waiter: Waiter):
+        with self._lock:
+            self.queue_seconds += time.monotonic() - waiter.enqueued
+            if waiter.granted:
+                return True
+            self.waiters.remove(waiter)
+            return False
+
+    def _timed_out(self):
+        with self._lock:
+            self.timeouts += 1
+        llm_rejected.inc(reason="queue_timeout")
+        return LLMOverloaded(f"Timed out after {self.queue_timeout:g}s waiting for an LLM slot.")
+
+    def release(self):
+        with self._lock:
+            if self.waiters:
+                self.waiters.popleft().grant()
+            else:
+                self.active -= 1
+
+    def acquire(self):
+        waiter = Waiter()
+        if self._enqueue(waiter):
+            return
+        waiter.event.wait(self.queue_timeout)
+        if not self._granted(waiter):
+            raise self._timed_out()
+
+    async def aacquire(self):
+        waiter = Waiter(asyncio.get_running_loop())
+        if self._enqueue(waiter):
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            if self._granted(waiter):
+                self.release()
+            raise
+        if not self._granted(waiter):
+            raise self._timed_out()
+
+    def _backoff(self, attempt: int, error: Exception):
+        with self._lock:
+            self.rate_limited += 1
+            if attempt < self.max_retries:
+                self.retries += 1
+        if attempt >= self.max_retries:
+            return None
+        llm_retries.inc()
+        delay = random.uniform(0, min(self.retry_max, self.retry_base * 2 ** attempt))
+        return max(delay, retry_after(error) or 0)
+
+    def _call(self, messages, **kwargs):
+        self.acquire()
+        try:
+            attempt = 0
+            while True:
+                with self._lock:
+                    self.upstream_calls += 1
+                try:
+                    return self.llm.invoke(messages, **kwargs)
+                except Exception as e:
+                    delay = self._backoff(attempt, e) if is_rate_limit(e) else None
+                    if delay is None:
+                        raise
+                time.sleep(delay)
+                attempt += 1
+        finally:
+            self.release()
+
+    async def _acall(self, messages, **kwargs):
+        await self.aacquire()
+        try:
+            attempt = 0
+            while True:
+                with self._lock:
+                    self.upstream_calls += 1
+                try:
+                    return await self.llm.ainvoke(messages, **kwargs)
+                except Exception as e:
+                    delay = self._backoff(attempt, e) if is_rate_limit(e) else None
+                    if delay is None:
+                        raise
+                await asyncio.sleep(delay)
+                attempt += 1
+        finally:
+            self.release()
+
+    def _join(self, key: str):
+        with self._lock:
+            future = self.inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                llm_coalesced.inc()
+                return future, False
+            future = self.inflight[key] = Future()
+            future.set_running_or_notify_cancel()
+            return future, True
+
+    def _settle(self, key: str, future: Future, result=None, error: BaseException = None):
+        with self._lock:
+            self.inflight.pop(key, None)
+        if error is not None and not isinstance(error, Exception):
+            error = LLMOverloaded("The shared LLM request was cancelled.")
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def invoke(self, messages, **kwargs):
+        key = prompt_key(messages, kwargs)
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = self._call(messages, **kwargs)
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    async def _lead(self, key: str, future: Future, messages, kwargs):
+        try:
+            result = await self._acall(messages, **kwargs)
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        self._settle(key, future, result)
+
+    async def ainvoke(self, messages, **kwargs):
+        key = prompt_key(messages, kwargs)
+        future, leader = self._join(key)
+        if leader:
+            task = asyncio.create_task(self._lead(key, future, messages, kwargs))
+            self.leaders.add(task)
+            task.add_done_callback(self.leaders.discard)
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    async def astream(self, messages, **kwargs):
+        await self.aacquire()
+        try:
+            attempt = 0
+            while True:
+                with self._lock:
+                    self.upstream_calls += 1
+                started = False
+                try:
+                    async for chunk in self.llm.astream(messages, **kwargs):
+                        started = True
+                        yield chunk
+                    return
+                except Exception as e:
+                    delay = self._backoff(attempt, e) if is_rate_limit(e) and not started else None
+                    if delay is None:
+                        raise
+                await asyncio.sleep(delay)
+                attempt += 1
+        finally:
+            self.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "active": self.active,
+                "queue_depth": len(self.waiters),
+                "peak_queue_depth": self.peak_queue,
+                "max_queue": self.max_queue,
+                "requests": self.requests + self.coalesced,
+                "upstream_calls": self.upstream_calls,
+                "coalesced": self.coalesced,
+                "in_flight_prompts": len(self.inflight),
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "rejected": self.rejected,
+                "queue_timeouts": self.timeouts,
+                "avg_queue_wait_ms": self.queue_seconds / self.queued * 1000 if self.queued else 0.0,
+            }
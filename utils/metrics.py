@@ -0,0 +1,135 @@
+import bisect
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in zip(names, values)) + "}"
+
+class Metric:
+    kind = None
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self.key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = list(self.values.items())
+        return self.header() + [f"{self.name}{format_labels(self.labels, key)} {value}" for key, value in items]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self.values[self.key(labels)] = value
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self.key(labels)
+        with self._lock:
+            counts, total = self.values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.values[key] = (counts, total + value)
+
+    def render(self):
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self.values.items()]
+        lines = self.header()
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                labels = format_labels(self.labels + ("le",), key + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, labels, **kwargs):
+        with self._lock:
+            if name not in self.metrics:
+                self.metrics[name] = cls(name, help, labels, **kwargs)
+            return self.metrics[name]
+
+    def counter(self, name: str, help: str, labels=()):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name: str, help: str, labels=()):
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def add_collector(self, collect):
+        self.collectors.append(collect)
+
+    def render(self):
+        for collect in self.collectors:
+            try:
+                collect()
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+stage_seconds = metrics.histogram("rag_stage_seconds", "Time spent in each traced stage.", ("stage",))
+http_request_seconds = metrics.histogram(
+    "rag_http_request_seconds", "HTTP request latency.", ("method", "route", "status")
+)
+http_in_flight = metrics.gauge("rag_http_requests_in_flight", "HTTP requests currently being served.")
+ws_connections = metrics.gauge("rag_ws_connections", "Open WebSocket connections.")
+ws_requests_in_flight = metrics.gauge("rag_ws_requests_in_flight", "WebSocket chat requests being answered.")
+llm_tokens = metrics.counter("rag_llm_tokens_total", "LLM tokens used.", ("stage", "kind"))
+llm_calls = metrics.counter("rag_llm_calls_total", "LLM calls made.", ("stage",))
+cache_hit_ratio = metrics.gauge("rag_cache_hit_ratio", "Hit ratio of each in-process cache.", ("cache",))
+cache_entries = metrics.gauge("rag_cache_entries", "Entries held by each in-process cache.", ("cache",))
+context_tokens = metrics.histogram(
+    "rag_context_tokens", "Tokens packed into the retrieval context per answer.",
+    buckets=(100, 250, 500, 750, 1000, 1500, 2000, 4000, 8000),
+)
+llm_coalesced = metrics.counter("rag_llm_coalesced_total", "LLM calls served by an identical in-flight call.")
+llm_retries = metrics.counter("rag_llm_retries_total", "LLM calls retried after a provider rate limit.")
+llm_rejected = metrics.counter("rag_llm_rejected_total", "LLM calls refused by admission control.", ("reason",))
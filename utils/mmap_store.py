@@ -0,0 +1,213 @@
+import json
+import os
+import sqlite3
+import threading
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from utils.ann_index import index_vectors, flat_for_metric
+
+INDEX_STORAGE = os.getenv("INDEX_STORAGE", "faiss").lower()
+INDEX_COMPRESSION = os.getenv("INDEX_COMPRESSION", "none").lower()
+INDEX_PQ_M = int(os.getenv("INDEX_PQ_M", "64"))
+INDEX_RERANK_FACTOR = int(os.getenv("INDEX_RERANK_FACTOR", "10"))
+INDEX_SCAN_BLOCK = int(os.getenv("INDEX_SCAN_BLOCK", "8192"))
+COMPRESSIONS = ("none", "fp16", "pq")
+
+META_FILE = "mmap.json"
+VECTORS_FILE = "vectors.f32"
+NORMS_FILE = "norms.f32"
+CODES_FILE = "vectors.f16"
+PQ_FILE = "codes.pq"
+CHUNKS_FILE = "chunks.sqlite"
+
+# 8-bit PQ trains 256 centroids per sub-quantizer; faiss wants ~39 points per centroid.
+PQ_MIN_POINTS = 256 * 39
+
+def pq_subquantizers(dim: int, m: int):
+    return max(d for d in range(1, min(m, dim) + 1) if dim % d == 0)
+
+def save_mmap_store(vectorstore, path, compression=INDEX_COMPRESSION):
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown index compression {compression!r}, expected one of {', '.join(COMPRESSIONS)}")
+    os.makedirs(path, exist_ok=True)
+    index = vectorstore.index
+    vectors = np.ascontiguousarray(index_vectors(index), dtype=np.float32)
+    count, dim = vectors.shape
+    if compression == "pq" and count < PQ_MIN_POINTS:
+        compression = "fp16"
+    meta = {
+        "count": count,
+        "dim": dim,
+        "metric": int(index.metric_type),
+        "normalize_L2": bool(vectorstore._normalize_L2),
+        "distance_strategy": str(vectorstore.distance_strategy.value),
+        "compression": compression,
+    }
+    if count:
+        np.memmap(os.path.join(path, VECTORS_FILE), dtype=np.float32, mode="w+", shape=vectors.shape)[:] = vectors
+        np.memmap(os.path.join(path, NORMS_FILE), dtype=np.float32, mode="w+", shape=(count,))[:] = \
+            np.einsum("ij,ij->i", vectors, vectors)
+        if compression == "fp16":
+            np.memmap(os.path.join(path, CODES_FILE), dtype=np.float16, mode="w+", shape=vectors.shape)[:] = vectors
+        elif compression == "pq":
+            meta["pq_m"] = pq_subquantizers(dim, INDEX_PQ_M)
+            pq = faiss.IndexPQ(dim, meta["pq_m"], 8, index.metric_type)
+            pq.train(vectors)
+            pq.add(vectors)
+            faiss.write_index(pq, os.path.join(path, PQ_FILE))
+    db = sqlite3.connect(os.path.join(path, CHUNKS_FILE))
+    with db:
+        db.execute("CREATE TABLE chunks (row INTEGER PRIMARY KEY, id TEXT NOT NULL, doc_id TEXT, content TEXT, metadata TEXT)")
+        db.executemany(
+            "INSERT INTO chunks VALUES (?, ?, ?, ?, ?)",
+            (
+                (row, chunk_id, doc.metadata.get("doc_id"), doc.page_content, json.dumps(doc.metadata))
+                for row, chunk_id in sorted(vectorstore.index_to_docstore_id.items())
+                for doc in [vectorstore.docstore.search(chunk_id)]
+            ),
+        )
+        db.execute("CREATE INDEX ix_chunks_doc_id ON chunks (doc_id)")
+    db.close()
+    with open(os.path.join(path, META_FILE), "w") as f:
+        json.dump(meta, f)
+
+def is_mmap_store(path):
+    return os.path.exists(os.path.join(path, META_FILE))
+
+class MmapVectorStore:
+    def __init__(self, path, embedding_function):
+        self.path = path
+        self.embedding_function = embedding_function
+        with open(os.path.join(path, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.count = self.meta["count"]
+        self.dim = self.meta["dim"]
+        self.compression = self.meta["compression"]
+        self.inner_product = self.meta["metric"] == faiss.METRIC_INNER_PRODUCT
+        self.distance_strategy = DistanceStrategy(self.meta["distance_strategy"])
+        self.vectors = self.norms = self.codes = self.pq = None
+        if self.count:
+            shape = (self.count, self.dim)
+            self.vectors = np.memmap(os.path.join(path, VECTORS_FILE), dtype=np.float32, mode="r", shape=shape)
+            self.norms = np.memmap(os.path.join(path, NORMS_FILE), dtype=np.float32, mode="r", shape=(self.count,))
+            if self.compression == "fp16":
+                self.codes = np.memmap(os.path.join(path, CODES_FILE), dtype=np.float16, mode="r", shape=shape)
+            elif self.compression == "pq":
+                self.pq = faiss.read_index(os.path.join(path, PQ_FILE))
+        self._db = sqlite3.connect(f"file:{os.path.join(path, CHUNKS_FILE)}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def _query_vectors(self, embeddings):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if self.meta["normalize_L2"]:
+            vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors
+
+    def _scores(self, start: int, matrix, vectors):
+        dots = np.asarray(matrix, dtype=np.float32) @ vectors.T
+        return -dots if self.inner_product else self.norms[start:start + len(dots), None] - 2 * dots
+
+    def _scan(self, matrix, vectors, count: int):
+        best_rows = np.empty((0, len(vectors)), dtype=np.int64)
+        best_scores = np.empty((0, len(vectors)), dtype=np.float32)
+        for start in range(0, self.count, INDEX_SCAN_BLOCK):
+            scores = self._scores(start, matrix[start:start + INDEX_SCAN_BLOCK], vectors)
+            rows = np.broadcast_to(np.arange(start, start + len(scores))[:, None], scores.shape)
+            best_rows = np.concatenate([best_rows, rows])
+            best_scores = np.concatenate([best_scores, scores])
+            if len(best_rows) > count:
+                keep = np.argpartition(best_scores, count, axis=0)[:count]
+                best_rows = np.take_along_axis(best_rows, keep, axis=0)
+                best_scores = np.take_along_axis(best_scores, keep, axis=0)
+        return list(best_rows.T)
+
+    def candidates(self, vectors, count: int):
+        if self.compression == "pq":
+            _, rows = self.pq.search(vectors, count)
+            return [row[row >= 0] for row in rows]
+        return self._scan(self.codes if self.compression == "fp16" else self.vectors, vectors, count)
+
+    def rerank(self, rows, vector, k: int):
+        rows = np.sort(rows)
+        exact = self.vectors[rows]
+        if self.inner_product:
+            scores = -(exact @ vector)
+        else:
+            scores = np.einsum("ij,ij->i", exact - vector, exact - vector)
+        order = np.argsort(scores)[:k]
+        return rows[order], scores[order]
+
+    def get_documents(self, rows):
+        rows = [int(row) for row in rows]
+        placeholders = ",".join("?" * len(rows))
+        with self._lock:
+            found = {
+                row: Document(page_content=content, metadata=json.loads(metadata))
+                for row, content, metadata in self._db.execute(
+                    f"SELECT row, content, metadata FROM chunks WHERE row IN ({placeholders})", rows
+                )
+            }
+        return [found[row] for row in rows]
+
+    def search_rows(self, embeddings, k: int):
+        if not self.count or not len(embeddings):
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in embeddings]
+        vectors = self._query_vectors(embeddings)
+        fetch = k if self.compression == "none" else k * INDEX_RERANK_FACTOR
+        return [
+            self.rerank(rows, vector, k)
+            for vector, rows in zip(vectors, self.candidates(vectors, min(fetch, self.count)))
+        ]
+
+    def search_with_vectors(self, embeddings, k: int = 4):
+        return [
+            (self.get_documents(rows), np.asarray(self.vectors[rows]) if len(rows) else np.empty((0, self.dim)))
+            for rows, _ in self.search_rows(embeddings, k)
+        ]
+
+    def document_chunk_ids(self, doc_id: str):
+        with self._lock:
+            return [chunk_id for (chunk_id,) in self._db.execute("SELECT id FROM chunks WHERE doc_id = ?", (doc_id,))]
+
+    def list_documents(self):
+        with self._lock:
+            return dict(self._db.execute(
+                "SELECT doc_id, COUNT(*) FROM chunks WHERE doc_id IS NOT NULL GROUP BY doc_id"
+            ).fetchall())
+
+    def to_faiss(self):
+        index = flat_for_metric(self.dim, self.meta["metric"])
+        if self.count:
+            index.add(np.ascontiguousarray(self.vectors))
+        docs, index_to_docstore_id = {}, {}
+        with self._lock:
+            for row, chunk_id, content, metadata in self._db.execute(
+                "SELECT row, id, content, metadata FROM chunks ORDER BY row"
+            ):
+                docs[chunk_id] = Document(page_content=content, metadata=json.loads(metadata))
+                index_to_docstore_id[row] = chunk_id
+        return FAISS(
+            embedding_function=self.embedding_function,
+            index=index,
+            docstore=InMemoryDocstore(docs),
+            index_to_docstore_id=index_to_docstore_id,
+            normalize_L2=self.meta["normalize_L2"],
+            distance_strategy=self.distance_strategy,
+        )
+
+    def stats(self):
+        resident = self.pq.sa_code_size() * self.count if self.pq is not None else 0
+        return {
+            "storage": "mmap",
+            "compression": self.compression,
+            "vectors": self.count,
+            "mapped_bytes": sum(
+                os.path.getsize(os.path.join(self.path, name))
+                for name in (VECTORS_FILE, NORMS_FILE, CODES_FILE) if os.path.exists(os.path.join(self.path, name))
+            ),
+            "resident_code_bytes": resident,
+        }
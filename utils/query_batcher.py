@@ -0,0 +1,95 @@
+import asyncio
+import os
+import threading
+import time
+from utils.vectorstore_utils import batch_search
+
+QUERY_BATCH_WINDOW_MS = float(os.getenv("QUERY_BATCH_WINDOW_MS", "3"))
+QUERY_BATCH_MAX = int(os.getenv("QUERY_BATCH_MAX", "32"))
+
+def search_snapshot(snapshot, vectors, k: int):
+    return batch_search(snapshot.vectorstore, vectors, k)
+
+class QueryBatcher:
+    def __init__(self, embeddings, search=search_snapshot, window_ms=QUERY_BATCH_WINDOW_MS, max_batch=QUERY_BATCH_MAX):
+        self.embeddings = embeddings
+        self.search = search
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.pending = []
+        self.batches = 0
+        self.queries = 0
+        self.largest_batch = 0
+        self.embed_seconds = 0.0
+        self.search_seconds = 0.0
+        self._timer = None
+        self._tasks = set()
+        self._lock = threading.Lock()
+
+    async def retrieve(self, snapshot, query: str, k: int, lookup=None):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((snapshot, query, k, lookup, future))
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self.flush)
+        return await future
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self.pending:
+            batch, self.pending = self.pending[:self.max_batch], self.pending[self.max_batch:]
+            task = asyncio.create_task(self.run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def run(self, batch):
+        try:
+            results = await asyncio.to_thread(self.process, [item[:-1] for item in batch])
+        except Exception as e:
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (*_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def process(self, batch):
+        started = time.perf_counter()
+        texts = list(dict.fromkeys(query for _, query, _, _ in batch))
+        vectors = dict(zip(texts, self.embeddings.embed_documents(texts)))
+        embedded = time.perf_counter()
+        groups = {}
+        results = [None] * len(batch)
+        for i, (snapshot, query, k, lookup) in enumerate(batch):
+            cached = lookup(vectors[query]) if lookup else None
+            if cached is not None:
+                results[i] = (vectors[query], cached, [], [])
+                continue
+            groups.setdefault((snapshot.version, k), []).append(i)
+        for (_, k), members in groups.items():
+            found = self.search(batch[members[0]][0], [vectors[batch[i][1]] for i in members], k)
+            for i, (docs, doc_vectors) in zip(members, found):
+                results[i] = (vectors[batch[i][1]], None, docs, doc_vectors)
+        with self._lock:
+            self.batches += 1
+            self.queries += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            self.embed_seconds += embedded - started
+            self.search_seconds += time.perf_counter() - embedded
+        return results
+
+    def stats(self):
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "queries": self.queries,
+            "avg_batch": self.queries / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "avg_embed_ms": self.embed_seconds / self.batches * 1000 if self.batches else 0.0,
+            "avg_search_ms": self.search_seconds / self.batches * 1000 if self.batches else 0.0,
+        }
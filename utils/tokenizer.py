@@ -0,0 +1,15 @@
+from functools import lru_cache
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+def count_tokens(text: str):
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
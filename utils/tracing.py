@@ -0,0 +1,176 @@
+import contextvars
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from utils.metrics import stage_seconds, llm_calls, llm_tokens, http_request_seconds, http_in_flight
+
+TRACE_LOG = os.getenv("TRACE_LOG", "slow").lower()
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "2000"))
+PROFILE_SLOW_REQUESTS = os.getenv("PROFILE_SLOW_REQUESTS", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "1"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", ".profiles")
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+class Trace:
+    def __init__(self, name: str, request_id: str = None, **attrs):
+        self.name = name
+        self.request_id = request_id or uuid.uuid4().hex
+        self.attrs = attrs
+        self.spans = []
+        self.started = time.perf_counter()
+        self.duration = None
+        self._lock = threading.Lock()
+
+    def bind(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, stage: str, started: float, duration: float, attrs: dict):
+        with self._lock:
+            self.spans.append((stage, started, duration, attrs))
+
+    def to_dict(self):
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "trace": self.name,
+            "request_id": self.request_id,
+            **self.attrs,
+            "duration_ms": round((self.duration or 0) * 1000, 2),
+            "spans": [
+                {"stage": stage, "start_ms": round((started - self.started) * 1000, 2),
+                 "duration_ms": round(duration * 1000, 2), **attrs}
+                for stage, started, duration, attrs in sorted(spans, key=lambda span: span[1])
+            ],
+        }
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+        if TRACE_LOG == "all" or (TRACE_LOG == "slow" and self.duration * 1000 >= TRACE_SLOW_MS):
+            print(json.dumps(self.to_dict(), default=str))
+
+class SlowRequestProfiler:
+    def __init__(self, request_id: str, interval_ms=PROFILE_INTERVAL_MS):
+        self.request_id = request_id
+        self.interval = interval_ms / 1000
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                self.samples[";".join([names.get(thread_id, str(thread_id))] + stack[::-1])] += 1
+
+    def stop(self, duration: float):
+        self._stop.set()
+        self._thread.join()
+        if duration * 1000 < TRACE_SLOW_MS or not self.samples:
+            return None
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{self.request_id}.folded")
+        with open(path, "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+@contextmanager
+def trace(name: str, request_id: str = None, **attrs):
+    existing = current_trace.get()
+    if existing is not None and existing.duration is None:
+        existing.bind(**attrs)
+        yield existing
+        return
+    current = Trace(name, request_id, **attrs)
+    token = current_trace.set(current)
+    profiler = None
+    if PROFILE_SLOW_REQUESTS and random.random() < PROFILE_SAMPLE_RATE:
+        profiler = SlowRequestProfiler(current.request_id).start()
+    try:
+        yield current
+    finally:
+        current_trace.reset(token)
+        current.finish()
+        if profiler:
+            path = profiler.stop(current.duration)
+            if path:
+                print(f"Slow request {current.request_id} profile written to {path}")
+
+@contextmanager
+def span(stage: str, **attrs):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - started
+        stage_seconds.observe(duration, stage=stage)
+        current = current_trace.get()
+        if current is not None:
+            current.add(stage, started, duration, attrs)
+
+def bind(**attrs):
+    current = current_trace.get()
+    if current is not None:
+        current.bind(**attrs)
+
+def record_llm(stage: str, message=None, completion_tokens: int = None):
+    llm_calls.inc(stage=stage)
+    usage = getattr(message, "usage_metadata", None) or {}
+    prompt_tokens = usage.get("input_tokens")
+    completion_tokens = usage.get("output_tokens", completion_tokens)
+    if prompt_tokens:
+        llm_tokens.inc(prompt_tokens, stage=stage, kind="prompt")
+    if completion_tokens:
+        llm_tokens.inc(completion_tokens, stage=stage, kind="completion")
+
+class TracingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1") or uuid.uuid4().hex
+        status = 500
+
+        async def send_with_request_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        started = time.perf_counter()
+        http_in_flight.inc()
+        try:
+            with trace(f"{scope['method']} {scope['path']}", request_id):
+                await self.app(scope, receive, send_with_request_id)
+        finally:
+            http_in_flight.dec()
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_request_seconds.observe(time.perf_counter() - started, method=scope["method"], route=route,
+                                         status=status)
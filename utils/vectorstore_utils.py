@@ -1,7 +1,108 @@
+import json
+import os
+import shutil
+import time
+import faiss
+import numpy as np
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from utils.ann_index import flat_index, reconstruct_rows
+from utils.mmap_store import INDEX_STORAGE, MmapVectorStore, save_mmap_store, is_mmap_store
 
-def save_vectorstore(vectorstore, path):
-    vectorstore.save_local(path)
+CURRENT_FILE = "CURRENT"
+DOCUMENTS_FILE = "documents.json"
+KEEP_VERSIONS = 3
 
-def load_vectorstore(path, embeddings):
-    return FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
\ No newline at end of file
+def new_version():
+    return str(time.time_ns())
+
+def current_version(path):
+    try:
+        with open(os.path.join(path, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def save_vectorstore(vectorstore, path, version=None, storage=INDEX_STORAGE):
+    version = version or new_version()
+    if storage == "mmap":
+        save_mmap_store(vectorstore, os.path.join(path, version))
+    else:
+        vectorstore.save_local(os.path.join(path, version))
+    with open(os.path.join(path, version, DOCUMENTS_FILE), "w") as f:
+        json.dump(list_documents(vectorstore), f)
+    tmp_file = os.path.join(path, f"{CURRENT_FILE}.tmp")
+    with open(tmp_file, "w") as f:
+        f.write(version)
+    os.replace(tmp_file, os.path.join(path, CURRENT_FILE))
+    prune_versions(path, keep=version)
+    return version
+
+def prune_versions(path, keep):
+    versions = sorted(
+        d for d in os.listdir(path)
+        if d.isdigit() and os.path.isdir(os.path.join(path, d))
+    )
+    for version in versions[:-KEEP_VERSIONS]:
+        if version != keep:
+            shutil.rmtree(os.path.join(path, version), ignore_errors=True)
+
+def read_documents(path, version):
+    if version is None:
+        return None
+    try:
+        with open(os.path.join(path, version, DOCUMENTS_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def load_vectorstore(path, embeddings, version=None):
+    version = version or current_version(path)
+    load_path = os.path.join(path, version) if version else path
+    if is_mmap_store(load_path):
+        return MmapVectorStore(load_path, embeddings)
+    return FAISS.load_local(load_path, embeddings, allow_dangerous_deserialization=True)
+
+def clone_vectorstore(vectorstore):
+    if isinstance(vectorstore, MmapVectorStore):
+        return vectorstore.to_faiss()
+    return FAISS(
+        embedding_function=vectorstore.embedding_function,
+        index=flat_index(vectorstore.index),
+        docstore=InMemoryDocstore(dict(vectorstore.docstore._dict)),
+        index_to_docstore_id=dict(vectorstore.index_to_docstore_id),
+        normalize_L2=vectorstore._normalize_L2,
+        distance_strategy=vectorstore.distance_strategy,
+    )
+
+def document_chunk_ids(vectorstore, doc_id):
+    if isinstance(vectorstore, MmapVectorStore):
+        return vectorstore.document_chunk_ids(doc_id)
+    return [
+        chunk_id for chunk_id, doc in vectorstore.docstore._dict.items()
+        if doc.metadata.get("doc_id") == doc_id
+    ]
+
+def list_documents(vectorstore):
+    if isinstance(vectorstore, MmapVectorStore):
+        return vectorstore.list_documents()
+    documents = {}
+    for doc in vectorstore.docstore._dict.values():
+        doc_id = doc.metadata.get("doc_id")
+        if doc_id is not None:
+            documents[doc_id] = documents.get(doc_id, 0) + 1
+    return documents
+
+def batch_search(vectorstore, vectors, k):
+    if isinstance(vectorstore, MmapVectorStore):
+        return vectorstore.search_with_vectors(vectors, k)
+    matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+    if vectorstore._normalize_L2:
+        faiss.normalize_L2(matrix)
+    _, ids = vectorstore.index.search(matrix, k)
+    results = []
+    for row in ids:
+        row = [int(i) for i in row if i != -1]
+        docs = [vectorstore.docstore.search(vectorstore.index_to_docstore_id[i]) for i in row]
+        results.append((docs, reconstruct_rows(vectorstore.index, row)))
+    return results